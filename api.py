@@ -0,0 +1,35 @@
+import asyncio
+import logging
+import logging.config
+import argparse
+
+import coloredlogs
+
+from constants import LOG_PATH, DATABASE_PATH, API_HOST, API_PORT
+from utils.api import ApiServer
+from utils.connection import get_connection, close_connection
+from utils.migrations import migrate_db
+
+
+coloredlogs.DEFAULT_FIELD_STYLES['filename'] = {'color': 'magenta'}
+logging.config.fileConfig(
+    'logging.conf',
+    disable_existing_loggers=False,
+    defaults={'logfilename': LOG_PATH})
+log = logging.getLogger('api')
+
+parser = argparse.ArgumentParser(description='Serve players, games, history, drafts and pairings as read-only JSON.')
+parser.add_argument('--database', default=DATABASE_PATH)
+parser.add_argument('--host', default=API_HOST)
+parser.add_argument('--port', type=int, default=API_PORT)
+args = parser.parse_args()
+
+# the handlers only read, so the schema is brought up to date once before serving
+con = get_connection(args.database)
+migrate_db(con)
+close_connection(con)
+
+try:
+    asyncio.run(ApiServer(args.database).serve(args.host, args.port))
+except KeyboardInterrupt:
+    log.info('Quitting')
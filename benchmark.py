@@ -0,0 +1,208 @@
+import os
+import json
+import random
+import logging
+import logging.config
+import argparse
+import platform
+from datetime import datetime, timedelta
+from statistics import median
+from time import perf_counter
+
+import coloredlogs
+
+from constants import LOG_PATH, BENCHMARK_PATH, STARGING_ELO
+from utils.db_utils import init_db, get_fafmats_scores, get_games_table, get_history_table, \
+    add_game, update_elo, add_draft, add_player_to_draft, add_player_draft_pairing, add_game_id_to_draft, \
+    set_draft_round, get_last_game_id, get_player_elo, get_draft_players
+from utils.elo import get_expected_elo_score, get_elo_difference_from_result
+from utils.migrations import migrate_db
+from utils.import_utils import import_games
+from utils.pairing import get_draft_autopairing, get_player_pairings
+
+
+coloredlogs.DEFAULT_FIELD_STYLES['filename'] = {'color': 'magenta'}
+logging.config.fileConfig(
+    'logging.conf',
+    disable_existing_loggers=False,
+    defaults={'logfilename': LOG_PATH})
+log = logging.getLogger('benchmark')
+
+START_DATE = datetime(2020, 1, 1)
+DRAW_PROBABILITY = 0.1
+SKILL_DEVIATION = 200  # spread of the hidden skill that decides synthetic results
+
+
+def get_synthetic_result(playerA_skill, playerB_skill, rng):
+    if rng.random() < DRAW_PROBABILITY:
+        return 'draw'
+    playerA_wins = rng.random() < get_expected_elo_score(playerA_skill, playerB_skill)
+    clean_sweep = rng.random() < 0.5
+    if playerA_wins:
+        return '2:0' if clean_sweep else '2:1'
+    else:
+        return '0:2' if clean_sweep else '1:2'
+
+
+def add_synthetic_players(n_players, con):
+    sql = 'INSERT INTO player (name, familyName, elo, joiningDate, isSelected) values(?, ?, ?, ?, ?)'
+    data = [('player{}'.format(i), 'synthetic', STARGING_ELO, START_DATE, True) for i in range(n_players)]
+    con.executemany(sql, data)
+    result = con.execute('SELECT id FROM player ORDER BY id')
+    return [player_id for (player_id,) in result]
+
+
+def add_synthetic_games(n_games, player_ids, skills, date, rng, con):
+    games = []
+    for _ in range(n_games):
+        playerA_id, playerB_id = rng.sample(player_ids, 2)
+        date += timedelta(minutes=rng.randint(1, 600))
+        result_string = get_synthetic_result(skills[playerA_id], skills[playerB_id], rng)
+        games.append((playerA_id, playerB_id, result_string, date))
+    import_games(games, con)
+    return date
+
+
+def add_synthetic_drafts(n_drafts, n_rounds, draft_size, player_ids, skills, date, rng, con):
+    for draft_number in range(n_drafts):
+        draft_id = add_draft('draft{}'.format(draft_number), con)
+        draft_player_ids = rng.sample(player_ids, min(draft_size, len(player_ids)))
+        for player_id in draft_player_ids:
+            add_player_to_draft(player_id, draft_id, con)
+
+        for round_ in range(1, n_rounds + 1):
+            set_draft_round(draft_id, round_, con)
+            pairings = get_player_pairings(draft_id, round_, draft_player_ids, con)
+            add_player_draft_pairing(pairings, draft_id, round_, con)
+
+            games = []
+            for pairing in pairings:
+                if len(pairing) == 2:
+                    date += timedelta(minutes=rng.randint(1, 60))
+                    result_string = get_synthetic_result(skills[pairing[0]], skills[pairing[1]], rng)
+                    games.append((pairing[0], pairing[1], result_string, date))
+            first_game_id = get_last_game_id(con) + 1
+            import_games(games, con)
+            for game_id in range(first_game_id, first_game_id + len(games)):
+                add_game_id_to_draft(game_id, draft_id, round_, con)
+        con.commit()
+    return date
+
+
+def generate_league(path, n_players, n_games, n_drafts, n_rounds, draft_size, seed):
+    # a database with the real schema, filled through the same functions the CLI uses
+    for suffix in ('.db', '.players.npy', '.elos.npy', '.encounters.npy', '.scores.json'):
+        if os.path.exists(os.path.splitext(path)[0] + suffix):
+            os.remove(os.path.splitext(path)[0] + suffix)
+    con = init_db(path)
+    migrate_db(con)
+
+    rng = random.Random(seed)
+    player_ids = add_synthetic_players(n_players, con)
+    skills = {player_id: rng.gauss(STARGING_ELO, SKILL_DEVIATION) for player_id in player_ids}
+    date = add_synthetic_games(n_games, player_ids, skills, START_DATE, rng, con)
+    con.commit()
+    add_synthetic_drafts(n_drafts, n_rounds, draft_size, player_ids, skills, date, rng, con)
+    return con, player_ids
+
+
+def time_operation(operation, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = perf_counter()
+        operation()
+        timings.append(perf_counter() - start)
+    return {'min': min(timings), 'median': median(timings), 'max': max(timings), 'repeat': repeat}
+
+
+def add_benchmark_game(player_ids, rng, con):
+    playerA_id, playerB_id = rng.sample(player_ids, 2)
+    result_string = rng.choice(['2:0', '2:1', '1:2', '0:2', 'draw'])
+    elo_difference = get_elo_difference_from_result(
+        get_player_elo(playerA_id, con), get_player_elo(playerB_id, con), result_string)
+    game_id = add_game(playerA_id, playerB_id, result_string, con)
+    update_elo(playerA_id, elo_difference, game_id, con)
+    update_elo(playerB_id, - elo_difference, game_id, con)
+    con.commit()
+
+
+def get_benchmark_operations(player_ids, draft_size, n_rounds, rng, con):
+    player_id = player_ids[0]
+    draft_player_ids = player_ids[:draft_size]
+    draft_player_numbers = [draft_size] * (len(player_ids) // draft_size) + [len(player_ids) % draft_size]
+    draft_player_numbers = [number for number in draft_player_numbers if number]
+    operations = {
+        'get_fafmats_scores': lambda: get_fafmats_scores(player_id, player_ids, con),
+        'get_draft_autopairing': lambda: get_draft_autopairing(draft_player_numbers, player_ids, con),
+        'get_player_pairings_first_round': lambda: get_player_pairings(None, 1, draft_player_ids, con),
+        'get_history_table': lambda: get_history_table(con, player_id),
+        'get_games_table': lambda: get_games_table(con),
+        'get_games_table_player': lambda: get_games_table(con, player_id),
+        'add_game_update_elo': lambda: add_benchmark_game(player_ids, rng, con),
+    }
+
+    # the first synthetic draft, paired for the round after its last one
+    first_draft_player_ids = get_draft_players(1, con)
+    if first_draft_player_ids:
+        operations['get_player_pairings_swiss_round'] = \
+            lambda: get_player_pairings(1, n_rounds + 1, first_draft_player_ids, con)
+    return operations
+
+
+def run_benchmark(args):
+    os.makedirs(BENCHMARK_PATH, exist_ok=True)
+    results = {
+        'date': datetime.now().isoformat(),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'arguments': vars(args),
+        'sizes': [],
+    }
+    for n_players in args.players:
+        n_games = n_players * args.games_per_player
+        path = os.path.join(BENCHMARK_PATH, 'league_{}.db'.format(n_players))
+        log.info('Generating {} players, {} games and {} drafts at {}'.format(n_players, n_games, args.drafts, path))
+        start = perf_counter()
+        con, player_ids = generate_league(
+            path, n_players, n_games, args.drafts, args.rounds, args.draft_size, args.seed)
+        size_results = {
+            'players': n_players,
+            'games': n_games,
+            'drafts': args.drafts,
+            'rounds': args.rounds,
+            'generation': perf_counter() - start,
+            'operations': {},
+        }
+
+        rng = random.Random(args.seed)
+        operations = get_benchmark_operations(player_ids, args.draft_size, args.rounds, rng, con)
+        for name, operation in operations.items():
+            if args.operations and name not in args.operations:
+                continue
+            timing = time_operation(operation, args.repeat)
+            size_results['operations'][name] = timing
+            log.info('{:>6} players  {:<35} {:9.4f}s median'.format(n_players, name, timing['median']))
+        con.close()
+        results['sizes'].append(size_results)
+
+    with open(args.output, 'w') as output_file:
+        json.dump(results, output_file, indent=2)
+    log.info('Wrote results to {}'.format(args.output))
+
+
+def get_argument_parser():
+    parser = argparse.ArgumentParser(description='Time core fafmats operations on synthetic leagues.')
+    parser.add_argument('--players', type=int, nargs='+', default=[100, 1000], help='league sizes to benchmark')
+    parser.add_argument('--games-per-player', type=int, default=20)
+    parser.add_argument('--drafts', type=int, default=5)
+    parser.add_argument('--rounds', type=int, default=3, help='rounds played in each draft')
+    parser.add_argument('--draft-size', type=int, default=32)
+    parser.add_argument('--repeat', type=int, default=5, help='timings per operation')
+    parser.add_argument('--operations', nargs='+', help='only time these operations')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=os.path.join(BENCHMARK_PATH, 'results.json'))
+    return parser
+
+
+if __name__ == '__main__':
+    run_benchmark(get_argument_parser().parse_args())
@@ -2,14 +2,37 @@
 LOG_PATH = 'log'
 SQLITE_SCRIPT_PATH = 'resources/fafmats.sql'
 DATABASE_PATH = 'data/data.db'
+SERVICE_SOCKET_PATH = 'data/service.sock'  # default socket of service.py --socket
+EXPORT_PATH = 'data/history.npz'  # default file of the X command
+PROFILE_PATH = 'data/profile.jsonl'  # command timings appended by fafmats.py --profile
+BENCHMARK_PATH = 'data/benchmark'  # synthetic databases and results of benchmark.py
+SNAPSHOT_PATH = 'data/snapshots'
 
 # elo
 STARGING_ELO = 1000
 EXPECTED_TENFOLD_ADVANTAGE = 400  # at 400 elo difference, the stronger opponent should score 10 times higher on average
 K_FACTOR = 32
+RATING_CHECKPOINT_INTERVAL = 500  # games between stored ratings, corrections replay from the last one before
+RATING_ENGINE = 'elo'  # 'elo': every game is rated when added, 'glicko2': games are rated together per rating period
+GLICKO2_START_DEVIATION = 350  # rating deviation of new players, on the elo scale
+GLICKO2_START_VOLATILITY = 0.06
+GLICKO2_TAU = 0.5  # limits how fast the volatility changes, between 0.3 and 1.2
 
 # fafmats
 FUN_FRIENDSHIP_RATIO = 0.5  # number in range [0,1]. 0 = fun only, 1 = friendship only
+TABLE_METHOD = 'balanced'  # 'balanced': best total fafmats score per table, 'seriation': slices of the fafmats tree
+LARGE_POOL_SIZE = 1000  # larger pools are clustered without the dense score matrix
+OPTIMAL_LEAF_ORDERING = False  # slow for large pools
+PAIRING_METHOD = 'matching'  # 'matching': best total fafmats score, 'seriation': neighbours in the fafmats tree
+PAIRING_PROCESSES = 1  # more than 1 pairs the tables of a multi-table draft in a process pool
+EXACT_MATCHING_SIZE = 20  # larger pools (a bye counts as a player) are matched heuristically, 2^N memory
+FAFMATS_UNCERTAINTY = False  # shrink elo differences of uncertain ratings, only matters with the glicko2 engine
+
+# simulation
+SIMULATION_COUNT = 20000  # simulated drafts of the draft action s
+SIMULATION_CHUNK_SIZE = 10000  # simulations computed at once, each chunk is a task of the process pool
+SIMULATION_PROCESSES = 1  # more than 1 spreads the chunks over a process pool
+SIMULATION_POLICY = 'monrad'  # simulated rounds, 'monrad': neighbours in the standings, 'swiss': as in real drafts
 
 # results
 RESULT_SCORE_DICT = {
@@ -33,3 +56,15 @@ YES_STRINGS = ['y', 'Y', 'yes', 'Yes']
 NO_STRINGS = ['n', 'N', 'no', 'No']
 SORT_METHOD_STRINGS = ('a', 'A', 'e', 'E', 'd', 'D')
 GENERATE_PLOTS = False
+PAGE_SIZE = 50  # rows per page of game and history listings
+
+# snapshots
+SNAPSHOT_RETENTION = 10  # unlabelled snapshots kept, older ones are removed
+SNAPSHOT_STEP_PAGES = 4096  # pages copied per backup step, other connections can write between steps
+
+# HTTP API
+API_HOST = '127.0.0.1'
+API_PORT = 8080
+API_POLL_INTERVAL = 1  # seconds between checks for database changes, cached responses are at most this old
+API_DB_THREADS = 4
+API_CACHE_SIZE = 1000  # cached response bodies, the least recently used ones are dropped first
@@ -1,4 +1,6 @@
 import os
+import sys
+import argparse
 import logging
 import logging.config
 from traceback import format_exc
@@ -6,11 +8,16 @@ from traceback import format_exc
 import coloredlogs
 import sqlite3 as sl
 
-from constants import LOG_PATH, DATABASE_PATH
+from constants import LOG_PATH, DATABASE_PATH, PROFILE_PATH
 from utils.db_utils import init_db
+from utils.connection import get_connection, close_connection
+from utils.profiling import ProfiledConnection, enable_profiling, start_command_profile, finish_command_profile
+from utils.migrations import migrate_db
 from utils.cli_utils import handle_add_player, handle_add_game, \
     handle_show_players, handle_show_games, handle_show_history, handle_show_drafts, \
-    handle_draft, handle_show_score
+    handle_draft, handle_show_score, handle_show_head_to_head, handle_import_games, \
+    handle_ratings, handle_show_rank, handle_export_history, \
+    handle_close_rating_period, handle_snapshots
 from data_types import HandleException
 
 
@@ -21,13 +28,25 @@ logging.config.fileConfig(
     defaults={'logfilename': LOG_PATH})
 log = logging.getLogger('fafmats')
 
+parser = argparse.ArgumentParser(description='Fun and friendship matchmaking system.')
+parser.add_argument(
+    '--profile', action='store_true',
+    help='time every command, its SQL statements and pairing and append the results to {}'.format(PROFILE_PATH))
+parser.add_argument('-c', '--command', help='run a single command and exit, e.g. -c "F hugh"')
+parser.add_argument('words', nargs=argparse.REMAINDER, help='a single command to run instead of the prompt, e.g. P E')
+args = parser.parse_args()
+
 
 if not os.path.isfile(DATABASE_PATH):
     log.info('Add new database at {}'.format(DATABASE_PATH))
-    con = init_db()
+    init_db().close()
 else:
     log.info('Using database at {}'.format(DATABASE_PATH))
-    con = sl.connect(DATABASE_PATH)
+con = get_connection(DATABASE_PATH, factory=ProfiledConnection if args.profile else sl.Connection)
+if args.profile:
+    enable_profiling(con)
+
+migrate_db(con)
 
 
 HELP_MESSAGE = """
@@ -41,25 +60,109 @@ HELP_MESSAGE = """
                                   'd/D': date
  g <NAME> <NAME> <RESULT>       add 1v1 game between named players.
                                 possible results: '2:0', '2:1', '1:2', '0:2', 'draw', 'forfeit'
- G [<NAME>]                     list games, optionally filtered for player
- G <NAME>                       show elo history of player
+ i <PATH> [dry]                 import games from a .csv or .jsonl file with the fields
+                                'playerA', 'playerB', 'result' and 'date' (ISO format).
+                                'dry' only checks the file
+ G [<NAME>] [--page <N>] [--limit <N>]
+                                list games newest first, optionally filtered for player.
+                                without page all pages are shown
+ H <NAME> [--page <N>] [--limit <N>]
+                                show elo history of player newest first
+ R                              list players whose elo differs from replaying all games
+ R rebuild                      replay all games and rewrite elos and history
+ R <ID> <NAME> <NAME> <RESULT>  correct result of game with id and replay the games after it
+ N                              close the rating period and rate its games at once (glicko2 engine)
  d [<NAME/ID>] [<ACTION>]       start (named) draft(s) or runs action on draft.
+                                'p' and 'P' on the name of a multi-table draft act on all its tables
                                 actions:
                                   'p': generate pairings
                                   'P': show pairings
                                   'g': add game
+                                  'n': start next round
+                                  's': simulate the remaining rounds, chances of each standing
                                   'r': remove player
  D [<NAME/ID>]                  lists drafts and draft details
  F <NAME> [<NAME> ...]          get fafmats score between player and all players or list of player
+ V <NAME> <NAME>                show head-to-head record between two players
+ L <NAME>                       show rank, percentile and neighbours of player in the elo ladder
+ B                              list snapshots of the database, newest first
+ B save [<LABEL>]               save a snapshot, only the newest unlabelled ones are kept
+ B restore <NUMBER/NAME>        replace the database with a snapshot, after saving the current state
+ X [<PATH>] [day | lttb <N>]    export the elo history of all players as columns to a .npz file.
+                                'day' keeps the last elo of each day, 'lttb' about N points per player
 """
 
 
+def run_command(flag, input_string):
+    if flag == 'h':
+        log.info(HELP_MESSAGE)
+    elif flag == 'p':
+        handle_add_player(input_string, con)
+    elif flag == 'P':
+        handle_show_players(input_string, con)
+    elif flag == 'g':
+        handle_add_game(input_string, con)
+    elif flag == 'i':
+        handle_import_games(input_string, con)
+    elif flag == 'G':
+        handle_show_games(input_string, con)
+    elif flag == 'R':
+        handle_ratings(input_string, con)
+    elif flag == 'H':
+        handle_show_history(input_string, con)
+    elif flag == 'd':
+        handle_draft(input_string, con)
+    elif flag == 'D':
+        handle_show_drafts(input_string, con)
+    elif flag == 'F':
+        handle_show_score(input_string, con)
+    elif flag == 'V':
+        handle_show_head_to_head(input_string, con)
+    elif flag == 'L':
+        handle_show_rank(input_string, con)
+    elif flag == 'X':
+        handle_export_history(input_string, con)
+    elif flag == 'N':
+        handle_close_rating_period(con)
+    elif flag == 'B':
+        handle_snapshots(input_string, con)
+    else:
+        log.error('Not a flag: "{}"'.format(flag))
+
+
+def run_single_command(input_):
+    # non-interactive mode, the exit code tells whether the command went through
+    if args.profile:
+        start_command_profile(input_)
+    try:
+        run_command(input_[0], input_[1:].strip())
+    except (EOFError, KeyboardInterrupt, HandleException):
+        finish_command_profile('aborted')
+        return 1
+    except BaseException:
+        log.error(format_exc())
+        finish_command_profile('error')
+        return 1
+    con.commit()
+    finish_command_profile('ok')
+    return 0
+
+
+single_command = args.command if args.command is not None else ' '.join(args.words)
+if single_command.strip():
+    exit_code = run_single_command(single_command.strip())
+    close_connection(con)
+    sys.exit(exit_code)
+
+
 input_count = 0
 while True:
     try:
         input_ = input('[{:03d}]> '.format(input_count))
         if not input_:
             continue
+        if args.profile:
+            start_command_profile(input_)
         flag = input_[0]
         input_string = input_[1:]
         input_string = input_string.strip()
@@ -67,35 +170,20 @@ while True:
         if flag == 'q':
             log.info('Quitting')
             break
-        elif flag == 'h':
-            log.info(HELP_MESSAGE)
-        elif flag == 'p':
-            handle_add_player(input_string, con)
-        elif flag == 'P':
-            handle_show_players(input_string, con)
-        elif flag == 'g':
-            handle_add_game(input_string, con)
-        elif flag == 'G':
-            handle_show_games(input_string, con)
-        elif flag == 'H':
-            handle_show_history(input_string, con)
-        elif flag == 'd':
-            handle_draft(input_string, con)
-        elif flag == 'D':
-            handle_show_drafts(input_string, con)
-        elif flag == 'F':
-            handle_show_score(input_string, con)
-        else:
-            log.error('Not a flag: "{}"'.format(flag))
+        run_command(flag, input_string)
 
     except EOFError:
         break
     except (KeyboardInterrupt, HandleException):
         print()
-        pass
+        finish_command_profile('aborted')
     except BaseException:
         log.error(format_exc())
+        finish_command_profile('error')
     else:
         con.commit()  # only commit stuff that worked :-)
+        finish_command_profile('ok')
     finally:
         input_count += 1
+
+close_connection(con)
@@ -1,8 +1,79 @@
-import sqlite3 as sl
+import os
+import sys
+import json
+import socket
+import subprocess
 
-from .utils.pairing import get_draft_autopairing as get_draft_autopairing_con
 
+# service.py, logging.conf and data/ are in the repository root, one level above this package
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVICE_SCRIPT_PATH = os.path.join(REPO_PATH, 'service.py')
 
-def get_draft_autopairing(draft_player_numbers, player_ids, db_path):
-    con = sl.connect(db_path)
-    return get_draft_autopairing_con(draft_player_numbers, player_ids, con)
+# one running service per database path, started on first use
+_clients = {}
+
+
+class ServiceError(Exception):
+    pass
+
+
+class ServiceClient:
+    # sends JSON line requests to service.py, either a child process or a service listening on a socket
+
+    def __init__(self, db_path, socket_path=None, log_path=None):
+        self.request_id = 0
+        if socket_path is None:
+            log_arguments = ['--log', os.path.abspath(log_path)] if log_path is not None else []
+            self.process = subprocess.Popen(
+                [sys.executable, SERVICE_SCRIPT_PATH, '--database', os.path.abspath(db_path)] + log_arguments,
+                stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True,
+                cwd=REPO_PATH)
+            self.writer, self.reader = self.process.stdin, self.process.stdout
+        else:
+            self.process = None
+            self.socket = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.socket.connect(socket_path)
+            self.writer = self.socket.makefile('w')
+            self.reader = self.socket.makefile('r')
+
+    def request(self, method, **params):
+        self.request_id += 1
+        self.writer.write(json.dumps({'id': self.request_id, 'method': method, 'params': params}) + '\n')
+        self.writer.flush()
+        line = self.reader.readline()
+        if not line:
+            raise ServiceError('Pairing service stopped')
+        response = json.loads(line)
+        if 'error' in response:
+            raise ServiceError(response['error'])
+        return response['result']
+
+    def close(self):
+        self.writer.close()
+        self.reader.close()
+        if self.process is not None:
+            self.process.wait()
+        else:
+            self.socket.close()
+
+
+def get_client(db_path, socket_path=None):
+    key = (os.path.abspath(db_path), socket_path)
+    client = _clients.get(key)
+    if client is None:
+        client = _clients[key] = ServiceClient(db_path, socket_path)
+    return client
+
+
+def get_draft_autopairing(draft_player_numbers, player_ids, db_path, socket_path=None):
+    return get_client(db_path, socket_path).request(
+        'autopairing', draft_player_numbers=draft_player_numbers, player_ids=player_ids)
+
+
+def get_player_pairings(draft_id, round_, player_ids, db_path, socket_path=None):
+    return get_client(db_path, socket_path).request(
+        'pairings', draft_id=draft_id, round=round_, player_ids=player_ids)
+
+
+def get_fafmats_scores(player_ids, opponent_ids, db_path, socket_path=None):
+    return get_client(db_path, socket_path).request('scores', player_ids=player_ids, opponent_ids=opponent_ids)
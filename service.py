@@ -0,0 +1,44 @@
+import sys
+import logging
+import logging.config
+import argparse
+
+import coloredlogs
+
+from constants import LOG_PATH, DATABASE_PATH, SERVICE_SOCKET_PATH
+from utils.connection import get_connection
+from utils.migrations import migrate_db
+from utils.registry import get_registry
+from utils.score_cache import get_score_cache
+from utils.service import serve_stream, serve_socket
+
+
+parser = argparse.ArgumentParser(
+    description='Serve autopairing, round pairings and fafmats scores as JSON lines over stdin/stdout or a socket.')
+parser.add_argument('--database', default=DATABASE_PATH)
+parser.add_argument(
+    '--socket', nargs='?', const=SERVICE_SOCKET_PATH,
+    help='listen on a unix domain socket instead of stdin/stdout (default {})'.format(SERVICE_SOCKET_PATH))
+parser.add_argument('--log', default=LOG_PATH, help='log file (default {})'.format(LOG_PATH))
+args = parser.parse_args()
+
+coloredlogs.DEFAULT_FIELD_STYLES['filename'] = {'color': 'magenta'}
+logging.config.fileConfig(
+    'logging.conf',
+    disable_existing_loggers=False,
+    defaults={'logfilename': args.log})
+for handler in logging.getLogger().handlers:  # stdout carries the responses
+    if isinstance(handler, logging.StreamHandler) and handler.stream is sys.stdout:
+        handler.setStream(sys.stderr)
+log = logging.getLogger('service')
+
+# migrate and warm up the connection, the id/name registry and the score cache before the first request
+con = get_connection(args.database)
+migrate_db(con)
+get_registry(con)
+get_score_cache(con)
+
+if args.socket:
+    serve_socket(args.socket, args.database)
+else:
+    serve_stream(sys.stdin, sys.stdout, args.database)
@@ -0,0 +1,62 @@
+import asyncio
+import sqlite3 as sl
+
+import utils.api as api
+from utils.api import ApiServer, ResponseCache
+from utils.db_utils import init_db
+from utils.migrations import migrate_db
+
+
+# run from the repository root: python -m pytest test
+
+def test_response_cache_drops_least_recently_used():
+    cache = ResponseCache(max_size=2)
+    cache.put('/games?page=1', (b'1', '"1"'))
+    cache.put('/games?page=2', (b'2', '"2"'))
+    assert cache.get('/games?page=1') == (b'1', '"1"')
+
+    cache.put('/games?page=3', (b'3', '"3"'))
+    assert list(cache.bodies) == ['/games?page=1', '/games?page=3']
+    assert cache.get('/games?page=2') is None
+
+    generation = cache.generation
+    cache.clear()
+    assert cache.generation == generation + 1 and not cache.bodies
+
+
+class ResponseWriter:
+    def __init__(self):
+        self.data = b''
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+
+def get_status(server, target):
+    writer = ResponseWriter()
+    asyncio.run(server.respond(['GET', target, 'HTTP/1.1'], {}, writer, keep_alive=False))
+    return int(writer.data.split()[1])
+
+
+def test_server_errors_are_not_blamed_on_the_client(tmp_path, monkeypatch):
+    db_path = str(tmp_path / 'data.db')
+    con = init_db(db_path)
+    migrate_db(con)
+    con.close()
+    server = ApiServer(db_path)
+    try:
+        assert get_status(server, '/players') == 200
+        assert get_status(server, '/games?page=x') == 400
+        assert get_status(server, '/unknown') == 404
+
+        def get_failing_body(target, db_path):
+            raise sl.OperationalError('no such table: game')
+
+        monkeypatch.setattr(api, 'get_json_body', get_failing_body)
+        assert get_status(server, '/games?page=2') == 500
+    finally:
+        server.executor.shutdown()
+        server.version_executor.shutdown()
@@ -0,0 +1,36 @@
+import os
+
+import pytest
+
+from kotlin import bindings
+from utils.db_utils import init_db
+
+
+# run from the repository root: python -m pytest test
+
+@pytest.fixture
+def db_path(tmp_path):
+    # a database as created before the migrations, the service migrates it on start
+    db_path = str(tmp_path / 'data.db')
+    con = init_db(db_path)
+    con.executemany(
+        'INSERT INTO player (name, familyName, elo, isSelected) VALUES (?, ?, 1000, 1)',
+        [(name, name) for name in ('a', 'b', 'c')])
+    con.commit()
+    con.close()
+    return db_path
+
+
+def test_client_starts_the_service(db_path, tmp_path):
+    log_path = tmp_path / 'service.log'
+    client = bindings.ServiceClient(db_path, log_path=log_path)
+    try:
+        assert client.request('ping') == 'pong'
+        scores = client.request('scores', player_ids=[1, 2], opponent_ids=[2, 3])
+        assert len(scores) == 2 and len(scores[0]) == 2
+        with pytest.raises(bindings.ServiceError):
+            client.request('unknown')
+    finally:
+        client.close()
+    assert 'Unknown method' in log_path.read_text()
+    assert not os.path.exists(os.path.join(bindings.REPO_PATH, 'log'))
@@ -0,0 +1,29 @@
+import warnings
+
+import numpy as np
+
+from utils.db_utils import init_db
+from utils.export import read_history_columns
+from utils.migrations import migrate_db
+
+
+# run from the repository root: python -m pytest test
+
+def test_dates_with_offsets_are_read_as_utc():
+    con = init_db(':memory:')
+    migrate_db(con)
+    con.execute("""
+        INSERT INTO player (name, familyName, elo, isSelected) VALUES ('a', 'a', 1000, 1), ('b', 'b', 1000, 1)
+        """)
+    dates = ['2024-01-01 12:00:00', '2024-01-01 12:00:00+02:00', '2024-01-01 23:30:00.250000-05:00']
+    for game_id, date in enumerate(dates, start=1):
+        con.execute("INSERT INTO game (id, playerA, playerB, result, date) VALUES (?, 1, 2, '2:0', ?)", [game_id, date])
+        con.execute('INSERT INTO history (player, game, eloBefore, eloAfter) VALUES (1, ?, 1000, 1016)', [game_id])
+
+    with warnings.catch_warnings():
+        warnings.simplefilter('error')
+        _, game_ids, timestamps, _ = read_history_columns(con)
+    expected = {1: '2024-01-01T12:00:00', 2: '2024-01-01T10:00:00', 3: '2024-01-02T04:30:00.250000'}
+    assert dict(zip(game_ids.tolist(), timestamps)) == {game_id: np.datetime64(date, 'us')
+                                                        for game_id, date in expected.items()}
+    con.close()
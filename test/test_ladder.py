@@ -0,0 +1,67 @@
+import pytest
+
+import utils.cli_utils as cli_utils
+import utils.ladder as ladder_module
+import utils.replay as replay
+from utils.db_utils import init_db, add_player
+from utils.ladder import Ladder, get_ladder, get_history_ranks
+from utils.migrations import migrate_db
+
+
+# run from the repository root: python -m pytest test
+
+@pytest.fixture
+def con():
+    con = init_db(':memory:')
+    migrate_db(con)
+    yield con
+    ladder_module.forget_ladder(con)
+    con.close()
+
+
+def test_recording_games_keeps_the_ladder(con, monkeypatch):
+    player_ids = [add_player(name, name, con) for name in ('a', 'b', 'c')]
+    get_ladder(con)
+
+    loaded_ladders = []
+
+    class CountedLadder(Ladder):
+        def __init__(self, player_elos, token):
+            loaded_ladders.append(token)
+            super().__init__(player_elos, token)
+
+    monkeypatch.setattr(ladder_module, 'Ladder', CountedLadder)
+    monkeypatch.setattr(cli_utils, 'get_confimation', lambda *args, **kwargs: True)
+    for playerA_index, playerB_index in [(0, 1), (1, 2), (2, 0), (0, 1), (0, 2)]:
+        cli_utils.hande_add_game_result(player_ids[playerA_index], player_ids[playerB_index], '2:0', con)
+    ladder = get_ladder(con)
+    assert loaded_ladders == []
+
+    ladder_module.forget_ladder(con)
+    reloaded_ladder = get_ladder(con)
+    assert len(loaded_ladders) == 1
+    assert ladder.keys == reloaded_ladder.keys
+    assert [ladder.get_rank(player_id) for player_id in player_ids] == \
+        [reloaded_ladder.get_rank(player_id) for player_id in player_ids]
+
+
+def test_history_ranks_do_not_depend_on_checkpoints(con, monkeypatch):
+    monkeypatch.setattr(replay, 'RATING_CHECKPOINT_INTERVAL', 4)
+    monkeypatch.setattr(replay.replay_games, '__defaults__', (4, ))
+    monkeypatch.setattr(cli_utils, 'get_confimation', lambda *args, **kwargs: True)
+    player_ids = [add_player(name, name, con) for name in ('a', 'b', 'c', 'd')]
+    add_player('idle', 'idle', con)  # registered at the start elo, never plays
+    for playerA_index, playerB_index in [(0, 1), (2, 3), (0, 2), (1, 3), (0, 3), (2, 1)] * 2:
+        cli_utils.hande_add_game_result(player_ids[playerA_index], player_ids[playerB_index], '2:0', con)
+    game_ids = [game_id for (game_id, ) in con.execute('SELECT game FROM history WHERE player = ?', [player_ids[3]])]
+
+    def get_all_ranks():
+        return [get_history_ranks(player_id, game_ids[k:], con) for player_id in player_ids for k in range(3)]
+
+    assert con.execute('SELECT COUNT(DISTINCT game) FROM ratingCheckpoint').fetchall()[0][0] == 3
+    added_checkpoint_ranks = get_all_ranks()
+    con.execute('DELETE FROM ratingCheckpoint')
+    no_checkpoint_ranks = get_all_ranks()
+    replay.rebuild_ratings(con)
+    assert con.execute('SELECT COUNT(DISTINCT game) FROM ratingCheckpoint').fetchall()[0][0] == 3
+    assert added_checkpoint_ranks == no_checkpoint_ranks == get_all_ranks()
@@ -0,0 +1,40 @@
+import numpy as np
+import pytest
+
+from utils.pairing import get_matching_pair_indices
+
+
+# run from the repository root: python -m pytest test
+
+def get_best_total(weights, bye_weights, players):
+    # every pairing of the players, tried one by one
+    if not players:
+        return 0.
+    player, others = players[0], players[1:]
+    best_total = -np.inf
+    if len(players) % 2 != 0:
+        best_total = bye_weights[player] + get_best_total(weights, bye_weights, others)
+    for opponent in others:
+        rest = [other for other in others if other != opponent]
+        best_total = max(best_total, weights[player, opponent] + get_best_total(weights, bye_weights, rest))
+    return best_total
+
+
+def get_total(pair_indices, weights, bye_weights):
+    return sum(weights[indices] if len(indices) == 2 else bye_weights[indices[0]] for indices in pair_indices)
+
+
+@pytest.mark.parametrize('n_players', range(1, 12))
+def test_matching_is_optimal(n_players):
+    rng = np.random.default_rng(n_players)
+    for _ in range(20):
+        weights = rng.random((n_players, n_players))
+        weights = (weights + weights.T) / 2
+        bye_weights = rng.random(n_players) - 0.5
+
+        pair_indices, upper_bound = get_matching_pair_indices(weights, bye_weights)
+        assert sorted(index for indices in pair_indices for index in indices) == list(range(n_players))
+        assert sum(len(indices) == 1 for indices in pair_indices) == n_players % 2
+        best_total = get_best_total(weights, bye_weights, list(range(n_players)))
+        assert get_total(pair_indices, weights, bye_weights) == pytest.approx(best_total)
+        assert upper_bound == pytest.approx(best_total)
@@ -0,0 +1,41 @@
+import pytest
+
+from utils.db_utils import init_db, add_games_batch, get_last_game_id, get_games_pages, get_games_table
+from utils.migrations import migrate_db
+
+
+# run from the repository root: python -m pytest test
+
+def add_games(n_games, first_day, con):
+    first_game_id = get_last_game_id(con) + 1
+    game_rows = [(first_game_id + k, 1, 2, '2:0', '2024-01-{:02d} 12:00:00'.format(first_day + k))
+                 for k in range(n_games)]
+    add_games_batch(game_rows, [], {}, con)
+
+
+@pytest.fixture(params=[True, False], ids=['with cache state', 'without cache state'])
+def con(request):
+    con = init_db(':memory:')
+    migrate_db(con)
+    if not request.param:  # writes can't be noticed without the cache token
+        for (trigger_name, ) in con.execute("SELECT name FROM sqlite_master WHERE type = 'trigger'").fetchall():
+            con.execute('DROP TRIGGER {}'.format(trigger_name))
+        con.execute('DROP TABLE cacheState')
+    con.execute("""
+        INSERT INTO player (name, familyName, elo, isSelected) VALUES ('a', 'a', 1000, 1), ('b', 'b', 1000, 1)
+        """)
+    yield con
+    con.close()
+
+
+def test_tables_list_all_games_by_default(con):
+    add_games(12, 1, con)
+    assert len(get_games_table(con, limit=5).splitlines()) == 2 + 12
+    assert len(get_games_table(con, page=3, limit=5).splitlines()) == 2 + 2
+
+
+def test_pages_follow_new_games(con):
+    add_games(10, 1, con)
+    assert [row[0] for row in next(get_games_pages(con, None, 2, 3))] == [7, 6, 5]
+    add_games(1, 20, con)  # newest game, every page shifts by one
+    assert [row[0] for row in next(get_games_pages(con, None, 2, 3))] == [8, 7, 6]
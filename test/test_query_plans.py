@@ -0,0 +1,74 @@
+import re
+
+import pytest
+
+from utils.db_utils import (init_db, get_games_pages, get_history_pages, get_max_elo, get_head_to_head,
+                            get_n_encounters, get_encounter_pairs, get_draft_players, get_draft_games_table,
+                            get_active_draft_players, get_draft_wins, get_previous_draft_pairings,
+                            get_previous_draft_suspensions, get_draft_round_games)
+from utils.migrations import migrate_db
+
+
+# run from the repository root: python -m pytest test
+
+@pytest.fixture
+def con():
+    con = init_db(':memory:')
+    migrate_db(con)
+    yield con
+    con.close()
+
+
+def get_query_plans(function, con):
+    # the plans of the queries the function runs, traced with their parameters filled in, without the cache token
+    statements = []
+    con.set_trace_callback(statements.append)
+    try:
+        function()
+    finally:
+        con.set_trace_callback(None)
+    return [[row[3] for row in con.execute('EXPLAIN QUERY PLAN ' + statement)]
+            for statement in statements
+            if statement.lstrip().startswith('SELECT') and 'cacheState' not in statement]
+
+
+PAIR_INDEX_NAME = 'sqlite_autoindex_pairStats_1'  # the primary key of pairStats
+
+
+@pytest.mark.parametrize('function, index_names, scanned_tables', [
+    (lambda con: list(get_games_pages(con, None, 1, 5)), ['gameDate'], []),
+    (lambda con: list(get_games_pages(con, None, 3, 5)), ['gameDate'], []),
+    (lambda con: list(get_games_pages(con, 1, 3, 5)), ['gamePlayers', 'gamePlayerB'], []),
+    (lambda con: list(get_history_pages(con, 1, 3, 5)), ['historyPlayer'], []),
+    (lambda con: get_max_elo(1, con), ['historyPlayer'], []),
+    (lambda con: get_head_to_head(2, 1, con), [PAIR_INDEX_NAME], []),
+    (lambda con: get_n_encounters(1, 2, con), [PAIR_INDEX_NAME], []),
+    (lambda con: get_encounter_pairs([1, 2], con), [], ['pairStats']),  # every pair is needed, but no games
+    (lambda con: get_draft_players(1, con), ['draftPlayerDraft'], []),
+    (lambda con: get_active_draft_players(1, con), ['draftPlayerDraft'], []),
+    (lambda con: get_draft_games_table(1, con), ['draftGameRound'], []),
+    (lambda con: get_draft_round_games(1, 2, con), ['draftGameRound'], []),
+    (lambda con: get_draft_wins(1, 2, con), ['draftGameRound', 'draftSuspensionRound'], []),
+    (lambda con: get_previous_draft_pairings(1, 2, con), ['draftPairingRound'], []),
+    (lambda con: get_previous_draft_suspensions(1, 2, con), ['draftSuspensionRound'], []),
+])
+def test_lookups_use_indexes(con, function, index_names, scanned_tables):
+    con.execute("""
+        INSERT INTO player (name, familyName, elo, isSelected) VALUES ('a', 'a', 1000, 1), ('b', 'b', 1000, 1)
+        """)
+    con.execute("INSERT INTO game (playerA, playerB, result, date) VALUES (1, 2, '2:0', '2024-01-01 12:00:00')")
+    con.execute('INSERT INTO history (player, game, eloBefore, eloAfter) VALUES (1, 1, 1000, 1016)')
+    con.execute("INSERT INTO draft (name, active, round, date) VALUES ('d', 1, 2, '2024-01-01 12:00:00')")
+    con.execute('INSERT INTO draftPlayer (player, draft, rank, active) VALUES (1, 1, 1, 1), (2, 1, 2, 1)')
+    con.execute('INSERT INTO draftPairing (draft, round, playerA, playerB) VALUES (1, 1, 1, 2)')
+    con.execute('INSERT INTO draftGame (game, draft, round) VALUES (1, 1, 1)')
+
+    query_plans = get_query_plans(lambda: function(con), con)
+    assert query_plans
+    for query_plan in query_plans:
+        for step in query_plan:
+            # a full table scan reads "SCAN m" or "SCAN game", an index scan names the index
+            scan = re.fullmatch(r'SCAN (\w+)', step)
+            assert not scan or scan.group(1) in scanned_tables, query_plan
+        for index_name in index_names:
+            assert any('INDEX {}'.format(index_name) in step for step in query_plan), query_plan
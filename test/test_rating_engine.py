@@ -0,0 +1,48 @@
+import pytest
+
+import utils.cli_utils as cli_utils
+import utils.replay as replay
+from data_types import HandleException
+from utils.db_utils import init_db, add_player
+from utils.migrations import migrate_db
+from utils.rating import get_rating_engine
+
+
+# run from the repository root: python -m pytest test
+
+@pytest.fixture
+def con():
+    con = init_db(':memory:')
+    migrate_db(con)
+    yield con
+    con.close()
+
+
+def get_history_counts(con):
+    return con.execute('SELECT COUNT(*), COUNT(DISTINCT game) FROM history').fetchall()[0]
+
+
+def test_elo_database_switched_to_glicko2(con, monkeypatch):
+    monkeypatch.setattr(cli_utils, 'get_confimation', lambda *args, **kwargs: True)
+    player_ids = [add_player(name, name, con) for name in ('a', 'b', 'c')]
+    for playerA_index, playerB_index in [(0, 1), (1, 2), (2, 0), (0, 1)]:
+        cli_utils.hande_add_game_result(player_ids[playerA_index], player_ids[playerB_index], '2:0', con)
+    con.commit()
+    assert replay.get_rated_engine_name(con) == 'elo'
+    assert get_history_counts(con) == (8, 4)
+
+    glicko2 = get_rating_engine('glicko2')
+    monkeypatch.setattr(cli_utils, 'get_rating_engine', lambda: glicko2)
+    monkeypatch.setattr(replay, 'get_rating_engine', lambda: glicko2)
+    with pytest.raises(ValueError):
+        replay.close_rating_period(con, glicko2)
+    with pytest.raises(HandleException):
+        cli_utils.hande_add_game_result(player_ids[0], player_ids[2], '2:0', con)
+    assert get_history_counts(con) == (8, 4)
+
+    # a full rebuild switches the engine, the games are then rated once by the next rating period
+    replay.rebuild_ratings(con)
+    assert replay.get_rated_engine_name(con) == 'glicko2'
+    cli_utils.hande_add_game_result(player_ids[0], player_ids[2], '2:0', con)
+    assert replay.close_rating_period(con, glicko2) == 5
+    assert get_history_counts(con) == (10, 5)
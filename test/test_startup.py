@@ -0,0 +1,61 @@
+import os
+import re
+import shutil
+import subprocess
+import sys
+import time
+
+import pytest
+
+from utils.db_utils import init_db, add_player
+from utils.migrations import migrate_db
+
+
+# run from the repository root: python -m pytest test
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ONE_SHOT_TIME_BUDGET = 2.  # seconds, a listing takes about 0.4s and importing scipy alone about 0.8s
+
+
+@pytest.fixture
+def work_path(tmp_path):
+    # fafmats.py opens data/data.db and logging.conf relative to the working directory
+    os.mkdir(tmp_path / 'data')
+    con = init_db(str(tmp_path / 'data' / 'data.db'))
+    migrate_db(con)
+    add_player('a', 'a', con)
+    con.commit()
+    con.close()
+    shutil.copy(os.path.join(REPO_PATH, 'logging.conf'), tmp_path)
+    return tmp_path
+
+
+def run_one_shot(command, work_path, python_options=()):
+    process = subprocess.run(
+        [sys.executable] + list(python_options) + [os.path.join(REPO_PATH, 'fafmats.py'), '-c', command],
+        cwd=work_path, capture_output=True, text=True, env=dict(os.environ, PYTHONPATH=REPO_PATH))
+    assert process.returncode == 0, process.stderr
+    return process
+
+
+def get_imported_modules(command, work_path):
+    # top level modules the one-shot command imports, from the -X importtime report on stderr
+    process = run_one_shot(command, work_path, ['-X', 'importtime'])
+    return set(re.findall(r'^import time:.*\|\s*(\w+)\s*$', process.stderr, flags=re.MULTILINE))
+
+
+@pytest.mark.parametrize('command', ['P E', 'G', 'H a'])
+def test_listings_skip_pairing_imports(work_path, command):
+    # scipy and fastcluster are imported lazily by the pairing, they dominate the startup time
+    assert not get_imported_modules(command, work_path) & {'scipy', 'fastcluster'}
+
+
+@pytest.mark.parametrize('command', ['P E', 'G', 'H a'])
+def test_listings_start_quickly(work_path, command):
+    # the best of a few cold starts, to ride out a busy machine
+    start_times = []
+    for _ in range(3):
+        start = time.perf_counter()
+        run_one_shot(command, work_path)
+        start_times.append(time.perf_counter() - start)
+    assert min(start_times) < ONE_SHOT_TIME_BUDGET
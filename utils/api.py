@@ -0,0 +1,267 @@
+import json
+import asyncio
+import hashlib
+import logging
+from collections import OrderedDict
+from urllib.parse import urlsplit, parse_qs
+from concurrent.futures import ThreadPoolExecutor
+
+from constants import SORT_METHOD_STRINGS, PAGE_SIZE, API_POLL_INTERVAL, API_DB_THREADS, API_CACHE_SIZE
+from utils.connection import get_connection
+from utils.registry import get_registry, get_data_version
+from utils.db_utils import get_players, get_games_pages, get_history_pages, get_drafts, \
+    get_round_by_draft_id, get_draft_pairings_by_draft_id, get_draft_suspensions_by_draft_id, get_draft_wins
+
+
+log = logging.getLogger('api')
+
+STATUS_MESSAGES = {
+    200: 'OK', 304: 'Not Modified', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed',
+    500: 'Internal Server Error',
+}
+
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def get_player_id(value, con):
+    # players are addressed by id or name
+    registry = get_registry(con)
+    player_id = int(value) if value.isdigit() else registry.player_ids.get(value)
+    if player_id not in registry.player_names:
+        raise ApiError(404, 'Player "{}" does not exist'.format(value))
+    return player_id
+
+
+def get_draft_id(value, con):
+    registry = get_registry(con)
+    draft_id = int(value) if value.isdigit() else registry.draft_ids.get(value)
+    if draft_id not in registry.draft_names:
+        raise ApiError(404, 'Draft "{}" does not exist'.format(value))
+    return draft_id
+
+
+def get_paging(query):
+    try:
+        page = int(query.get('page', 1))
+        limit = int(query.get('limit', PAGE_SIZE))
+    except ValueError:
+        raise ApiError(400, 'page and limit must be numbers')
+    if page < 1 or limit < 1:
+        raise ApiError(400, 'page and limit must be positive')
+    return page, limit
+
+
+def get_players_response(query, con):
+    method = query.get('sort', 'E')
+    if method not in SORT_METHOD_STRINGS:
+        raise ApiError(400, 'sort must be one of {}'.format(', '.join(SORT_METHOD_STRINGS)))
+    return [{'name': name, 'elo': elo, 'id': id_, 'joined': joined}
+            for name, elo, id_, joined in get_players(con, method)]
+
+
+def get_games_response(query, con):
+    player_id = get_player_id(query['player'], con) if 'player' in query else None
+    page, limit = get_paging(query)
+    rows = next(get_games_pages(con, player_id, page, limit))
+    return [{'id': game_id, 'playerA': playerA_name, 'playerB': playerB_name, 'result': result, 'date': date}
+            for game_id, playerA_name, playerB_name, result, date in rows]
+
+
+def get_history_response(query, con, player):
+    player_id = get_player_id(player, con)
+    page, limit = get_paging(query)
+    rows = next(get_history_pages(con, player_id, page, limit))
+    return [{'game': game_id, 'player': player_name, 'opponent': opponent_name, 'result': result, 'date': date,
+             'elo': elo_after}
+            for game_id, player_name, opponent_name, result, date, elo_after in rows]
+
+
+def get_drafts_response(query, con):
+    return [{'id': id_, 'name': name, 'active': active, 'round': round_, 'date': date}
+            for id_, name, active, round_, date in get_drafts(con)]
+
+
+def get_pairings_response(query, con, draft):
+    draft_id = get_draft_id(draft, con)
+    round_ = get_round_by_draft_id(draft_id, con)
+    player_names = get_registry(con).player_names
+    pairings = get_draft_pairings_by_draft_id(draft_id, round_, con)
+    suspensions = get_draft_suspensions_by_draft_id(draft_id, round_, con)
+    return {
+        'round': round_,
+        'pairings': [[player_names[playerA_id], player_names[playerB_id]] for playerA_id, playerB_id in pairings],
+        'byes': [player_names[player_id] for player_id in suspensions],
+    }
+
+
+def get_standings_response(query, con, draft):
+    # points including the games of the current round
+    draft_id = get_draft_id(draft, con)
+    round_ = get_round_by_draft_id(draft_id, con)
+    player_names = get_registry(con).player_names
+    points = get_draft_wins(draft_id, round_ + 1, con)
+    standings = sorted(points.items(), key=lambda item: -item[1])
+    return [{'player': player_names[player_id], 'points': player_points} for player_id, player_points in standings]
+
+
+ROUTES = [
+    (('players',), get_players_response),
+    (('players', None, 'history'), get_history_response),
+    (('games',), get_games_response),
+    (('drafts',), get_drafts_response),
+    (('drafts', None, 'pairings'), get_pairings_response),
+    (('drafts', None, 'standings'), get_standings_response),
+]
+
+
+def get_route(path):
+    # None in a route matches any path segment, which is passed on to the handler
+    segments = tuple(segment for segment in path.split('/') if segment)
+    for route, handler in ROUTES:
+        if len(route) == len(segments) and all(part in (None, segment) for part, segment in zip(route, segments)):
+            return handler, [segment for part, segment in zip(route, segments) if part is None]
+    raise ApiError(404, 'Unknown path "{}"'.format(path))
+
+
+def get_json_body(target, db_path):
+    # runs on a database thread
+    try:
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+    except ValueError as error:
+        raise ApiError(400, 'Malformed target: {}'.format(error))
+    handler, arguments = get_route(url.path)
+    data = handler(query, get_connection(db_path), *arguments)
+    return json.dumps(data, default=str).encode()
+
+
+class ResponseCache:
+    # response bodies by request target, dropped whenever the database changes.
+    # every query string is its own target, so only the max_size most recently used ones are kept
+
+    def __init__(self, max_size=API_CACHE_SIZE):
+        self.generation = 0
+        self.max_size = max_size
+        self.bodies = OrderedDict()
+
+    def get(self, target):
+        cached = self.bodies.get(target)
+        if cached is not None:
+            self.bodies.move_to_end(target)
+        return cached
+
+    def put(self, target, cached):
+        self.bodies[target] = cached
+        self.bodies.move_to_end(target)
+        while len(self.bodies) > self.max_size:
+            self.bodies.popitem(last=False)
+
+    def clear(self):
+        self.generation += 1
+        self.bodies = OrderedDict()
+
+
+class ApiServer:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self.cache = ResponseCache()
+        self.executor = ThreadPoolExecutor(max_workers=API_DB_THREADS, thread_name_prefix='api-db')
+        # data_version is per connection, so it is always read by the same thread
+        self.version_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='api-version')
+
+    def get_data_version(self):
+        return get_data_version(get_connection(self.db_path))
+
+    async def watch_data_version(self):
+        loop = asyncio.get_running_loop()
+        data_version = await loop.run_in_executor(self.version_executor, self.get_data_version)
+        while True:
+            await asyncio.sleep(API_POLL_INTERVAL)
+            new_data_version = await loop.run_in_executor(self.version_executor, self.get_data_version)
+            if new_data_version != data_version:
+                data_version = new_data_version
+                self.cache.clear()
+
+    async def get_cached_body(self, target):
+        # body and etag, only the first request after a change touches the database
+        cached = self.cache.get(target)
+        if cached is None:
+            generation = self.cache.generation
+            loop = asyncio.get_running_loop()
+            body = await loop.run_in_executor(self.executor, get_json_body, target, self.db_path)
+            cached = (body, '"{}"'.format(hashlib.sha1(body).hexdigest()))
+            if generation == self.cache.generation:  # not computed across a change
+                self.cache.put(target, cached)
+        return cached
+
+    async def handle_client(self, reader, writer):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                headers = {}
+                while True:
+                    header_line = await reader.readline()
+                    if header_line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header_line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                await self.respond(request_line.decode('latin-1').split(), headers, writer, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def respond(self, request_parts, headers, writer, keep_alive):
+        etag = None
+        try:
+            if len(request_parts) != 3:
+                raise ApiError(400, 'Malformed request')
+            method, target, _ = request_parts
+            if method not in ('GET', 'HEAD'):
+                raise ApiError(405, 'Only GET is supported')
+            body, etag = await self.get_cached_body(target)
+            status = 304 if headers.get('if-none-match') == etag else 200
+        except ApiError as error:  # invalid requests and parameters
+            status, body = error.status, json.dumps({'error': str(error)}).encode()
+        except Exception:
+            log.exception('Request failed: {}'.format(' '.join(request_parts)))
+            status, body = 500, json.dumps({'error': 'Internal server error'}).encode()
+
+        if status == 304 or request_parts[:1] == ['HEAD']:
+            content = b''
+        else:
+            content = body
+        response_headers = [
+            'HTTP/1.1 {} {}'.format(status, STATUS_MESSAGES[status]),
+            'Content-Type: application/json',
+            'Content-Length: {}'.format(len(content)),
+            'Cache-Control: no-cache',
+            'Access-Control-Allow-Origin: *',
+            'Connection: {}'.format('keep-alive' if keep_alive else 'close'),
+        ]
+        if etag is not None:
+            response_headers.append('ETag: {}'.format(etag))
+        writer.write(('\r\n'.join(response_headers) + '\r\n\r\n').encode('latin-1') + content)
+        await writer.drain()
+
+    async def serve(self, host, port):
+        server = await asyncio.start_server(self.handle_client, host, port)
+        log.info('Serving {} on http://{}:{}'.format(self.db_path, host, port))
+        watcher = asyncio.create_task(self.watch_data_version())
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            watcher.cancel()
+            self.executor.shutdown()
+            self.version_executor.shutdown()
@@ -1,24 +1,37 @@
+import os
 import re
 import logging
+from time import perf_counter
 
 from tabulate import tabulate
 
 from constants import RESULT_SCORE_DICT, WRONG_ORDER_RESULTS, INVERSE_RESULT_DICT, \
-    YES_STRINGS, NO_STRINGS, SORT_METHOD_STRINGS
+    YES_STRINGS, NO_STRINGS, SORT_METHOD_STRINGS, PAGE_SIZE, EXPORT_PATH, SIMULATION_COUNT
 from utils.db_utils import add_player, add_game, update_elo, \
     get_player_id_by_name, get_player_elo, \
-    get_players_table, get_games_table, get_history_table, \
+    get_players_table, get_games_table_chunks, get_history_table_chunks, \
     add_draft, get_draft_id_by_name, add_player_to_draft, \
     get_drafts_table, get_draft_table, \
-    get_all_player_ids, get_player_name_by_id, get_n_encounters, \
-    get_elo_difference, get_fafmats_scores, \
+    get_all_player_ids, get_player_name_by_id, \
+    get_elo_difference_matrix, get_encounter_matrix, get_fafmats_score_matrix, \
     get_round_by_draft_id, get_active_draft_players, \
     add_player_draft_pairing, get_draft_pairings_by_draft_id, \
-    get_draft_suspensions_by_draft_id, get_draft_name_by_id, \
+    get_draft_suspensions_by_draft_id, \
     delete_pairings_by_draft_id, delete_suspensions_by_draft_id, \
-    add_game_id_to_draft, get_draft_players
+    add_game_id_to_draft, get_draft_players, get_draft_round_games, set_draft_round, \
+    get_head_to_head, get_game, update_game_result, get_event_draft_ids
 from utils.elo import get_elo_difference_from_result
-from utils.pairing import get_draft_autopairing, get_player_pairings
+from utils.registry import get_registry
+from utils.score_cache import get_cache_token, update_score_cache_players
+from utils.ladder import get_ladder
+from utils.export import export_history
+from utils.simulation import get_draft_state, get_default_round_count, simulate_draft
+from utils.import_utils import parse_game_file, import_games, is_back_dated
+from utils.replay import rebuild_ratings, add_checkpoint_if_due, get_rating_audit, close_rating_period, \
+    check_rating_engine
+from utils.rating import get_rating_engine
+from utils.snapshot import get_snapshots, take_snapshot, restore_snapshot
+from utils.pairing import get_draft_autopairing, get_player_pairings, get_table_summaries, get_event_pairings
 from data_types import HandleException
 
 
@@ -110,12 +123,26 @@ def get_players_and_result_from_string(input_string, con):
     return playerA_id, playerB_id, result_string
 
 
+def get_checked_rating_engine(con):
+    # the configured engine, if it made the stored ratings
+    engine = get_rating_engine()
+    try:
+        check_rating_engine(engine, con)
+    except ValueError as error:
+        log.error('{}!'.format(error))
+        raise HandleException
+    return engine
+
+
 def handle_add_game(input_string, con):
     playerA_id, playerB_id, result_string = get_players_and_result_from_string(input_string, con)
     hande_add_game_result(playerA_id, playerB_id, result_string, con)
 
 
 def hande_add_game_result(playerA_id, playerB_id, result_string, con):
+    if get_checked_rating_engine(con).rates_in_periods:
+        return hande_add_period_game_result(playerA_id, playerB_id, result_string, con)
+
     # get elo difference
     playerA_elo = get_player_elo(playerA_id, con)
     playerB_elo = get_player_elo(playerB_id, con)
@@ -133,33 +160,242 @@ def hande_add_game_result(playerA_id, playerB_id, result_string, con):
     confirmation = get_confimation('    Add result?', default=True)
     if confirmation:
         log.info('Accepted Result')
+        cache_token = get_cache_token(con)
         game_id = add_game(playerA_id, playerB_id, result_string, con)
         update_elo(playerA_id, elo_difference, game_id, con)
         update_elo(playerB_id, - elo_difference, game_id, con)
+        update_score_cache_players([playerA_id, playerB_id], cache_token, con)
+        add_checkpoint_if_due(con)
+        return game_id
+    else:
+        log.info('Rejected Result')
+        raise HandleException
+
+
+def hande_add_period_game_result(playerA_id, playerB_id, result_string, con):
+    # the game is rated when the rating period is closed
+    log.info('Result:\n{} {} {}, rated at the end of the rating period'.format(
+        get_player_name_by_id(playerA_id, con), result_string, get_player_name_by_id(playerB_id, con)))
+
+    confirmation = get_confimation('    Add result?', default=True)
+    if confirmation:
+        log.info('Accepted Result')
+        cache_token = get_cache_token(con)
+        game_id = add_game(playerA_id, playerB_id, result_string, con)
+        update_score_cache_players([playerA_id, playerB_id], cache_token, con)
         return game_id
     else:
         log.info('Rejected Result')
         raise HandleException
 
 
+def handle_close_rating_period(con):
+    engine = get_checked_rating_engine(con)
+    if not engine.rates_in_periods:
+        log.error('The {} engine rates every game when it is added, there are no rating periods!'.format(engine.name))
+        return
+    confirmation = get_confimation('    Rate all games of the rating period and start the next one?', default=False)
+    if not confirmation:
+        return
+    start_time = perf_counter()
+    n_games = close_rating_period(con, engine)
+    log.info('Rated {} games in {:.2f}s'.format(n_games, perf_counter() - start_time))
+
+
+def handle_import_games(input_string, con):
+    input_strings = input_string.split()
+    if len(input_strings) not in (1, 2) or input_strings[1:] not in ([], ['dry']):
+        log.error('Need file path and optionally "dry"!')
+        return
+    path = input_strings[0]
+    dry_run = len(input_strings) == 2
+
+    try:
+        games, errors = parse_game_file(path, con)
+    except (OSError, ValueError) as error:
+        log.error('Could not read "{}": {}'.format(path, error))
+        return
+
+    for line_number, error in errors:
+        log.error('Line {}: {}'.format(line_number, error))
+    log.info('Read {} games with {} errors from "{}"'.format(len(games), len(errors), path))
+
+    if is_back_dated(games, con):
+        log.warning('Some games are older than the last recorded game, ratings are replayed from before them.')
+
+    if dry_run:
+        return
+    if errors:
+        log.error('Nothing imported, fix the errors first!')
+        return
+
+    confirmation = get_confimation('    Import {} games?'.format(len(games)), default=True)
+    if confirmation:
+        try:
+            n_games = import_games(games, con)
+        except ValueError as error:
+            log.error('Nothing imported: {}'.format(error))
+            return
+        log.info('Imported {} games'.format(n_games))
+
+
+def handle_export_history(input_string, con):
+    input_strings = input_string.split()
+    path = EXPORT_PATH
+    if input_strings and input_strings[0] not in ('day', 'lttb'):
+        path = input_strings.pop(0)
+
+    downsampling, n_points = None, None
+    if input_strings[:1] == ['day'] and len(input_strings) == 1:
+        downsampling = 'day'
+    elif input_strings[:1] == ['lttb'] and len(input_strings) == 2 and input_strings[1].isdigit():
+        downsampling, n_points = 'lttb', int(input_strings[1])
+    elif input_strings:
+        log.error('Downsampling must be "day" or "lttb <POINTS>"!')
+        return
+
+    start_time = perf_counter()
+    n_rows = export_history(path, con, downsampling, n_points)
+    log.info('Exported {} elo values to "{}" in {:.2f}s'.format(n_rows, path, perf_counter() - start_time))
+
+
+def handle_snapshots(input_string, con):
+    command, _, argument = input_string.partition(' ')
+    argument = argument.strip()
+    if not command:
+        handle_show_snapshots(con)
+    elif command == 'save':
+        take_snapshot(con, argument or None)
+    elif command == 'restore' and argument:
+        handle_restore_snapshot(argument, con)
+    else:
+        log.error('Need "save [<LABEL>]", "restore <NUMBER/NAME>" or nothing!')
+
+
+def handle_show_snapshots(con):
+    snapshots = get_snapshots(con)
+    if not snapshots:
+        log.info('No snapshots yet')
+        return
+    table_data = [(i, os.path.basename(path), date, label or '', os.path.getsize(path) / 1e6)
+                  for i, (path, date, label) in enumerate(snapshots, start=1)]
+    table = tabulate(table_data, headers=('#', 'snapshot', 'date', 'label', 'MB'), floatfmt='.1f')
+    log.info('\n' + table)
+
+
+def handle_restore_snapshot(input_string, con):
+    snapshots = get_snapshots(con)
+    if input_string.isdigit() and 1 <= int(input_string) <= len(snapshots):
+        path = snapshots[int(input_string) - 1][0]
+    else:
+        paths = [path for path, _, _ in snapshots if os.path.basename(path) in (input_string, input_string + '.db')]
+        if not paths:
+            log.error('Could not find snapshot "{}"'.format(input_string))
+            return
+        path = paths[0]
+
+    confirmation = get_confimation('    Replace the database with "{}"? The current state is saved first.'.format(
+        os.path.basename(path)), default=False)
+    if not confirmation:
+        return
+    take_snapshot(con)
+    restore_snapshot(path, con)
+
+
+def handle_ratings(input_string, con):
+    if not input_string:
+        handle_rating_audit(con)
+    elif input_string == 'rebuild':
+        handle_rebuild_ratings(con)
+    else:
+        handle_correct_game(input_string, con)
+
+
+def handle_rating_audit(con):
+    start_time = perf_counter()
+    audit_rows = get_rating_audit(con)
+    log.info('Replayed all games in {:.2f}s'.format(perf_counter() - start_time))
+    if not audit_rows:
+        log.info('All elos match the replayed games')
+        return
+    table = tabulate(audit_rows, headers=('name', 'elo', 'replayed elo', 'difference'), floatfmt='.0f')
+    log.warning('\n' + table)
+
+
+def handle_rebuild_ratings(con):
+    confirmation = get_confimation('    Replay all games and overwrite elos and history?', default=False)
+    if not confirmation:
+        return
+    start_time = perf_counter()
+    n_games = rebuild_ratings(con)
+    log.info('Replayed {} games in {:.2f}s'.format(n_games, perf_counter() - start_time))
+
+
+def handle_correct_game(input_string, con):
+    game_id_string, _, players_and_result_string = input_string.partition(' ')
+    if not game_id_string.isdigit():
+        log.error('Need game id, 2 names and result!')
+        return
+    game_id = int(game_id_string)
+    game = get_game(game_id, con)
+    if game is None:
+        log.error('Game {} does not exist!'.format(game_id))
+        return
+
+    playerA_id, playerB_id, result_string = get_players_and_result_from_string(players_and_result_string, con)
+    if {playerA_id, playerB_id} != {game[0], game[1]}:
+        log.error('Game {} was played between {} and {}!'.format(
+            game_id, get_player_name_by_id(game[0], con), get_player_name_by_id(game[1], con)))
+        return
+
+    get_checked_rating_engine(con)
+    confirmation = get_confimation('    Change result of game {} from {} to {} and replay?'.format(
+        game_id, game[2], result_string), default=True)
+    if not confirmation:
+        return
+    start_time = perf_counter()
+    update_game_result(game_id, playerA_id, playerB_id, result_string, con)
+    n_games = rebuild_ratings(con, game_id)
+    log.info('Replayed {} games in {:.2f}s'.format(n_games, perf_counter() - start_time))
+
+
+def get_paging_from_string(input_string):
+    # splits "<ARGUMENT> [--page <N>] [--limit <N>]" into the argument, page and limit
+    input_strings = input_string.split()
+    options = {'--page': None, '--limit': PAGE_SIZE}
+    arguments = []
+    while input_strings:
+        input_part = input_strings.pop(0)
+        if input_part not in options:
+            arguments.append(input_part)
+            continue
+        if not input_strings or not input_strings[0].isdigit() or int(input_strings[0]) < 1:
+            log.error('"{}" needs a positive number!'.format(input_part))
+            raise HandleException
+        options[input_part] = int(input_strings.pop(0))
+    return ' '.join(arguments), options['--page'], options['--limit']
+
+
 def handle_show_games(input_string, con):
+    input_string, page, limit = get_paging_from_string(input_string)
     player_id = None
     if input_string:
         player_id = get_player_id_by_name(input_string, con)
         if player_id is None:
             log.error('Could not find that person!')
             return
-    games_table = get_games_table(con, player_id)
-    log.info('\n' + games_table)
+    for games_table in get_games_table_chunks(con, player_id, page, limit):
+        log.info('\n' + games_table)
 
 
 def handle_show_history(input_string, con):
+    input_string, page, limit = get_paging_from_string(input_string)
     player_id = get_player_id_by_name(input_string, con)
     if player_id is None:
         log.error('Could not find that person!')
         return
-    history_table = get_history_table(con, player_id)
-    log.info('\n' + history_table)
+    for history_table in get_history_table_chunks(con, player_id, page, limit):
+        log.info('\n' + history_table)
 
 
 def handle_draft(input_string, con):
@@ -174,16 +410,28 @@ def handle_draft(input_string, con):
     else:
         draft_id = get_draft_id_by_name(draft_name, con)
 
+    method = method_games[0]
     if draft_id is None:
-        log.error('Could not find draft "{}"'.format(draft_name))
+        # the name of a multi-table draft stands for all its tables
+        event_draft_ids = get_event_draft_ids(draft_name, con)
+        if event_draft_ids and method == 'p':
+            handle_event_pairings(draft_name, event_draft_ids, con)
+        elif event_draft_ids and method == 'P':
+            handle_show_event_pairings(draft_name, event_draft_ids, con)
+        else:
+            log.error('Could not find draft "{}"'.format(draft_name))
+        return
 
-    method = method_games[0]
     if method == 'p':
         handle_draft_pairings(draft_id, con)
     if method == 'P':
         handle_show_draft_pairings(draft_id, con)
     elif method == 'g':
         handle_draft_game(draft_id, con)
+    elif method == 'n':
+        handle_next_draft_round(draft_id, con)
+    elif method == 's':
+        handle_simulate_draft(draft_id, con)
     # elif method == 'r':
     #     handle_remove_draft_player(draft_id, con)
     # else:
@@ -245,12 +493,20 @@ def handle_draft_separation(draft_name, player_ids, con):
 def handle_table_pairing(draft_player_numbers, player_ids, con):
     confirmation = get_confimation('Autopair?', default=True)
     if confirmation:
-        return get_draft_autopairing(draft_player_numbers, player_ids, con)
+        draft_player_lists = get_draft_autopairing(draft_player_numbers, player_ids, con)
+        summaries = get_table_summaries(draft_player_lists, con)
+        table_data = [(i + 1, len(draft_player_ids), score * 100, min_elo, max_elo)
+                      for i, (draft_player_ids, (score, min_elo, max_elo))
+                      in enumerate(zip(draft_player_lists, summaries))]
+        table = tabulate(table_data, headers=('table', 'players', 'score', 'min elo', 'max elo'), floatfmt='.0f')
+        log.info('\n' + table)
+        return draft_player_lists
 
 
 def handle_add_draft_confirmation(draft_name, draft_names, draft_player_id_lists, con):
+    player_names = get_registry(con).player_names
     for draft_name, draft_player_ids in zip(draft_names, draft_player_id_lists):
-        draft_player_names = [get_player_name_by_id(player_id, con) for player_id in draft_player_ids]
+        draft_player_names = [player_names[player_id] for player_id in draft_player_ids]
 
         confirmation = get_confimation('Add draft "{}" with players {}?'.format(
             draft_name, ', '.join(draft_player_names)))
@@ -259,7 +515,7 @@ def handle_add_draft_confirmation(draft_name, draft_names, draft_player_id_lists
             return
 
     for draft_name, draft_player_ids in zip(draft_names, draft_player_id_lists):
-        draft_player_names = [get_player_name_by_id(player_id, con) for player_id in draft_player_ids]
+        draft_player_names = [player_names[player_id] for player_id in draft_player_ids]
 
         draft_id = add_draft(draft_name, con)
         for player_id in draft_player_ids:
@@ -325,9 +581,10 @@ def handle_show_score(input_string, con):
         log.error('Need players!')
         return
 
+    registry = get_registry(con)
     player_ids = []
     for player_name in player_names:
-        player_id = get_player_id_by_name(player_name, con)
+        player_id = registry.player_ids.get(player_name)
         if player_id is None:
             log.error('Player "{}" does not exist!'.format(player_name))
             return
@@ -340,14 +597,15 @@ def handle_show_score(input_string, con):
         opponent_ids = get_all_player_ids(con)
         opponent_ids.remove(player_id)
 
-    opponent_scores = get_fafmats_scores(player_id, opponent_ids, con)
+    opponent_scores = get_fafmats_score_matrix([player_id], opponent_ids, con)[0]
+    elo_differences = get_elo_difference_matrix([player_id], opponent_ids, con)[0]
+    n_encounters_list = get_encounter_matrix([player_id], opponent_ids, con)[0]
 
     table_data = []
-    for opponent_id, score in zip(opponent_ids, opponent_scores):
-        opponent_name = get_player_name_by_id(opponent_id, con)
+    for opponent_id, score, elo_difference, n_encounters in zip(
+            opponent_ids, opponent_scores, elo_differences, n_encounters_list):
+        opponent_name = registry.player_names[opponent_id]
         score_percent = score * 100
-        elo_difference = get_elo_difference(player_id, opponent_id, con)
-        n_encounters = get_n_encounters(player_id, opponent_id, con)
         table_data.append((opponent_name, score_percent, elo_difference, n_encounters))
 
     table_data.sort(key=lambda x: x[1])
@@ -355,6 +613,43 @@ def handle_show_score(input_string, con):
     log.info('\n' + table)
 
 
+def handle_show_head_to_head(input_string, con):
+    player_names = input_string.split()
+    if len(player_names) != 2:
+        log.error('Need 2 names!')
+        return
+
+    player_ids = []
+    for player_name in player_names:
+        player_id = get_player_id_by_name(player_name, con)
+        if player_id is None:
+            log.error('Player "{}" does not exist!'.format(player_name))
+            return
+        player_ids.append(player_id)
+
+    encounters, playerA_wins, playerB_wins, draws, last_date = get_head_to_head(player_ids[0], player_ids[1], con)
+    table_data = [(player_names[0], player_names[1], encounters, playerA_wins, playerB_wins, draws, last_date)]
+    table = tabulate(table_data, headers=('player', 'player', 'encounters', 'wins', 'losses', 'draws', 'last played'))
+    log.info('\n' + table)
+
+
+def handle_show_rank(input_string, con):
+    player_id = get_player_id_by_name(input_string, con)
+    if player_id is None:
+        log.error('Could not find that person!')
+        return
+
+    ladder = get_ladder(con)
+    log.info('Rank {} of {}, better than {:.0f}% of players'.format(
+        ladder.get_rank(player_id), len(ladder), ladder.get_percentile(player_id)))
+
+    registry = get_registry(con)
+    table_data = [(rank, registry.player_names[neighbour_id], elo)
+                  for rank, neighbour_id, elo in ladder.get_neighbours(player_id)]
+    table = tabulate(table_data, headers=('rank', 'player', 'elo'), floatfmt='.0f')
+    log.info('\n' + table)
+
+
 def handle_draft_pairings(draft_id, con):
     draft_round = get_round_by_draft_id(draft_id, con)
     player_pairings = get_draft_pairings_by_draft_id(draft_id, draft_round, con)
@@ -375,24 +670,115 @@ def handle_draft_pairings(draft_id, con):
 
 
 def handle_show_draft_pairings(draft_id, con):
+    registry = get_registry(con)
     draft_round = get_round_by_draft_id(draft_id, con)
-    draft_name = get_draft_name_by_id(draft_id, con)
+    draft_name = registry.draft_names.get(draft_id)
     log.info('Pairings for draft "{}" round {}'.format(draft_name, draft_round))
 
     player_pairings = get_draft_pairings_by_draft_id(draft_id, draft_round, con)
     for player_ids in player_pairings:
-        player_A_name = get_player_name_by_id(player_ids[0], con)
-        player_B_name = get_player_name_by_id(player_ids[1], con)
+        player_A_name = registry.player_names[player_ids[0]]
+        player_B_name = registry.player_names[player_ids[1]]
         log.info('Game:       {:<15} vs {:>15}'.format(player_A_name, player_B_name))
 
     suspended_players = get_draft_suspensions_by_draft_id(draft_id, draft_round, con)
     for suspended_player_id in suspended_players:
-        player_name = get_player_name_by_id(suspended_player_id, con)
+        player_name = registry.player_names[suspended_player_id]
         log.info('Suspension: {}'.format(player_name))
 
 
+def handle_event_pairings(event_name, draft_ids, con):
+    paired_draft_ids = [draft_id for draft_id in draft_ids
+                        if get_draft_pairings_by_draft_id(draft_id, get_round_by_draft_id(draft_id, con), con)]
+    if paired_draft_ids:
+        confirmation = get_confimation('Pairings exist already for {} of {} tables! Overwrite?'.format(
+            len(paired_draft_ids), len(draft_ids)), default=False)
+        if not confirmation:
+            return
+
+    log.info('Generating pairings for {} tables of "{}"'.format(len(draft_ids), event_name))
+    event_pairings = get_event_pairings(draft_ids, con)
+    with con:  # all tables or none
+        for draft_id, draft_round, player_pairings in event_pairings:
+            delete_pairings_by_draft_id(draft_id, draft_round, con)
+            delete_suspensions_by_draft_id(draft_id, draft_round, con)
+            add_player_draft_pairing(player_pairings, draft_id, draft_round, con)
+    handle_show_event_pairings(event_name, draft_ids, con)
+
+
+def handle_show_event_pairings(event_name, draft_ids, con):
+    registry = get_registry(con)
+    table_data = []
+    for draft_id in draft_ids:
+        draft_name = registry.draft_names.get(draft_id)
+        draft_round = get_round_by_draft_id(draft_id, con)
+        for playerA_id, playerB_id in get_draft_pairings_by_draft_id(draft_id, draft_round, con):
+            table_data.append((draft_name, draft_round, registry.player_names[playerA_id],
+                               registry.player_names[playerB_id]))
+        for suspended_player_id in get_draft_suspensions_by_draft_id(draft_id, draft_round, con):
+            table_data.append((draft_name, draft_round, registry.player_names[suspended_player_id], 'suspension'))
+    table = tabulate(table_data, headers=('table', 'round', 'player', 'player'))
+    log.info('Pairings for all tables of "{}"\n'.format(event_name) + table)
+
+
+def handle_next_draft_round(draft_id, con):
+    draft_round = get_round_by_draft_id(draft_id, con)
+    player_pairings = get_draft_pairings_by_draft_id(draft_id, draft_round, con)
+    if not player_pairings:
+        log.error('Round {} has no pairings yet!'.format(draft_round))
+        return
+
+    played_pairings = get_draft_round_games(draft_id, draft_round, con)
+    missing_pairings = [player_ids for player_ids in player_pairings
+                        if player_ids not in played_pairings and player_ids[::-1] not in played_pairings]
+    if missing_pairings:
+        confirmation = get_confimation('    {} games of round {} are missing! Start next round anyway?'.format(
+            len(missing_pairings), draft_round), default=False)
+        if not confirmation:
+            return
+
+    set_draft_round(draft_id, draft_round + 1, con)
+    log.info('Started round {}'.format(draft_round + 1))
+
+
+def handle_simulate_draft(draft_id, con):
+    registry = get_registry(con)
+    draft_name = registry.draft_names.get(draft_id)
+    state = get_draft_state(draft_id, con)
+    if len(state['player_ids']) < 2:
+        log.error('Draft "{}" has less than two active players!'.format(draft_name))
+        return
+
+    default_rounds = max(get_default_round_count(len(state['player_ids'])), state['round'])
+    round_string = input('    Number of rounds in draft "{}" [{}] > '.format(draft_name, default_rounds))
+    if round_string == '':
+        n_rounds = default_rounds
+    elif round_string.isdigit():
+        n_rounds = int(round_string)
+    else:
+        log.warning('Do you know what numbers are?')
+        return
+
+    start_time = perf_counter()
+    standing_probabilities, elo_changes = simulate_draft(state, n_rounds, SIMULATION_COUNT)
+    log.info('Simulated {} drafts in {:.2f}s'.format(SIMULATION_COUNT, perf_counter() - start_time))
+
+    n_players = len(state['player_ids'])
+    expected_standings = [sum(standing * probability for standing, probability in enumerate(probabilities))
+                          for probabilities in standing_probabilities]
+    table_data = []
+    for i in sorted(range(n_players), key=lambda i: expected_standings[i]):
+        table_data.append([registry.player_names[state['player_ids'][i]], state['elos'][i], state['points'][i],
+                           elo_changes[i]] + list(standing_probabilities[i] * 100))
+    headers = ['player', 'elo', 'points', 'elo change'] + [str(standing + 1) for standing in range(n_players)]
+    table = tabulate(table_data, headers=headers, floatfmt=('', '.0f', '.1f', '+.1f') + ('.0f', ) * n_players)
+    log.info('Chances in % of finishing draft "{}" at each standing, ties share the better one\n'.format(
+        draft_name) + table)
+
+
 def handle_draft_game(draft_id, con):
-    draft_name = get_draft_name_by_id(draft_id, con)
+    registry = get_registry(con)
+    draft_name = registry.draft_names.get(draft_id)
     draft_round = get_round_by_draft_id(draft_id, con)
     match_adding_string = input('    Add game to draft "{}" round {} > '.format(draft_name, draft_round))
 
@@ -401,12 +787,10 @@ def handle_draft_game(draft_id, con):
     # check for non draft players
     draft_player_ids = get_draft_players(draft_id, con)
     if playerA_id not in draft_player_ids:
-        log.error('Player "{}" is not part of draft "{}"!'.format(
-            get_player_name_by_id(playerA_id, con), get_draft_name_by_id(draft_id, con)))
+        log.error('Player "{}" is not part of draft "{}"!'.format(registry.player_names[playerA_id], draft_name))
         return
     if playerB_id not in draft_player_ids:
-        log.error('Player "{}" is not part of draft "{}"!'.format(
-            get_player_name_by_id(playerB_id, con), get_draft_name_by_id(draft_id, con)))
+        log.error('Player "{}" is not part of draft "{}"!'.format(registry.player_names[playerB_id], draft_name))
         return
 
     # check for correct pairings
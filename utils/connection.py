@@ -0,0 +1,63 @@
+import os
+import atexit
+import logging
+import threading
+
+import sqlite3 as sl
+
+from constants import DATABASE_PATH
+from utils.registry import forget_registry
+from utils.ladder import forget_ladder
+
+
+log = logging.getLogger('connection')
+
+# open connections by database path and thread, sqlite connections may only be used by the thread that opened them
+_connections = {}
+
+PRAGMAS = [
+    'PRAGMA journal_mode = WAL',  # readers don't block the writer and the writer doesn't block readers
+    'PRAGMA synchronous = NORMAL',  # durable at checkpoints, which is safe with WAL
+    'PRAGMA cache_size = -32000',  # in KiB
+    'PRAGMA mmap_size = 268435456',
+    'PRAGMA temp_store = MEMORY',
+    'PRAGMA foreign_keys = ON',
+]
+CACHED_STATEMENTS = 256  # prepared statements kept per connection, our queries are fixed strings
+BUSY_TIMEOUT = 10  # seconds to wait for another connection's write lock
+
+
+def open_connection(path=DATABASE_PATH, factory=sl.Connection):
+    con = sl.connect(path, timeout=BUSY_TIMEOUT, cached_statements=CACHED_STATEMENTS, factory=factory)
+    for pragma in PRAGMAS:
+        con.execute(pragma)
+    return con
+
+
+def get_connection(path=DATABASE_PATH, factory=sl.Connection):
+    # reuses the connection of this thread to the database, opening it on first use
+    key = (os.path.abspath(path), threading.get_ident())
+    con = _connections.get(key)
+    if con is None:
+        log.debug('Opening connection to {}'.format(path))
+        con = open_connection(path, factory)
+        _connections[key] = con
+    return con
+
+
+def close_connection(con):
+    for key, pooled_con in list(_connections.items()):
+        if pooled_con is con:
+            del _connections[key]
+    forget_registry(con)
+    forget_ladder(con)
+    con.close()
+
+
+@atexit.register
+def close_all_connections():
+    for con in list(_connections.values()):
+        try:
+            close_connection(con)
+        except sl.ProgrammingError:  # opened by another thread, closed by sqlite when it is collected
+            pass
@@ -2,45 +2,157 @@ import logging
 import sqlite3 as sl
 from datetime import datetime
 
+import numpy as np
 from tabulate import tabulate
 
-from constants import STARGING_ELO, INVERSE_RESULT_DICT, SQLITE_SCRIPT_PATH, DATABASE_PATH
-from utils.utils import get_ascii_bar
-from utils.elo import calculate_fafmats_scores
+from constants import STARGING_ELO, INVERSE_RESULT_DICT, RESULT_SCORE_DICT, \
+    SQLITE_SCRIPT_PATH, DATABASE_PATH, PAGE_SIZE, FAFMATS_UNCERTAINTY
+from utils.utils import get_ascii_bar, get_table_chunks
+from utils.elo import calculate_fafmats_score_matrix, calculate_fafmats_distances, calculate_fafmats_pool
+from utils.glicko2 import get_deviation_weights
+from utils.registry import get_registry
+from utils.score_cache import get_score_cache, get_cache_token, update_score_cache_players
+from utils.ladder import update_ladder, keep_ladder, get_history_ranks
 # from utils.pairing import get_player_pairings
 
 
 log = logging.getLogger('db_utils')
 
 
-def init_db():
+def init_db(path=DATABASE_PATH):
     with open(SQLITE_SCRIPT_PATH) as sql_file:
         sql_script = sql_file.read()
-    con = sl.connect(DATABASE_PATH)
+    con = sl.connect(path)
     cursor = con.cursor()
     cursor.executescript(sql_script)
     return con
 
 
+def rebuild_pair_stats(con):
+    pair_stats_dict = {}
+    result = con.execute('SELECT playerA, playerB, result, date FROM game ORDER BY date')
+    for playerA_id, playerB_id, result_string, date in result:
+        if playerA_id == playerB_id:
+            continue
+        low_id, high_id, wins_low, wins_high, draws = get_pair_result(playerA_id, playerB_id, result_string)
+        encounters, total_wins_low, total_wins_high, total_draws, _ = pair_stats_dict.get(
+            (low_id, high_id), (0, 0, 0, 0, None))
+        pair_stats_dict[(low_id, high_id)] = (
+            encounters + 1, total_wins_low + wins_low, total_wins_high + wins_high, total_draws + draws, date)
+
+    con.execute('DELETE FROM pairStats')
+    sql = """
+        INSERT INTO pairStats (playerA, playerB, encounters, winsA, winsB, draws, lastDate)
+            values(?, ?, ?, ?, ?, ?, ?)
+        """
+    data = [pair + stats for pair, stats in pair_stats_dict.items()]
+    con.executemany(sql, data)
+
+
+def refresh_pair_stats(playerA_id, playerB_id, con):
+    sql = 'DELETE FROM pairStats WHERE playerA = ? AND playerB = ?'
+    con.execute(sql, (min(playerA_id, playerB_id), max(playerA_id, playerB_id)))
+
+    sql = """
+        SELECT m.playerA, m.playerB, m.result, m.date FROM game m
+            WHERE m.playerA = ? AND m.playerB = ? OR m.playerA = ? AND m.playerB = ?
+        """
+    result = con.execute(sql, (playerA_id, playerB_id, playerB_id, playerA_id))
+    update_pair_stats_batch(result.fetchall(), con)
+
+
 def add_player(first_name, last_name, con):
     sql = 'INSERT INTO player (name, familyName, elo, joiningDate, isSelected) values(?, ?, ?, ?, ?)'
     data = (first_name, last_name, STARGING_ELO, datetime.now(), True)
+    cursor = con.cursor()
+    cache_token = get_cache_token(con)
     try:
-        con.execute(sql, data)
+        cursor.execute(sql, data)
+        player_id = cursor.lastrowid
+        get_registry(con).add_player(player_id, first_name)
+        update_score_cache_players([player_id], cache_token, con)
+        update_ladder(player_id, STARGING_ELO, cache_token, con)
+        return player_id
     except sl.IntegrityError:
         log.error('Name already exists!')
 
 
 def add_game(playerA_id, playerB_id, result, con):
+    date = datetime.now()
     sql = 'INSERT INTO game (playerA, playerB, result, date) values(?, ?, ?, ?)'
-    data = (playerA_id, playerB_id, result, datetime.now())
+    data = (playerA_id, playerB_id, result, date)
 
     cursor = con.cursor()
+    cache_token = get_cache_token(con)
     cursor.execute(sql, data)
     game_id = cursor.lastrowid
+    update_pair_stats(playerA_id, playerB_id, result, date, con)
+    keep_ladder(cache_token, con)
     return game_id
 
 
+def get_pair_result(playerA_id, playerB_id, result):
+    # pair statistics are stored once per pair, with the lower player id as playerA
+    playerA_score = RESULT_SCORE_DICT[result]
+    playerA_wins = int(playerA_score == 1)
+    playerB_wins = int(playerA_score == 0)
+    draws = int(playerA_score == 0.5)
+    if playerA_id < playerB_id:
+        return playerA_id, playerB_id, playerA_wins, playerB_wins, draws
+    else:
+        return playerB_id, playerA_id, playerB_wins, playerA_wins, draws
+
+
+def update_pair_stats(playerA_id, playerB_id, result, date, con):
+    update_pair_stats_batch([(playerA_id, playerB_id, result, date)], con)
+
+
+def update_pair_stats_batch(games, con):
+    sql = """
+        INSERT INTO pairStats (playerA, playerB, encounters, winsA, winsB, draws, lastDate)
+            values(?, ?, 1, ?, ?, ?, ?)
+            ON CONFLICT(playerA, playerB) DO UPDATE SET
+                encounters = encounters + 1,
+                winsA = winsA + excluded.winsA,
+                winsB = winsB + excluded.winsB,
+                draws = draws + excluded.draws,
+                lastDate = MAX(lastDate, excluded.lastDate)
+        """
+    data = [get_pair_result(playerA_id, playerB_id, result) + (date, )
+            for playerA_id, playerB_id, result, date in games]
+    con.executemany(sql, data)
+
+
+def get_head_to_head(playerA_id, playerB_id, con):
+    sql = 'SELECT encounters, winsA, winsB, draws, lastDate FROM pairStats WHERE playerA = ? AND playerB = ?'
+    data = (min(playerA_id, playerB_id), max(playerA_id, playerB_id))
+    pair_stats = con.execute(sql, data).fetchall()
+    if not pair_stats:
+        return 0, 0, 0, 0, None
+
+    encounters, wins_low, wins_high, draws, last_date = pair_stats[0]
+    if playerA_id < playerB_id:
+        return encounters, wins_low, wins_high, draws, last_date
+    else:
+        return encounters, wins_high, wins_low, draws, last_date
+
+
+def get_game(game_id, con):
+    sql = 'SELECT playerA, playerB, result, date FROM game WHERE id = ?'
+    result = con.execute(sql, [game_id])
+    games = result.fetchall()
+    if len(games) != 1:
+        return None
+    return games[0]
+
+
+def update_game_result(game_id, playerA_id, playerB_id, result, con):
+    sql = 'UPDATE game SET playerA = ?, playerB = ?, result = ? WHERE id = ?'
+    data = (playerA_id, playerB_id, result, game_id)
+    con.execute(sql, data)
+    refresh_pair_stats(playerA_id, playerB_id, con)
+
+
 def get_player_ids_by_game(game_id, con):
     sql = 'SELECT id FROM game WHERE id = ?'
     data = [game_id]
@@ -60,29 +172,47 @@ def update_elo(player_id, elo_difference, game_id, con):
     data = (player_id, game_id, elo_before, elo_after)
     con.execute(sql, data)
 
+    cache_token = get_cache_token(con)
     sql = 'UPDATE player SET elo = ? WHERE id = ?'
     data = (elo_after, player_id)
     con.execute(sql, data)
+    update_ladder(player_id, elo_after, cache_token, con)
+
+
+def add_games_batch(game_rows, history_rows, player_elos, con):
+    # game rows carry their own ids, so history rows can reference them without a lastrowid per game
+    sql = 'INSERT INTO game (id, playerA, playerB, result, date) values(?, ?, ?, ?, ?)'
+    con.executemany(sql, game_rows)
+    update_pair_stats_batch([game_row[1:] for game_row in game_rows], con)
+
+    sql = 'INSERT INTO history (player, game, eloBefore, eloAfter) values(?, ?, ?, ?)'
+    con.executemany(sql, history_rows)
+
+    sql = 'UPDATE player SET elo = ? WHERE id = ?'
+    data = [(elo, player_id) for player_id, elo in player_elos.items()]
+    con.executemany(sql, data)
+
+
+def get_last_game_id(con):
+    # the autoincrement counter, which also covers ids of deleted games
+    result = con.execute("SELECT seq FROM sqlite_sequence WHERE name = 'game'")
+    sequence = result.fetchall()
+    if not sequence:
+        return 0
+    return sequence[0][0]
+
+
+def get_last_game_date(con):
+    result = con.execute('SELECT MAX(date) FROM game')
+    return result.fetchall()[0][0]
 
 
 def get_player_id_by_name(name, con):
-    sql = 'SELECT id FROM player WHERE name = ?'
-    data = [name]
-    result = con.execute(sql, data)
-    players = result.fetchall()
-    if len(players) != 1:
-        return None
-    return players[0][0]
+    return get_registry(con).player_ids.get(name)
 
 
 def get_player_name_by_id(id_, con):
-    sql = 'SELECT name FROM player WHERE id = ?'
-    data = [id_]
-    result = con.execute(sql, data)
-    players = result.fetchall()
-    if len(players) != 1:
-        return None
-    return players[0][0]
+    return get_registry(con).player_names.get(id_)
 
 
 def get_all_player_ids(con):
@@ -101,7 +231,7 @@ def get_player_elo(id_, con):
     return elo[0][0]
 
 
-def get_players_table(con, method):
+def get_players(con, method):
     if method == 'd':
         sort_string = 'ORDER BY joiningDate ASC'
     elif method == 'D':
@@ -115,76 +245,170 @@ def get_players_table(con, method):
     elif method == 'E':
         sort_string = 'ORDER BY elo DESC'
 
-    data = con.execute("SELECT name, elo, id, joiningDate FROM player {}".format(sort_string))
+    result = con.execute("SELECT name, elo, id, joiningDate FROM player {}".format(sort_string))
+    return result.fetchall()
+
+
+def get_players_table(con, method):
+    data = get_players(con, method)
     return tabulate(data, headers=('name', 'elo', 'id', 'joined'), floatfmt=".0f")
 
 
-def get_games_table(con, player_id=None):
-    if player_id is not None:
-        data = con.execute("""
-            SELECT p1.name, p2.name, m.result, m.date FROM game m
+def get_inverse_result_sql(column):
+    cases = ' '.join("WHEN '{}' THEN '{}'".format(result, inverse_result)
+                     for result, inverse_result in INVERSE_RESULT_DICT.items())
+    return 'CASE {} {} END'.format(column, cases)
+
+
+# (date, id) key of the last row before each page listed so far, per database file and listing.
+# the keys are only valid for the cache token they were found at, which changes with every write
+_page_keys = {}
+
+
+def get_page_keys(listing, con):
+    cache_token = get_cache_token(con)
+    if cache_token is None:  # writes can't be noticed, so nothing is kept
+        return {}
+    database_path = [path for _, name, path in con.execute('PRAGMA database_list') if name == 'main'][0]
+    stored_token, page_keys = _page_keys.get((database_path, listing), (None, None))
+    if page_keys is None or stored_token != cache_token:
+        page_keys = {}
+        _page_keys[(database_path, listing)] = (cache_token, page_keys)
+    return page_keys
+
+
+def get_pages(sql, data, page, limit, page_keys, con):
+    # pages of rows, newest first, each continuing after the (date, id) key of the last row of the previous one.
+    # sql selects the keys as keyDate and keyId first, they are not part of the returned rows.
+    # page_keys maps page numbers to the key before them, pages without a known key are found with an offset
+    single_page = page is not None
+    page = page or 1
+    page_after = page_keys.get(page)
+    if page > 1 and page_after is None:
+        sql_keys = 'SELECT keyDate, keyId FROM ({}) LIMIT 1 OFFSET :offset'.format(sql.format(keyset='1'))
+        result = con.execute(sql_keys, dict(data, offset=(page - 1) * limit - 1, limit=-1))
+        page_afters = result.fetchall()
+        if not page_afters:
+            return
+        page_after = page_keys[page] = page_afters[0]
+
+    while True:
+        if page_after is None:
+            sql_page, after = sql.format(keyset='1'), {}
+        else:
+            sql_page = sql.format(keyset='(m.date, m.id) < (:after_date, :after_id)')
+            after = {'after_date': page_after[0], 'after_id': page_after[1]}
+        result = con.execute(sql_page, dict(data, limit=limit + 1, **after))
+        rows = result.fetchall()
+        yield [row[2:] for row in rows[:limit]]
+        if len(rows) <= limit:
+            return
+        page += 1
+        page_after = page_keys[page] = rows[limit - 1][:2]
+        if single_page:
+            return
+
+
+def get_games_pages(con, player_id=None, page=None, limit=PAGE_SIZE):
+    if player_id is None:
+        sql = """
+            SELECT m.date AS keyDate, m.id AS keyId, m.id, p1.name, p2.name, m.result, m.date FROM game m
                 LEFT JOIN player p1
                     ON m.playerA = p1.id
                 LEFT JOIN player p2
                     ON m.playerB = p2.id
-                WHERE m.playerA = ? OR m.playerB = ?
-                ORDER BY m.date
-            """, [player_id, player_id])
-
-        player_name = get_player_name_by_id(player_id, con)
-        sorted_data = []
-        for playerA_name, playerB_name, result, date in data:
-            if playerA_name == player_name:
-                sorted_data.append((playerA_name, playerB_name, result, date))
-            else:
-                result = INVERSE_RESULT_DICT[result]
-                sorted_data.append((playerB_name, playerA_name, result, date))
-        data = sorted_data
+                WHERE {keyset}
+                ORDER BY m.date DESC, m.id DESC
+                LIMIT :limit
+            """
     else:
-        data = con.execute("""
-            SELECT p1.name, p2.name, m.result, m.date FROM game m
+        sql = """
+            SELECT m.date AS keyDate, m.id AS keyId, m.id,
+                CASE WHEN m.playerA = :player THEN p1.name ELSE p2.name END,
+                CASE WHEN m.playerA = :player THEN p2.name ELSE p1.name END,
+                CASE WHEN m.playerA = :player THEN m.result ELSE {inverse_result} END,
+                m.date
+                FROM game m
                 LEFT JOIN player p1
                     ON m.playerA = p1.id
                 LEFT JOIN player p2
                     ON m.playerB = p2.id
-                ORDER BY m.date
-            """)
-    return tabulate(data, headers=('player', 'player', 'result', 'date'), floatfmt='.0f')
+                WHERE (m.playerA = :player OR m.playerB = :player) AND {{keyset}}
+                ORDER BY m.date DESC, m.id DESC
+                LIMIT :limit
+            """.format(inverse_result=get_inverse_result_sql('m.result'))
+    return get_pages(sql, {'player': player_id}, page, limit, get_page_keys(('games', player_id, limit), con), con)
+
+
+def get_games_table_chunks(con, player_id=None, page=None, limit=PAGE_SIZE):
+    pages = get_games_pages(con, player_id, page, limit)
+    name_width = max([len(name) for name in get_registry(con).player_names.values()], default=0)
+    id_width = len(str(get_last_game_id(con)))
+    headers = ('id', 'player', 'player', 'result', 'date')
+    return get_table_chunks(pages, headers, 'rllll', (id_width, name_width, name_width, 7, 26))
 
 
-def get_history_table(con, player_id, graph_width=100):
-    data = con.execute("""
-        SELECT p1.name, p2.name, m.result, m.date, h.eloAfter FROM history h
-            LEFT JOIN game m
+def get_games_table(con, player_id=None, page=None, limit=PAGE_SIZE):
+    return '\n'.join(get_games_table_chunks(con, player_id, page, limit))
+
+
+def get_max_elo(player_id, con):
+    sql = 'SELECT MAX(h.eloAfter) FROM history h WHERE h.player = ?'
+    result = con.execute(sql, [player_id])
+    return result.fetchall()[0][0]
+
+
+def get_history_pages(con, player_id, page=None, limit=PAGE_SIZE):
+    sql = """
+        SELECT m.date AS keyDate, m.id AS keyId, m.id,
+            CASE WHEN m.playerA = :player THEN p1.name ELSE p2.name END,
+            CASE WHEN m.playerA = :player THEN p2.name ELSE p1.name END,
+            CASE WHEN m.playerA = :player THEN m.result ELSE {inverse_result} END,
+            m.date, h.eloAfter
+            FROM history h
+            JOIN game m
                 ON m.id = h.game
             LEFT JOIN player p1
                 ON m.playerA = p1.id
             LEFT JOIN player p2
                 ON m.playerB = p2.id
-            WHERE h.player = ?
-            ORDER BY m.date
-        """, [player_id])
-
-    player_name = get_player_name_by_id(player_id, con)
-    sorted_data = []
-    for playerA_name, playerB_name, result, date, elo_after in data:
-        if playerA_name == player_name:
-            sorted_data.append((playerA_name, playerB_name, result, date, elo_after))
-        else:
-            result = INVERSE_RESULT_DICT[result]
-            sorted_data.append((playerB_name, playerA_name, result, date, elo_after))
-    data = sorted_data
+            WHERE h.player = :player AND {{keyset}}
+            ORDER BY m.date DESC, m.id DESC
+            LIMIT :limit
+        """.format(inverse_result=get_inverse_result_sql('m.result'))
+    return get_pages(sql, {'player': player_id}, page, limit, get_page_keys(('history', player_id, limit), con), con)
 
-    all_elos = [row[4] for row in data]
-    max_elo = max(all_elos)
+
+def get_history_table_chunks(con, player_id, page=None, limit=PAGE_SIZE, graph_width=100):
+    max_elo = get_max_elo(player_id, con) or 1
     graph_increment = max_elo / graph_width
 
-    graphed_data = []
-    for playerA_name, playerB_name, result, date, elo_after in data:
-        bar_string = get_ascii_bar(elo_after, graph_increment)
-        graphed_data.append((playerA_name, playerB_name, result, date, elo_after, bar_string))
+    def get_graphed_pages():
+        for rows in get_history_pages(con, player_id, page, limit):
+            ranks = get_history_ranks(player_id, [row[0] for row in rows], con)
+            yield [(game_id, playerA_name, playerB_name, result, date, '{:.0f}'.format(elo_after),
+                    ranks[game_id][0], get_rank_change_string(ranks[game_id][1]),
+                    get_ascii_bar(elo_after, graph_increment))
+                   for game_id, playerA_name, playerB_name, result, date, elo_after in rows]
+
+    registered_player_names = get_registry(con).player_names
+    name_width = max([len(name) for name in registered_player_names.values()], default=0)
+    id_width = len(str(get_last_game_id(con)))
+    rank_width = len(str(len(registered_player_names)))
+    headers = ('id', 'player', 'player', 'result', 'date', 'elo', 'rank', '', '')
+    return get_table_chunks(
+        get_graphed_pages(), headers, 'rllllrrrl',
+        (id_width, name_width, name_width, 7, 26, 5, rank_width, rank_width + 1, graph_width))
 
-    return tabulate(graphed_data, headers=('player', 'player', 'result', 'date', 'elo', ''), floatfmt='.0f')
+
+def get_rank_change_string(rank_change):
+    if not rank_change:
+        return ''
+    return '{:+d}'.format(rank_change)
+
+
+def get_history_table(con, player_id, page=None, limit=PAGE_SIZE, graph_width=100):
+    return '\n'.join(get_history_table_chunks(con, player_id, page, limit, graph_width))
 
 
 def add_draft(name, con):
@@ -195,29 +419,27 @@ def add_draft(name, con):
     try:
         cursor.execute(sql, data)
         draft_id = cursor.lastrowid
+        get_registry(con).add_draft(draft_id, name)
         return draft_id
     except sl.IntegrityError:
         log.error('Name already exists!')
 
 
 def get_draft_id_by_name(name, con):
-    sql = 'SELECT id FROM draft WHERE name = ?'
-    data = [name]
-    result = con.execute(sql, data)
-    drafts = result.fetchall()
-    if len(drafts) != 1:
-        return None
-    return drafts[0][0]
+    return get_registry(con).draft_ids.get(name)
 
 
 def get_draft_name_by_id(id_, con):
-    sql = 'SELECT name FROM draft WHERE id = ?'
-    data = [id_]
-    result = con.execute(sql, data)
-    drafts = result.fetchall()
-    if len(drafts) != 1:
-        return None
-    return drafts[0][0]
+    return get_registry(con).draft_names.get(id_)
+
+
+def get_event_draft_ids(event_name, con):
+    # active tables "<event>-1", "<event>-2", ... of a multi-table draft, by table number
+    prefix = event_name + '-'
+    sql = 'SELECT d.id, d.name FROM draft d WHERE d.active > 0 AND substr(d.name, 1, ?) = ?'
+    result = con.execute(sql, [len(prefix), prefix])
+    tables = [(int(name[len(prefix):]), id_) for id_, name in result.fetchall() if name[len(prefix):].isdigit()]
+    return [id_ for _, id_ in sorted(tables)]
 
 
 def add_player_to_draft(player_id, draft_id, con):
@@ -229,7 +451,7 @@ def add_player_to_draft(player_id, draft_id, con):
         log.error('Player allready part of that draft!')
 
 
-def get_drafts_table(con, player_id=None, draft_id=None):
+def get_drafts(con, player_id=None, draft_id=None):
     if player_id is None and draft_id is None:
         sql = 'SELECT d.id, d.name, d.active, d.round, d.date FROM draft d'
         data = con.execute(sql)
@@ -254,6 +476,11 @@ def get_drafts_table(con, player_id=None, draft_id=None):
     formatted_data = []
     for id_, name, active, round_, date in data:
         formatted_data.append((id_, name, bool(active), round_, date))
+    return formatted_data
+
+
+def get_drafts_table(con, player_id=None, draft_id=None):
+    formatted_data = get_drafts(con, player_id, draft_id)
     return tabulate(formatted_data, headers=('id', 'name', 'active', 'round', 'date'))
 
 
@@ -274,25 +501,98 @@ def get_elo_difference(playerA_id, playerB_id, con):
 
 
 def get_fafmats_scores(player_id, opponent_ids, con):
-    elo_differences, n_encounters_list = [], []
-    for opponent_id in opponent_ids:
-        elo_difference = abs(get_elo_difference(player_id, opponent_id, con))
-        n_encounters = get_n_encounters(player_id, opponent_id, con)
-        elo_differences.append(elo_difference)
-        n_encounters_list.append(n_encounters)
+    scores = get_fafmats_score_matrix([player_id], opponent_ids, con)
+    return list(scores[0])
+
+
+def get_fafmats_score_matrix(player_ids, opponent_ids, con):
+    return calculate_fafmats_score_matrix(*get_fafmats_score_inputs(player_ids, opponent_ids, con))
+
+
+def get_fafmats_score_inputs(player_ids, opponent_ids, con):
+    # the raw matrices before normalization, submatrices give the same scores as loading the subset
+    elo_differences = abs(get_elo_difference_matrix(player_ids, opponent_ids, con))
+    if FAFMATS_UNCERTAINTY:
+        elo_differences *= get_deviation_weight_matrix(player_ids, opponent_ids, con)
+    n_encounters = get_encounter_matrix(player_ids, opponent_ids, con)
+    return elo_differences, n_encounters
+
+
+def get_fafmats_distances(player_ids, con):
+    elos = get_player_elos(player_ids, con)
+    encounter_pairs = get_encounter_pairs(player_ids, con)
+    return calculate_fafmats_distances(elos, encounter_pairs)
+
+
+def get_fafmats_pool(player_ids, con):
+    return calculate_fafmats_pool(get_player_elos(player_ids, con), get_encounter_pairs(player_ids, con))
+
+
+def get_player_elos(player_ids, con):
+    score_cache = get_score_cache(con)
+    if score_cache is not None:
+        return score_cache.get_elos(player_ids)
 
-    return calculate_fafmats_scores(elo_differences, n_encounters_list)
+    result = con.execute('SELECT id, elo FROM player')
+    elo_dict = dict(result.fetchall())
+    return np.array([elo_dict[player_id] for player_id in player_ids], dtype=float)
+
+
+def get_elo_difference_matrix(player_ids, opponent_ids, con):
+    elos = get_player_elos(list(player_ids) + list(opponent_ids), con)
+    player_elos = elos[:len(player_ids)]
+    opponent_elos = elos[len(player_ids):]
+    return opponent_elos[np.newaxis, :] - player_elos[:, np.newaxis]
+
+
+def get_deviation_weight_matrix(player_ids, opponent_ids, con):
+    # uncertain ratings make an elo difference say less about the outcome, as in the glicko-2 expected score
+    result = con.execute('SELECT id, deviation FROM player')
+    deviation_dict = dict(result.fetchall())
+    player_deviations = np.array([deviation_dict[player_id] for player_id in player_ids], dtype=float)
+    opponent_deviations = np.array([deviation_dict[opponent_id] for opponent_id in opponent_ids], dtype=float)
+    return get_deviation_weights(np.hypot(player_deviations[:, np.newaxis], opponent_deviations[np.newaxis, :]))
+
+
+def get_encounter_matrix(player_ids, opponent_ids, con):
+    score_cache = get_score_cache(con)
+    if score_cache is not None:
+        return score_cache.get_encounter_matrix(player_ids, opponent_ids)
+
+    result = con.execute('SELECT playerA, playerB, encounters FROM pairStats')
+
+    player_indices = {player_id: i for i, player_id in enumerate(player_ids)}
+    opponent_indices = {opponent_id: i for i, opponent_id in enumerate(opponent_ids)}
+    n_encounters = np.zeros((len(player_ids), len(opponent_ids)), dtype=int)
+    for playerA_id, playerB_id, count in result:
+        if playerA_id in player_indices and playerB_id in opponent_indices:
+            n_encounters[player_indices[playerA_id], opponent_indices[playerB_id]] += count
+        if playerB_id in player_indices and playerA_id in opponent_indices:
+            n_encounters[player_indices[playerB_id], opponent_indices[playerA_id]] += count
+    return n_encounters
+
+
+def get_encounter_pairs(player_ids, con):
+    result = con.execute('SELECT playerA, playerB, encounters FROM pairStats')
+
+    player_indices = {player_id: i for i, player_id in enumerate(player_ids)}
+    rows, columns, counts = [], [], []
+    for playerA_id, playerB_id, count in result:
+        if playerA_id in player_indices and playerB_id in player_indices:
+            indexA, indexB = player_indices[playerA_id], player_indices[playerB_id]
+            rows += [indexA, indexB]
+            columns += [indexB, indexA]
+            counts += [count, count]
+    if rows:  # same as get_encounter_matrix, which counts games against oneself twice
+        pairs = np.unique(np.array([rows, columns]), axis=1, return_inverse=True)
+        rows, columns = pairs[0]
+        counts = np.bincount(pairs[1].ravel(), weights=counts)
+    return np.array(rows, dtype=int), np.array(columns, dtype=int), np.array(counts, dtype=float)
 
 
 def get_n_encounters(playerA_id, playerB_id, con):
-    data = (playerA_id, playerB_id, playerB_id, playerA_id)
-    result = con.execute("""
-        SELECT m.date FROM game m
-            WHERE m.playerA = ? AND m.playerB = ? OR m.playerA = ? AND m.playerB = ?
-            ORDER BY m.date
-        """, data)
-    player_results = result.fetchall()
-    return len(player_results)
+    n_encounters = get_head_to_head(playerA_id, playerB_id, con)[0]
+    return n_encounters
 
 
 def get_draft_players(draft_id, con):
@@ -382,8 +682,66 @@ def get_active_draft_players(draft_id, con):
     return player_ids
 
 
-def get_n_wins(player_id, draft_id, con):
-    pass
+def get_result_score_sql(column):
+    cases = ' '.join("WHEN '{}' THEN {}".format(result, score) for result, score in RESULT_SCORE_DICT.items())
+    return 'CASE {} {} END'.format(column, cases)
+
+
+def get_draft_wins(draft_id, round_, con):
+    # points of all draft players before the given round, draws count half and byes count as a win
+    sql = """
+        SELECT player, SUM(points) FROM (
+            SELECT g.playerA AS player, {score} AS points FROM draftGame dg
+                JOIN game g
+                    ON dg.game = g.id
+                WHERE dg.draft = :draft AND dg.round < :round
+            UNION ALL
+            SELECT g.playerB AS player, 1 - {score} AS points FROM draftGame dg
+                JOIN game g
+                    ON dg.game = g.id
+                WHERE dg.draft = :draft AND dg.round < :round
+            UNION ALL
+            SELECT ds.player AS player, 1 AS points FROM draftSuspension ds
+                WHERE ds.draft = :draft AND ds.round < :round
+        )
+        GROUP BY player
+        """.format(score=get_result_score_sql('g.result'))
+    result = con.execute(sql, {'draft': draft_id, 'round': round_})
+    return dict(result.fetchall())
+
+
+def get_previous_draft_pairings(draft_id, round_, con):
+    sql = """
+        SELECT dp.playerA, dp.playerB FROM draftPairing dp
+            WHERE dp.draft = ? AND dp.round < ?
+        """
+    result = con.execute(sql, [draft_id, round_])
+    return result.fetchall()
+
+
+def get_previous_draft_suspensions(draft_id, round_, con):
+    sql = """
+        SELECT ds.player FROM draftSuspension ds
+            WHERE ds.draft = ? AND ds.round < ?
+        """
+    result = con.execute(sql, [draft_id, round_])
+    return [player_id_tuple[0] for player_id_tuple in result.fetchall()]
+
+
+def get_draft_round_games(draft_id, round_, con):
+    sql = """
+        SELECT g.playerA, g.playerB FROM draftGame dg
+            JOIN game g
+                ON dg.game = g.id
+            WHERE dg.draft = ? AND dg.round = ?
+        """
+    result = con.execute(sql, [draft_id, round_])
+    return result.fetchall()
+
+
+def set_draft_round(draft_id, round_, con):
+    sql = 'UPDATE draft SET round = ? WHERE id = ?'
+    con.execute(sql, [round_, draft_id])
 
 
 def add_suspended_draft_player(player_id, draft_id, round_, con):
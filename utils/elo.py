@@ -1,32 +1,41 @@
+import numpy as np
+
 from constants import EXPECTED_TENFOLD_ADVANTAGE, K_FACTOR, \
     RESULT_SCORE_DICT, FUN_FRIENDSHIP_RATIO
 
 
+REPLAY_MIN_WAVE_SIZE = 24  # below this many games per wave, rating game by game is faster
+
+
+# the scalar functions wrap the array ones, which take elos, results and scores as arrays of any shape
 def get_expected_elo_score(playerA_elo, playerB_elo):
-    elo_difference = playerB_elo - playerA_elo
-    return 1 / (1 + 10 ** (elo_difference / EXPECTED_TENFOLD_ADVANTAGE))
+    return float(get_expected_elo_scores(playerA_elo, playerB_elo))
+
+
+def get_expected_elo_scores(playerA_elos, playerB_elos):
+    elo_differences = np.subtract(playerB_elos, playerA_elos, dtype=float)
+    return 1 / (1 + 10 ** (elo_differences / EXPECTED_TENFOLD_ADVANTAGE))
+
+
+def get_result_scores(results):
+    # result strings to the score of playerA
+    return np.array([RESULT_SCORE_DICT[result] for result in np.ravel(results)], dtype=float).reshape(np.shape(results))
 
 
 def get_elo_difference_from_result(playerA_elo, playerB_elo, result):
-    playerA_score = RESULT_SCORE_DICT[result]
-    playerA_expected_score = get_expected_elo_score(playerA_elo, playerB_elo)
-    playerA_score_offset = playerA_score - playerA_expected_score
-    elo_difference = K_FACTOR * playerA_score_offset
-    return elo_difference
+    return float(get_elo_differences_from_scores(playerA_elo, playerB_elo, RESULT_SCORE_DICT[result]))
+
+
+def get_elo_differences_from_scores(playerA_elos, playerB_elos, playerA_scores):
+    return K_FACTOR * (playerA_scores - get_expected_elo_scores(playerA_elos, playerB_elos))
 
 
 def get_elo_score(elo_difference, min_elo_difference, max_elo_difference):
-    if max_elo_difference - min_elo_difference == 0:
-        return 0.5
-    else:
-        return 1 - (elo_difference - min_elo_difference) / (max_elo_difference - min_elo_difference)
+    return float(_get_normalized_scores(elo_difference, min_elo_difference, max_elo_difference))
 
 
 def get_encounter_score(n_encounters, min_encounters, max_encounters):
-    if max_encounters - min_encounters == 0:
-        return 0.5
-    else:
-        return 1 - (n_encounters - min_encounters) / (max_encounters - min_encounters)
+    return float(_get_normalized_scores(n_encounters, min_encounters, max_encounters))
 
 
 def get_fafmats_score(elo_score, encounters_score):
@@ -34,17 +43,219 @@ def get_fafmats_score(elo_score, encounters_score):
 
 
 def calculate_fafmats_scores(elo_differences, n_encounters_list):
-    min_elo_difference = min(elo_differences)
-    max_elo_difference = max(elo_differences)
-    min_encounters = min(n_encounters_list)
-    max_encounters = max(n_encounters_list)
+    return calculate_fafmats_score_matrix([elo_differences], [n_encounters_list])[0].tolist()
+
+
+def get_replay_waves(playerA_indices, playerB_indices, n_players):
+    # games of a wave share no player, so they can be rated at once without changing the result
+    last_waves = [-1] * n_players
+    waves = []
+    for playerA_index, playerB_index in zip(playerA_indices, playerB_indices):
+        playerA_wave, playerB_wave = last_waves[playerA_index], last_waves[playerB_index]
+        wave = (playerA_wave if playerA_wave > playerB_wave else playerB_wave) + 1
+        last_waves[playerA_index] = last_waves[playerB_index] = wave
+        waves.append(wave)
+    return np.array(waves, dtype=int)
+
+
+def replay_elo_games(elos, playerA_indices, playerB_indices, playerA_scores):
+    '''
+        input:
+            - elos of all players, updated in place
+            - playerA_indices, playerB_indices into elos and playerA_scores of games in chronological order
+        output:
+            - elos of playerA and playerB before every game and the elo difference gained by playerA
+
+        same as applying get_elo_difference_from_result game by game, but games are rated in waves of
+        games without a common player, each wave with a few array operations.
+    '''
+    playerA_indices = np.asarray(playerA_indices, dtype=int)
+    playerB_indices = np.asarray(playerB_indices, dtype=int)
+    playerA_scores = np.asarray(playerA_scores, dtype=float)
+
+    waves = get_replay_waves(playerA_indices.tolist(), playerB_indices.tolist(), len(elos))
+    if len(waves) < REPLAY_MIN_WAVE_SIZE * (waves.max(initial=-1) + 1):
+        return _replay_elo_games_sequentially(elos, playerA_indices, playerB_indices, playerA_scores)
+
+    order = np.argsort(waves, kind='stable')
+    wave_starts = np.searchsorted(waves[order], np.arange(waves.max(initial=-1) + 2)).tolist()
+    # sorted by wave, every wave is a slice
+    playerA_indices, playerB_indices, playerA_scores = \
+        playerA_indices[order], playerB_indices[order], playerA_scores[order]
+    playerA_elos = np.empty(len(order))
+    playerB_elos = np.empty(len(order))
+    elo_differences = np.empty(len(order))
+    for start, end in zip(wave_starts[:-1], wave_starts[1:]):
+        playerA_wave_indices, playerB_wave_indices = playerA_indices[start:end], playerB_indices[start:end]
+        playerA_wave_elos = playerA_elos[start:end] = elos[playerA_wave_indices]
+        playerB_wave_elos = playerB_elos[start:end] = elos[playerB_wave_indices]
+        wave_differences = elo_differences[start:end] = get_elo_differences_from_scores(
+            playerA_wave_elos, playerB_wave_elos, playerA_scores[start:end])
+        elos[playerA_wave_indices] = playerA_wave_elos + wave_differences
+        elos[playerB_wave_indices] = playerB_wave_elos - wave_differences
+
+    # back to chronological order
+    chronological_order = np.argsort(order)
+    playerA_elos, playerB_elos, elo_differences = \
+        playerA_elos[chronological_order], playerB_elos[chronological_order], elo_differences[chronological_order]
+    return playerA_elos, playerB_elos, elo_differences
+
+
+def _replay_elo_games_sequentially(elos, playerA_indices, playerB_indices, playerA_scores):
+    # replay_elo_games on python floats, for few players with many games each
+    player_elos = elos.tolist()
+    game_elos = []
+    for playerA_index, playerB_index, playerA_score in zip(
+            playerA_indices.tolist(), playerB_indices.tolist(), playerA_scores.tolist()):
+        playerA_elo, playerB_elo = player_elos[playerA_index], player_elos[playerB_index]
+        playerA_expected_score = 1 / (1 + 10 ** ((playerB_elo - playerA_elo) / EXPECTED_TENFOLD_ADVANTAGE))
+        elo_difference = K_FACTOR * (playerA_score - playerA_expected_score)
+        player_elos[playerA_index] = playerA_elo + elo_difference
+        player_elos[playerB_index] = playerB_elo - elo_difference
+        game_elos.append((playerA_elo, playerB_elo, elo_difference))
+
+    elos[:] = player_elos
+    game_elos = np.array(game_elos, dtype=float).reshape(-1, 3)
+    return game_elos[:, 0], game_elos[:, 1], game_elos[:, 2]
+
+
+def calculate_fafmats_score_matrix(elo_differences, n_encounters):
+    elo_differences = np.asarray(elo_differences, dtype=float)
+    n_encounters = np.asarray(n_encounters, dtype=float)
+
+    elo_scores = _get_normalized_scores(
+        elo_differences, elo_differences.min(axis=1, keepdims=True), elo_differences.max(axis=1, keepdims=True))
+    encounters_scores = _get_normalized_scores(
+        n_encounters, n_encounters.min(axis=1, keepdims=True), n_encounters.max(axis=1, keepdims=True))
+    return get_fafmats_score(elo_scores, encounters_scores)
+
+
+def _get_normalized_scores(values, min_values, max_values):
+    # 1 at the minimum, 0 at the maximum, 0.5 if all values are the same
+    values, min_values = np.asarray(values, dtype=float), np.asarray(min_values, dtype=float)
+    value_ranges = np.asarray(max_values, dtype=float) - min_values
+    normalized_values = np.divide(
+        values - min_values, value_ranges, out=np.zeros(np.broadcast(values, value_ranges).shape),
+        where=value_ranges != 0)
+    return np.where(value_ranges != 0, 1 - normalized_values, 0.5)
+
+
+def calculate_fafmats_pool(elos, encounter_pairs):
+    '''
+        input:
+            - elos of all players in the pool
+            - encounter_pairs as (row, column, count) index arrays, one entry per direction
+        output:
+            - dictionary of the pool with the normalization of every row of calculate_fafmats_score_matrix,
+              parts of the score matrix are computed from it without the whole matrix
+    '''
+    elos = np.asarray(elos, dtype=float)
+    rows, columns, counts = (np.asarray(values) for values in encounter_pairs)
+    N = len(elos)
+
+    elo_ranges = np.maximum(elos - elos.min(), elos.max() - elos) if N else elos  # row minimum is the player itself
+    encounter_maxima = np.zeros(N)
+    np.maximum.at(encounter_maxima, rows, counts)
+    encounter_minima = np.full(N, np.inf)
+    np.minimum.at(encounter_minima, rows, counts)
+    encounter_minima[np.bincount(rows, minlength=N) < N] = 0  # rows with a missing pair contain a zero
+
+    encounter_ranges = encounter_maxima - encounter_minima
+
+    # row i of the score matrix is offsets[i] - elo_factors[i] * elo differences - encounter_factors[i] * encounters
+    elo_factors = np.divide(FUN_FRIENDSHIP_RATIO, elo_ranges, out=np.zeros(N), where=elo_ranges != 0)
+    encounter_factors = np.divide(
+        1 - FUN_FRIENDSHIP_RATIO, encounter_ranges, out=np.zeros(N), where=encounter_ranges != 0)
+    offsets = np.where(elo_ranges != 0, FUN_FRIENDSHIP_RATIO, 0.5 * FUN_FRIENDSHIP_RATIO) \
+        + np.where(encounter_ranges != 0, 1 - FUN_FRIENDSHIP_RATIO, 0.5 * (1 - FUN_FRIENDSHIP_RATIO)) \
+        + encounter_minima * encounter_factors
+
+    order = np.lexsort((columns, rows))
+    rows, columns, counts = rows[order], columns[order], counts[order]
+    return {
+        'elos': elos,
+        'elo_ranges': elo_ranges,
+        'encounter_minima': encounter_minima,
+        'encounter_ranges': encounter_ranges,
+        'offsets': offsets,
+        'elo_factors': elo_factors,
+        'encounter_factors': encounter_factors,
+        'encounter_row_starts': np.searchsorted(rows, np.arange(N + 1)),
+        'encounter_columns': columns,
+        'encounter_counts': counts.astype(float),
+    }
+
+
+def get_pool_encounter_row(pool, i):
+    row_starts = pool['encounter_row_starts']
+    encounters = np.zeros(len(pool['elos']))
+    encounters[pool['encounter_columns'][row_starts[i]:row_starts[i + 1]]] = \
+        pool['encounter_counts'][row_starts[i]:row_starts[i + 1]]
+    return encounters
+
+
+def get_pool_encounters(pool, rows, columns):
+    # encounters are symmetric, so every index of the shorter side is looked up as a row
+    if len(rows) > len(columns):
+        return get_pool_encounters(pool, columns, rows).T
+    n_encounters = np.zeros((len(rows), len(columns)))
+    for k, row in enumerate(rows):
+        n_encounters[k] = get_pool_encounter_row(pool, row)[columns]
+    return n_encounters
+
+
+def calculate_fafmats_score_block(pool, rows, columns):
+    # rows x columns of calculate_fafmats_score_matrix over the whole pool
+    rows, columns = np.asarray(rows, dtype=int), np.asarray(columns, dtype=int)
+    elo_differences = abs(pool['elos'][columns][np.newaxis, :] - pool['elos'][rows][:, np.newaxis])
+    return (pool['offsets'][rows][:, np.newaxis]
+            - pool['elo_factors'][rows][:, np.newaxis] * elo_differences
+            - pool['encounter_factors'][rows][:, np.newaxis] * get_pool_encounters(pool, rows, columns))
+
+
+def calculate_fafmats_pair_scores(pool, i):
+    # mean fafmats score of player i and every player of the pool, seen from both sides
+    elo_differences = abs(pool['elos'] - pool['elos'][i])
+    encounters = get_pool_encounter_row(pool, i)
+    return (pool['offsets'] + pool['offsets'][i]
+            - (pool['elo_factors'] + pool['elo_factors'][i]) * elo_differences
+            - (pool['encounter_factors'] + pool['encounter_factors'][i]) * encounters) / 2
+
+
+def calculate_fafmats_distances(elos, encounter_pairs):
+    '''
+        input:
+            - elos of all players in the pool
+            - encounter_pairs as (row, column, count) index arrays, one entry per direction
+        output:
+            - condensed 1 - fafmats score distances, row i normalized as in calculate_fafmats_score_matrix
+    '''
+    pool = calculate_fafmats_pool(elos, encounter_pairs)
+    elos, elo_ranges = pool['elos'], pool['elo_ranges']
+    encounter_minima, encounter_ranges = pool['encounter_minima'], pool['encounter_ranges']
+    N = len(elos)
+    columns, counts, row_starts = pool['encounter_columns'], pool['encounter_counts'], pool['encounter_row_starts']
+
+    distances = np.empty(N * (N - 1) // 2)
+    start = 0
+    for i in range(N - 1):
+        end = start + N - i - 1
+        row_distances = distances[start:end]
 
-    opponent_scores = []
-    for elo_difference, n_encounters in zip(elo_differences, n_encounters_list):
-        elo_score = get_elo_score(elo_difference, min_elo_difference, max_elo_difference)
-        encounters_score = get_encounter_score(n_encounters, min_encounters, max_encounters)
+        if elo_ranges[i] == 0:
+            row_distances[:] = 0.5 * FUN_FRIENDSHIP_RATIO
+        else:
+            np.abs(elos[i+1:] - elos[i], out=row_distances)
+            row_distances *= FUN_FRIENDSHIP_RATIO / elo_ranges[i]
 
-        fafmats_score = get_fafmats_score(elo_score, encounters_score)
-        opponent_scores.append(fafmats_score)
+        if encounter_ranges[i] == 0:
+            row_distances += 0.5 * (1 - FUN_FRIENDSHIP_RATIO)
+        else:
+            encounters = np.zeros(N - i - 1)
+            row_columns = columns[row_starts[i]:row_starts[i+1]]
+            upper = row_columns > i
+            encounters[row_columns[upper] - i - 1] = counts[row_starts[i]:row_starts[i+1]][upper]
+            row_distances += (encounters - encounter_minima[i]) * ((1 - FUN_FRIENDSHIP_RATIO) / encounter_ranges[i])
+        start = end
 
-    return opponent_scores
+    return distances
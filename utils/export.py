@@ -0,0 +1,142 @@
+import os
+import re
+import logging
+from datetime import datetime, timezone
+
+import numpy as np
+
+
+log = logging.getLogger('export')
+
+EXPORT_CHUNK_SIZE = 100000  # history rows fetched at once
+TIMEZONE_PATTERN = re.compile(r'(Z|[+-]\d\d:?\d\d)$')  # an offset after the time
+
+
+def get_timestamps(dates):
+    # dates with an offset are converted to UTC first, numpy would only warn about them
+    dates = [datetime.fromisoformat(date).astimezone(timezone.utc).replace(tzinfo=None).isoformat()
+             if TIMEZONE_PATTERN.search(date) else date
+             for date in dates]
+    return np.array(dates, dtype='datetime64[us]')
+
+
+def read_history_columns(con):
+    # the whole history in one pass, sorted by player and time
+    sql = """
+        SELECT h.player, h.game, m.date, h.eloAfter FROM history h
+            JOIN game m
+                ON h.game = m.id
+            ORDER BY h.player, m.date, m.id
+        """
+    cursor = con.execute(sql)
+    chunks = []
+    while True:
+        rows = cursor.fetchmany(EXPORT_CHUNK_SIZE)
+        if not rows:
+            break
+        player_ids, game_ids, dates, elos = zip(*rows)
+        chunks.append((
+            np.array(player_ids, dtype=np.int64),
+            np.array(game_ids, dtype=np.int64),
+            get_timestamps(dates),
+            np.array(elos, dtype=np.float64)))
+
+    if not chunks:
+        return (np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64),
+                np.zeros(0, dtype='datetime64[us]'), np.zeros(0, dtype=np.float64))
+    return tuple(np.concatenate(column) for column in zip(*chunks))
+
+
+def get_day_last_indices(player_indices, timestamps):
+    # last entry of every player and day
+    days = timestamps.astype('datetime64[D]')
+    is_last = np.ones(len(timestamps), dtype=bool)
+    is_last[:-1] = (player_indices[:-1] != player_indices[1:]) | (days[:-1] != days[1:])
+    return np.flatnonzero(is_last)
+
+
+def get_lttb_indices(x, y, n_points):
+    '''
+        input:
+            - x, y of a series sorted by x
+            - n_points to keep
+        output:
+            - indices of the kept points, always including the first and last one
+
+        largest triangle three buckets: the points between the first and last one are split into
+        n_points - 2 buckets and from each the point spanning the largest triangle with the point kept
+        from the bucket before and the average of the bucket after is kept.
+    '''
+    n = len(x)
+    if n_points >= n or n_points < 3:
+        return np.arange(n)
+
+    bucket_edges = np.linspace(1, n - 1, n_points - 1).astype(int)
+    indices = np.zeros(n_points, dtype=int)
+    indices[-1] = n - 1
+    for bucket in range(n_points - 2):
+        start, end = bucket_edges[bucket], bucket_edges[bucket + 1]
+        next_end = bucket_edges[bucket + 2] if bucket + 2 < len(bucket_edges) else n
+        next_x, next_y = x[end:next_end].mean(), y[end:next_end].mean()
+        previous_x, previous_y = x[indices[bucket]], y[indices[bucket]]
+
+        areas = np.abs((previous_x - next_x) * (y[start:end] - previous_y)
+                       - (previous_x - x[start:end]) * (next_y - previous_y))
+        indices[bucket + 1] = start + np.argmax(areas)
+    return indices
+
+
+def get_lttb_player_indices(player_offsets, timestamps, elos, n_points):
+    seconds = (timestamps - timestamps.min(initial=np.datetime64(0, 'us'))).astype(np.float64) / 1e6
+    kept_indices = []
+    for start, end in zip(player_offsets[:-1], player_offsets[1:]):
+        kept_indices.append(start + get_lttb_indices(seconds[start:end], elos[start:end], n_points))
+    return np.concatenate(kept_indices) if kept_indices else np.zeros(0, dtype=int)
+
+
+def get_player_offsets(player_indices, n_players):
+    # rows of player i are player_offsets[i]:player_offsets[i + 1]
+    return np.searchsorted(player_indices, np.arange(n_players + 1))
+
+
+def export_history(path, con, downsampling=None, n_points=None):
+    '''
+        input:
+            - path of the .npz file
+            - downsampling None, 'day' for the last elo of every day or 'lttb' for n_points per player
+        output:
+            - number of exported rows
+
+        columns are player index (into player_ids), game id, timestamp and elo after the game, sorted by
+        player and time. player_offsets[i]:player_offsets[i + 1] are the rows of player_ids[i].
+    '''
+    player_ids, game_ids, timestamps, elos = read_history_columns(con)
+    unique_player_ids, player_indices = np.unique(player_ids, return_inverse=True)
+    player_indices = player_indices.astype(np.int32)
+    player_offsets = get_player_offsets(player_indices, len(unique_player_ids))
+
+    if downsampling == 'day':
+        kept_indices = get_day_last_indices(player_indices, timestamps)
+    elif downsampling == 'lttb':
+        kept_indices = get_lttb_player_indices(player_offsets, timestamps, elos, n_points)
+    else:
+        kept_indices = None
+    if kept_indices is not None:
+        player_indices, game_ids, timestamps, elos = (
+            column[kept_indices] for column in (player_indices, game_ids, timestamps, elos))
+        player_offsets = get_player_offsets(player_indices, len(unique_player_ids))
+
+    directory = os.path.dirname(path)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(path + '.tmp', 'wb') as export_file:
+        np.savez(
+            export_file,
+            player_ids=unique_player_ids,
+            player_offsets=player_offsets,
+            player=player_indices,
+            game=game_ids,
+            timestamp=timestamps,
+            elo=elos)
+    os.replace(path + '.tmp', path)
+    return len(elos)
@@ -0,0 +1,107 @@
+import numpy as np
+
+from constants import STARGING_ELO, EXPECTED_TENFOLD_ADVANTAGE, GLICKO2_TAU
+
+
+GLICKO2_SCALE = EXPECTED_TENFOLD_ADVANTAGE / np.log(10)  # ratings on the elo scale to the glicko-2 scale
+VOLATILITY_TOLERANCE = 1e-6
+MAX_VOLATILITY_ITERATIONS = 100
+
+
+def get_deviation_weights(deviations):
+    # g(phi), how much a result against an opponent with this deviation tells about a player
+    phis = np.asarray(deviations, dtype=float) / GLICKO2_SCALE
+    return 1 / np.sqrt(1 + 3 * phis ** 2 / np.pi ** 2)
+
+
+def get_expected_glicko2_scores(playerA_ratings, playerB_ratings, playerB_deviations):
+    mu_differences = (np.asarray(playerA_ratings, dtype=float) - playerB_ratings) / GLICKO2_SCALE
+    return 1 / (1 + np.exp(- get_deviation_weights(playerB_deviations) * mu_differences))
+
+
+def get_new_volatilities(phis, sigmas, variances, deltas, tau=GLICKO2_TAU):
+    '''
+        input:
+            - phis, sigmas of the players on the glicko-2 scale
+            - variances, deltas of their results in the rating period
+        output:
+            - new volatilities
+
+        solves step 5 of the glicko-2 paper with the illinois algorithm for all players at once,
+        players whose bracket is narrow enough stop changing.
+    '''
+    a = np.log(sigmas ** 2)
+
+    def f(x):
+        exp_x = np.exp(x)
+        return exp_x * (deltas ** 2 - phis ** 2 - variances - exp_x) / (2 * (phis ** 2 + variances + exp_x) ** 2) \
+            - (x - a) / tau ** 2
+
+    A = a.copy()
+    large_deltas = deltas ** 2 > phis ** 2 + variances
+    B = np.where(large_deltas, np.log(np.maximum(deltas ** 2 - phis ** 2 - variances, np.finfo(float).tiny)), a - tau)
+    searching = ~large_deltas & (f(B) < 0)
+    while searching.any():
+        B[searching] -= tau
+        searching &= f(B) < 0
+
+    f_A, f_B = f(A), f(B)
+    for _ in range(MAX_VOLATILITY_ITERATIONS):
+        active = np.abs(B - A) > VOLATILITY_TOLERANCE
+        if not active.any():
+            break
+        C = np.where(active, A + (A - B) * f_A / np.where(active, f_B - f_A, 1), B)
+        f_C = f(C)
+        crossing = active & (f_C * f_B <= 0)
+        A = np.where(crossing, B, A)
+        f_A = np.where(crossing, f_B, np.where(active, f_A / 2, f_A))
+        B = np.where(active, C, B)
+        f_B = np.where(active, f_C, f_B)
+    return np.exp(A / 2)
+
+
+def rate_glicko2_period(ratings, deviations, volatilities, playerA_indices, playerB_indices, playerA_scores):
+    '''
+        input:
+            - ratings, deviations (on the elo scale) and volatilities of all players
+            - playerA_indices, playerB_indices and playerA_scores of all games in the rating period
+        output:
+            - new ratings, deviations and volatilities of all players
+
+        every game of the period is rated against the opponents' ratings at the start of the period, so
+        all players are updated at once. players without games only grow more uncertain.
+    '''
+    ratings = np.asarray(ratings, dtype=float)
+    deviations = np.asarray(deviations, dtype=float)
+    playerA_indices = np.asarray(playerA_indices, dtype=int)
+    playerB_indices = np.asarray(playerB_indices, dtype=int)
+    playerA_scores = np.asarray(playerA_scores, dtype=float)
+
+    # every game once from each side
+    player_indices = np.concatenate([playerA_indices, playerB_indices])
+    opponent_indices = np.concatenate([playerB_indices, playerA_indices])
+    scores = np.concatenate([playerA_scores, 1 - playerA_scores])
+
+    weights = get_deviation_weights(deviations[opponent_indices])
+    expected_scores = get_expected_glicko2_scores(
+        ratings[player_indices], ratings[opponent_indices], deviations[opponent_indices])
+
+    mus = (ratings - STARGING_ELO) / GLICKO2_SCALE
+    phis = deviations / GLICKO2_SCALE
+    sigmas = np.asarray(volatilities, dtype=float)
+    information = np.bincount(
+        player_indices, weights=weights ** 2 * expected_scores * (1 - expected_scores), minlength=len(mus))
+    improvements = np.bincount(player_indices, weights=weights * (scores - expected_scores), minlength=len(mus))
+
+    rated = information > 0
+    variances = 1 / information[rated]
+    deltas = variances * improvements[rated]
+
+    new_sigmas = sigmas.copy()
+    new_sigmas[rated] = get_new_volatilities(phis[rated], sigmas[rated], variances, deltas)
+    new_phis = np.sqrt(phis ** 2 + new_sigmas ** 2)  # players without games stop here
+    new_phis[rated] = 1 / np.sqrt(1 / new_phis[rated] ** 2 + 1 / variances)
+    new_mus = mus.copy()
+    new_mus[rated] += new_phis[rated] ** 2 * improvements[rated]
+
+    return new_mus * GLICKO2_SCALE + STARGING_ELO, new_phis * GLICKO2_SCALE, new_sigmas
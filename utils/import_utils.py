@@ -0,0 +1,163 @@
+import csv
+import json
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from constants import RESULT_SCORE_DICT, WRONG_ORDER_RESULTS, INVERSE_RESULT_DICT
+from utils.db_utils import add_games_batch, get_last_game_id, get_last_game_date, get_game
+from utils.elo import get_result_scores
+from utils.rating import get_rating_engine
+from utils.replay import replay_ratings, add_checkpoint_if_due, get_last_rating_period_game, check_rating_engine
+
+
+log = logging.getLogger('import_utils')
+
+GAME_FILE_FIELDS = ('playerA', 'playerB', 'result', 'date')
+
+
+def read_game_file(path):
+    if path.endswith('.csv'):
+        yield from read_game_csv(path)
+    elif path.endswith('.jsonl'):
+        yield from read_game_jsonl(path)
+    else:
+        raise ValueError('Game files must end in ".csv" or ".jsonl"')
+
+
+def read_game_csv(path):
+    with open(path, newline='') as csv_file:
+        reader = csv.DictReader(csv_file)
+        for row in reader:
+            yield reader.line_num, row
+
+
+def read_game_jsonl(path):
+    with open(path) as jsonl_file:
+        for line_number, line in enumerate(jsonl_file, start=1):
+            if not line.strip():
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError:
+                row = None
+            yield line_number, row
+
+
+def parse_game_row(row, player_id_dict):
+    if not isinstance(row, dict):
+        raise ValueError('Not a valid row')
+    missing_fields = [field for field in GAME_FILE_FIELDS if not row.get(field)]
+    if missing_fields:
+        raise ValueError('Missing {}'.format(', '.join(missing_fields)))
+
+    playerA_name = str(row['playerA']).strip()
+    playerB_name = str(row['playerB']).strip()
+    result_string = str(row['result']).strip()
+    if result_string not in RESULT_SCORE_DICT:
+        raise ValueError('Result must be one of {}'.format(', '.join(RESULT_SCORE_DICT)))
+    if playerA_name not in player_id_dict:
+        raise ValueError('Player "{}" does not exist'.format(playerA_name))
+    if playerB_name not in player_id_dict:
+        raise ValueError('Player "{}" does not exist'.format(playerB_name))
+    if playerA_name == playerB_name:
+        raise ValueError('Player "{}" plays against themself'.format(playerA_name))
+    try:
+        date = datetime.fromisoformat(str(row['date']).strip())
+    except ValueError:
+        raise ValueError('Date "{}" is not in ISO format'.format(row['date']))
+
+    playerA_id = player_id_dict[playerA_name]
+    playerB_id = player_id_dict[playerB_name]
+    if result_string in WRONG_ORDER_RESULTS:  # make winner always playerA
+        result_string = INVERSE_RESULT_DICT[result_string]
+        playerA_id, playerB_id = playerB_id, playerA_id
+    return playerA_id, playerB_id, result_string, date
+
+
+def parse_game_file(path, con):
+    player_id_dict = dict(con.execute('SELECT name, id FROM player'))
+
+    games, errors = [], []
+    for line_number, row in read_game_file(path):
+        try:
+            games.append(parse_game_row(row, player_id_dict))
+        except ValueError as error:
+            errors.append((line_number, str(error)))
+
+    games.sort(key=lambda game: game[3])
+    return games, errors
+
+
+def is_back_dated(games, con):
+    # games are sorted by date, only the first one can be older than the recorded games
+    last_game_date = get_last_game_date(con)
+    return bool(games) and last_game_date is not None and str(games[0][3]) < last_game_date
+
+
+def get_rated_until_date(con):
+    # games older than the last closed rating period can't be rated any more without changing closed periods
+    last_game_id = get_last_rating_period_game(con)
+    if last_game_id is None:
+        return None
+    return get_game(last_game_id, con)[3]
+
+
+def get_imported_game_rows(games, con, rate=True):
+    first_game_id = get_last_game_id(con) + 1
+    game_ids = range(first_game_id, first_game_id + len(games))
+    game_rows = [(game_id, ) + tuple(game) for game_id, game in zip(game_ids, games)]
+    if not rate or get_rating_engine().rates_in_periods:  # rated by a replay or when the rating period is closed
+        return game_rows, [], {}
+
+    players = con.execute('SELECT id, elo FROM player').fetchall()
+    player_indices = {player_id: index for index, (player_id, _) in enumerate(players)}
+    playerA_ids = [game[0] for game in games]
+    playerB_ids = [game[1] for game in games]
+    ratings, (playerA_elos_before, playerA_elos, playerB_elos_before, playerB_elos) = get_rating_engine().rate_games(
+        {'elo': np.array([elo for _, elo in players], dtype=float)},
+        [player_indices[player_id] for player_id in playerA_ids],
+        [player_indices[player_id] for player_id in playerB_ids],
+        get_result_scores([game[2] for game in games]))
+
+    history_rows = []
+    for game_id, playerA_id, playerB_id, playerA_elo_before, playerA_elo, playerB_elo_before, playerB_elo in zip(
+            game_ids, playerA_ids, playerB_ids, playerA_elos_before.tolist(), playerA_elos.tolist(),
+            playerB_elos_before.tolist(), playerB_elos.tolist()):
+        history_rows.append((playerA_id, game_id, playerA_elo_before, playerA_elo))
+        history_rows.append((playerB_id, game_id, playerB_elo_before, playerB_elo))
+
+    elos = ratings['elo'].tolist()
+    changed_player_elos = {player_id: elos[player_indices[player_id]] for player_id in playerA_ids + playerB_ids}
+    return game_rows, history_rows, changed_player_elos
+
+
+def import_games(games, con):
+    '''
+        input:
+            - games as (playerA_id, playerB_id, result, date) sorted by date
+        output:
+            - number of imported games
+
+        games after the last recorded game are rated on top of the current ratings. if some are older,
+        the ratings are replayed from the last checkpoint before the oldest imported game, which also
+        replaces the history and checkpoints after it. with a rating period engine games older than the
+        last closed period are refused with a ValueError, as are ratings made by another engine.
+    '''
+    engine = get_rating_engine()
+    check_rating_engine(engine, con)
+    back_dated = is_back_dated(games, con)
+    if back_dated and engine.rates_in_periods:
+        rated_until_date = get_rated_until_date(con)
+        if rated_until_date is not None and str(games[0][3]) < rated_until_date:
+            raise ValueError('Games before {} belong to closed rating periods'.format(rated_until_date))
+
+    game_rows, history_rows, player_elos = get_imported_game_rows(games, con, rate=not back_dated)
+    with con:  # all or nothing
+        add_games_batch(game_rows, history_rows, player_elos, con)
+        if back_dated and not engine.rates_in_periods:
+            replay_ratings(con, game_rows[0][0])
+        elif not engine.rates_in_periods:
+            add_checkpoint_if_due(con)
+    return len(game_rows)
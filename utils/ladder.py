@@ -0,0 +1,162 @@
+from bisect import bisect_left, bisect_right, insort
+from itertools import groupby
+
+from utils.score_cache import get_cache_token
+
+
+# connections can't be weakly referenced, so they are kept here until forget_ladder is called
+_ladders = {}
+
+
+class Ladder:
+    # players sorted by descending elo, ranks and neighbours are found by bisection
+
+    def __init__(self, player_elos, token):
+        self.token = token
+        self.elos = dict(player_elos)
+        self.keys = sorted((-elo, player_id) for player_id, elo in self.elos.items())
+
+    def __len__(self):
+        return len(self.keys)
+
+    def set_elo(self, player_id, elo):
+        if player_id in self.elos:
+            del self.keys[bisect_left(self.keys, (-self.elos[player_id], player_id))]
+        self.elos[player_id] = elo
+        insort(self.keys, (-elo, player_id))
+
+    def set_elos(self, player_elos):
+        # many players at once are cheaper to sort in again than to move one by one
+        if len(player_elos) * 8 < len(self.keys):
+            for player_id, elo in player_elos.items():
+                self.set_elo(player_id, elo)
+        else:
+            self.elos.update(player_elos)
+            self.keys = sorted((-elo, player_id) for player_id, elo in self.elos.items())
+
+    def get_rank(self, player_id):
+        # players with the same elo share a rank
+        return bisect_left(self.keys, (-self.elos[player_id],)) + 1
+
+    def get_percentile(self, player_id):
+        # share of the other players with a lower elo
+        n_lower = len(self.keys) - bisect_right(self.keys, (-self.elos[player_id], float('inf')))
+        return 100 * n_lower / max(len(self.keys) - 1, 1)
+
+    def get_neighbours(self, player_id, n_neighbours=2):
+        # rank, id and elo of the players around player_id, including itself
+        index = bisect_left(self.keys, (-self.elos[player_id], player_id))
+        start = max(index - n_neighbours, 0)
+        neighbours = []
+        for negative_elo, neighbour_id in self.keys[start:index + n_neighbours + 1]:
+            neighbours.append((self.get_rank(neighbour_id), neighbour_id, -negative_elo))
+        return neighbours
+
+
+def get_ladder(con):
+    # the cache token changes with every elo write, so writes made without update_ladder trigger a reload
+    token = get_cache_token(con)
+    _, ladder = _ladders.get(id(con), (None, None))
+    if ladder is None or token is None or ladder.token != token:
+        ladder = Ladder(con.execute('SELECT id, elo FROM player ORDER BY elo DESC, id'), token)
+        _ladders[id(con)] = (con, ladder)
+    return ladder
+
+
+def update_ladder(player_id, elo, token_before, con):
+    # keeps a loaded ladder current after a single elo write, if nothing else was written before it
+    _, ladder = _ladders.get(id(con), (None, None))
+    if ladder is None or token_before is None or ladder.token != token_before:
+        return
+    ladder.set_elo(player_id, elo)
+    ladder.token = get_cache_token(con)
+
+
+def keep_ladder(token_before, con):
+    # a write that changes no elo, like the pair statistics of a new game, leaves a current ladder current
+    _, ladder = _ladders.get(id(con), (None, None))
+    if ladder is None or token_before is None or ladder.token != token_before:
+        return
+    ladder.token = get_cache_token(con)
+
+
+def forget_ladder(con):
+    _ladders.pop(id(con), None)
+
+
+def get_history_ranks(player_id, game_ids, con):
+    '''
+        input:
+            - player_id whose games are ranked
+            - game_ids of games of that player
+        output:
+            - dictionary of game id to the rank after the game and the rank change, positive is a climb
+
+        ranks are among the players who had played by then. the elos are replayed from the history,
+        starting at the last rating checkpoint before the earliest game. the checkpoint only seeds the
+        players with a game up to it, whoever else it holds, so every checkpoint gives the same ranks.
+    '''
+    if not game_ids:
+        return {}
+    sql = """
+        SELECT m.id, m.date FROM game m
+            WHERE m.id IN ({})
+            ORDER BY m.date, m.id
+        """.format(', '.join('?' * len(game_ids)))
+    games = con.execute(sql, list(game_ids)).fetchall()
+    (first_game_id, first_date), (last_game_id, last_date) = games[0], games[-1]
+
+    sql = """
+        SELECT c.id, c.date FROM ratingCheckpoint r
+            JOIN game c
+                ON r.game = c.id
+            WHERE (c.date, c.id) < (?, ?)
+            ORDER BY c.date DESC, c.id DESC
+            LIMIT 1
+        """
+    checkpoints = con.execute(sql, [first_date, first_game_id]).fetchall()
+    player_elos = {}
+    data = {'last_date': last_date, 'last_id': last_game_id}
+    checkpoint_condition = '1'
+    if checkpoints:
+        checkpoint_game_id, checkpoint_date = checkpoints[0]
+        data.update(start_date=checkpoint_date, start_id=checkpoint_game_id)
+        sql = """
+            SELECT r.player, r.elo FROM ratingCheckpoint r
+                WHERE r.game = :start_id AND EXISTS (
+                    SELECT 1 FROM history h
+                        JOIN game m
+                            ON h.game = m.id
+                        WHERE h.player = r.player AND (m.date, m.id) <= (:start_date, :start_id))
+            """
+        player_elos = dict(con.execute(sql, data))
+        checkpoint_condition = '(m.date, m.id) > (:start_date, :start_id)'
+
+    sql = """
+        SELECT h.game, h.player, h.eloAfter FROM history h
+            JOIN game m
+                ON h.game = m.id
+            WHERE {} AND (m.date, m.id) <= (:last_date, :last_id)
+            ORDER BY m.date, m.id
+        """.format(checkpoint_condition)
+    history = con.execute(sql, data)
+
+    # elos between ranked games only go to the ladder once, when the next rank is looked up
+    ladder = Ladder(player_elos, None)
+    changed_elos = {}
+    ranked_game_ids = set(game_ids)
+    ranks = {}
+    for game_id, rows in groupby(history, key=lambda row: row[0]):
+        rows = list(rows)
+        if game_id in ranked_game_ids:
+            ladder.set_elos(changed_elos)
+            changed_elos.clear()
+            rank_before = ladder.get_rank(player_id) if player_id in ladder.elos else None
+        for _, history_player_id, elo_after in rows:
+            changed_elos[history_player_id] = elo_after
+        if game_id in ranked_game_ids:
+            ladder.set_elos(changed_elos)
+            changed_elos.clear()
+            rank_after = ladder.get_rank(player_id)
+            ranks[game_id] = (rank_after, rank_before - rank_after if rank_before is not None else None)
+    return ranks
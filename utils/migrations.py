@@ -0,0 +1,135 @@
+import logging
+
+from constants import GLICKO2_START_DEVIATION, GLICKO2_START_VOLATILITY, RATING_ENGINE
+from utils.db_utils import rebuild_pair_stats
+
+
+log = logging.getLogger('migrations')
+
+
+def add_indexes(con):
+    con.execute('CREATE INDEX IF NOT EXISTS gamePlayers ON game (playerA, playerB)')
+    con.execute('CREATE INDEX IF NOT EXISTS gamePlayerB ON game (playerB)')
+    con.execute('CREATE INDEX IF NOT EXISTS gameDate ON game (date)')
+    con.execute('CREATE INDEX IF NOT EXISTS historyPlayer ON history (player)')
+    con.execute('CREATE INDEX IF NOT EXISTS draftPlayerDraft ON draftPlayer (draft)')
+    con.execute('CREATE INDEX IF NOT EXISTS draftPairingRound ON draftPairing (draft, round)')
+    con.execute('CREATE INDEX IF NOT EXISTS draftSuspensionRound ON draftSuspension (draft, round)')
+    con.execute('CREATE INDEX IF NOT EXISTS draftGameRound ON draftGame (draft, round)')
+
+
+def add_pair_stats(con):
+    # databases started before migrations existed may already have this table
+    con.execute("""
+        CREATE TABLE IF NOT EXISTS pairStats (
+            playerA INTEGER NOT NULL,
+            playerB INTEGER NOT NULL,
+            encounters INTEGER NOT NULL,
+            winsA INTEGER NOT NULL,
+            winsB INTEGER NOT NULL,
+            draws INTEGER NOT NULL,
+            lastDate timestamp,
+            PRIMARY KEY(playerA, playerB),
+            FOREIGN KEY(playerA) REFERENCES player(id),
+            FOREIGN KEY(playerB) REFERENCES player(id)
+        )
+        """)
+    rebuild_pair_stats(con)
+
+
+def add_rating_checkpoints(con):
+    con.execute("""
+        CREATE TABLE ratingCheckpoint (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            game INTEGER,
+            player INTEGER,
+            elo REAL NOT NULL,
+            FOREIGN KEY(game) REFERENCES game(id),
+            FOREIGN KEY(player) REFERENCES player(id)
+        )
+        """)
+    con.execute('CREATE INDEX ratingCheckpointGame ON ratingCheckpoint (game)')
+    con.execute('CREATE INDEX IF NOT EXISTS historyGame ON history (game)')
+
+
+def add_cache_state(con):
+    # the token changes with every write to the score inputs, caches store the token they were built at
+    con.execute('CREATE TABLE cacheState (token TEXT NOT NULL)')
+    con.execute('INSERT INTO cacheState (token) VALUES (hex(randomblob(8)))')
+    for table, event in [
+            ('player', 'INSERT'), ('player', 'DELETE'), ('player', 'UPDATE OF elo'),
+            ('pairStats', 'INSERT'), ('pairStats', 'DELETE'), ('pairStats', 'UPDATE')]:
+        con.execute("""
+            CREATE TRIGGER {}{}CacheState AFTER {} ON {}
+            BEGIN
+                UPDATE cacheState SET token = hex(randomblob(8));
+            END
+            """.format(table, event.split()[0].title(), event, table))
+
+
+def add_player_elo_index(con):
+    con.execute('CREATE INDEX playerElo ON player (elo)')
+
+
+def add_rating_periods(con):
+    # deviation and volatility only change with the glicko2 engine, the elo engine leaves the start values
+    con.execute('ALTER TABLE player ADD COLUMN deviation REAL NOT NULL DEFAULT {}'.format(GLICKO2_START_DEVIATION))
+    con.execute('ALTER TABLE player ADD COLUMN volatility REAL NOT NULL DEFAULT {}'.format(GLICKO2_START_VOLATILITY))
+    con.execute('ALTER TABLE history ADD COLUMN deviationAfter REAL')
+    con.execute('ALTER TABLE history ADD COLUMN volatilityAfter REAL')
+    con.execute("""
+        CREATE TABLE ratingPeriod (
+            id INTEGER NOT NULL PRIMARY KEY AUTOINCREMENT,
+            game INTEGER,
+            date timestamp,
+            FOREIGN KEY(game) REFERENCES game(id)
+        )
+        """)
+
+
+def add_rating_state(con):
+    # the engine that made the stored ratings, only that engine may continue them
+    con.execute('CREATE TABLE ratingState (engine TEXT NOT NULL)')
+    if con.execute('SELECT 1 FROM ratingPeriod LIMIT 1').fetchall():
+        engine = 'glicko2'
+    elif con.execute('SELECT 1 FROM history LIMIT 1').fetchall():
+        engine = 'elo'
+    else:  # nothing rated yet
+        engine = RATING_ENGINE
+    con.execute('INSERT INTO ratingState (engine) VALUES (?)', [engine])
+
+
+# never reorder or remove entries, the position in this list is the schema version
+MIGRATIONS = [
+    add_indexes,
+    add_pair_stats,
+    add_rating_checkpoints,
+    add_cache_state,
+    add_player_elo_index,
+    add_rating_periods,
+    add_rating_state,
+]
+
+
+def get_db_version(con):
+    result = con.execute('PRAGMA user_version')
+    return result.fetchall()[0][0]
+
+
+def migrate_db(con):
+    db_version = get_db_version(con)
+    if db_version > len(MIGRATIONS):
+        log.warning('Database version {} is newer than this program ({})'.format(db_version, len(MIGRATIONS)))
+        return
+
+    for version, migration in enumerate(MIGRATIONS[db_version:], start=db_version + 1):
+        log.info('Migrating database to version {} ({})'.format(version, migration.__name__))
+        con.commit()
+        con.execute('BEGIN')
+        try:
+            migration(con)
+            con.execute('PRAGMA user_version = {}'.format(version))
+        except BaseException:
+            con.rollback()
+            raise
+        con.commit()
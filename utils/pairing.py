@@ -1,37 +1,58 @@
-from collections import defaultdict
+import logging
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
-from scipy.cluster import hierarchy
-from scipy.spatial.distance import squareform
-from fastcluster import linkage
 
-from utils.db_utils import get_fafmats_scores, get_player_name_by_id, get_n_wins
-from constants import GENERATE_PLOTS
+from utils.db_utils import get_fafmats_score_matrix, get_fafmats_score_inputs, get_fafmats_distances, \
+    get_fafmats_pool, get_player_elos, get_draft_wins, get_previous_draft_pairings, get_previous_draft_suspensions, \
+    get_round_by_draft_id, get_active_draft_players
+from utils.elo import calculate_fafmats_score_matrix, calculate_fafmats_score_block, calculate_fafmats_pair_scores
+from utils.registry import get_registry
+from utils.profiling import profiled_section
+from constants import GENERATE_PLOTS, PAIRING_METHOD, PAIRING_PROCESSES, TABLE_METHOD, LARGE_POOL_SIZE, \
+    OPTIMAL_LEAF_ORDERING, EXACT_MATCHING_SIZE
 
 
+log = logging.getLogger('pairing')
+
+# scipy and fastcluster are imported inside the functions using them, they dominate the startup time
+
+
+@profiled_section('clustering')
 def get_fafmats_ordered_player_ids(player_ids, con):
-    scores_list = []
-    for i in range(len(player_ids)):
-        player_id = player_ids[i]
-        scores = get_fafmats_scores(player_id, player_ids, con)
-        scores_list.append(scores)
-    scores = np.array(scores_list)
+    from scipy.cluster import hierarchy
+    from scipy.spatial.distance import squareform
+
+    if len(player_ids) > LARGE_POOL_SIZE:
+        return get_large_pool_ordered_player_ids(player_ids, con)
+
+    scores = get_fafmats_score_matrix(player_ids, player_ids, con)
     np.fill_diagonal(scores, 1)  # sometimes scores to player itself might not be 1 due to diviion by zero checks
     scores = abs(1 - scores)
 
+    if not GENERATE_PLOTS:
+        result_order, _ = compute_serial_order(squareform(scores, checks=False), method='ward')
+        return [player_ids[i] for i in result_order]
+
     ordered_scores, result_order, result_linkage = compute_serial_matrix(scores, method='ward')
     ordered_player_ids = [player_ids[i] for i in result_order]
 
-    if GENERATE_PLOTS:
-        clusters = hierarchy.linkage(scores, method='ward')
-        plot_dendrogram(clusters, player_ids, con)
-        ordered_scores = abs(1 - ordered_scores)
-        plot_scores(ordered_scores, ordered_player_ids, con)
+    clusters = hierarchy.linkage(scores, method='ward')
+    plot_dendrogram(clusters, player_ids, con)
+    ordered_scores = abs(1 - ordered_scores)
+    plot_scores(ordered_scores, ordered_player_ids, con)
 
     return ordered_player_ids
 
 
-def get_draft_autopairing(draft_player_numbers, player_ids, con):
+def get_large_pool_ordered_player_ids(player_ids, con, optimal_ordering=OPTIMAL_LEAF_ORDERING):
+    # same order as get_fafmats_ordered_player_ids, built from the condensed distances only
+    distances = get_fafmats_distances(player_ids, con)
+    result_order, _ = compute_serial_order(distances, method='ward', optimal_ordering=optimal_ordering)
+    return [player_ids[i] for i in result_order]
+
+
+def get_draft_autopairing(draft_player_numbers, player_ids, con, method=TABLE_METHOD):
     ordered_player_ids = get_fafmats_ordered_player_ids(player_ids, con)
 
     draft_player_lists = []
@@ -40,12 +61,116 @@ def get_draft_autopairing(draft_player_numbers, player_ids, con):
         ordered_player_ids = ordered_player_ids[draft_player_number:]
         draft_player_lists.append(draft_player_ids)
 
+    if method == 'balanced':
+        draft_player_lists = get_balanced_draft_player_lists(draft_player_lists, con)
     return draft_player_lists
 
 
+def get_pairing_weight_getters(player_ids, con):
+    # get_weight_block(rows, columns) and get_weight_column(i) of the pairing weights of the pool,
+    # large pools never build the whole matrix
+    if len(player_ids) <= LARGE_POOL_SIZE:
+        weights = get_pairing_weights(get_fafmats_score_matrix(player_ids, player_ids, con))
+
+        def get_weight_block(rows, columns):
+            return weights[np.ix_(rows, columns)]
+
+        def get_weight_column(i):
+            return weights[:, i]
+    else:
+        pool = get_fafmats_pool(player_ids, con)
+
+        def get_weight_block(rows, columns):
+            return (calculate_fafmats_score_block(pool, rows, columns)
+                    + calculate_fafmats_score_block(pool, columns, rows).T) / 2
+
+        def get_weight_column(i):
+            return calculate_fafmats_pair_scores(pool, i)
+    return get_weight_block, get_weight_column
+
+
+@profiled_section('tables')
+def get_balanced_draft_player_lists(draft_player_lists, con):
+    player_ids = [player_id for draft_player_ids in draft_player_lists for player_id in draft_player_ids]
+    _, get_weight_column = get_pairing_weight_getters(player_ids, con)
+    tables = np.repeat(np.arange(len(draft_player_lists)), [len(ids) for ids in draft_player_lists])
+
+    tables = improve_tables(tables, get_weight_column)
+    return [[player_ids[i] for i in np.flatnonzero(tables == table)] for table in range(len(draft_player_lists))]
+
+
+def improve_tables(tables, get_weight_column, max_sweeps=100):
+    '''
+        input:
+            - tables is the table index of each player, the initial assignment
+            - get_weight_column(i) returns column i of a symmetric matrix of how good each pair is
+        output:
+            - table index of each player, with the same table sizes
+
+        goes through the players and applies the swap with a player at another table that adds the
+        most to the total weight of all pairs sitting at the same table, until no swap helps.
+        only one column of the weights is needed at a time.
+    '''
+    tables = np.array(tables)
+    players = np.arange(len(tables))
+    n_tables = tables.max(initial=-1) + 1
+
+    def get_pair_weights(i):
+        weights = np.array(get_weight_column(i), dtype=float)
+        weights[i] = 0
+        return weights
+
+    table_weights = np.zeros((len(tables), n_tables))  # weight of each player to each table
+    for i in players:
+        table_weights[:, tables[i]] += get_pair_weights(i)
+
+    for _ in range(max_sweeps):
+        improved = False
+        for i in players:
+            table_i = tables[i]
+            weights_i = get_pair_weights(i)
+            own_weights = table_weights[players, tables]
+            # gain of swapping player i and j: both leave their table and join the other one
+            gains = (table_weights[i, tables] + table_weights[:, table_i]
+                     - own_weights[i] - own_weights - 2 * weights_i)
+            gains[tables == table_i] = 0
+
+            j = np.argmax(gains)
+            if gains[j] <= 1e-12:
+                continue
+            table_j = tables[j]
+            weights_j = get_pair_weights(j)
+            table_weights[:, table_i] += weights_j - weights_i
+            table_weights[:, table_j] += weights_i - weights_j
+            tables[i], tables[j] = table_j, table_i
+            improved = True
+        if not improved:
+            break
+    return tables
+
+
+def get_table_summaries(draft_player_lists, con):
+    # average fafmats score of all pairs at a table, lowest and highest elo
+    player_ids = [player_id for draft_player_ids in draft_player_lists for player_id in draft_player_ids]
+    get_weight_block, _ = get_pairing_weight_getters(player_ids, con)
+    elos = get_player_elos(player_ids, con)
+
+    summaries = []
+    start = 0
+    for draft_player_ids in draft_player_lists:
+        end = start + len(draft_player_ids)
+        table_weights = get_weight_block(np.arange(start, end), np.arange(start, end))
+        n_pairs = len(draft_player_ids) * (len(draft_player_ids) - 1) / 2
+        average_score = (table_weights.sum() - np.trace(table_weights)) / 2 / n_pairs if n_pairs else 0.
+        summaries.append((average_score, elos[start:end].min(initial=np.inf), elos[start:end].max(initial=-np.inf)))
+        start = end
+    return summaries
+
+
 def plot_scores(scores, player_ids, con):
     import matplotlib.pyplot as plt
-    player_names = [get_player_name_by_id(player_id, con) for player_id in player_ids]
+    registered_player_names = get_registry(con).player_names
+    player_names = [registered_player_names[player_id] for player_id in player_ids]
     plt.title('FAFMATS Scores')
     plt.pcolormesh(scores)
     plt.colorbar()
@@ -55,8 +180,10 @@ def plot_scores(scores, player_ids, con):
 
 
 def plot_dendrogram(clusters, player_ids, con):
+    from scipy.cluster import hierarchy
     import matplotlib.pyplot as plt
-    player_names = [get_player_name_by_id(player_id, con) for player_id in player_ids]
+    registered_player_names = get_registry(con).player_names
+    player_names = [registered_player_names[player_id] for player_id in player_ids]
     plt.figure(figsize=(20, 6))
     plt.title('FAFMATS Tree')
     hierarchy.dendrogram(clusters, labels=player_names, orientation="top", leaf_font_size=9, leaf_rotation=360)
@@ -76,12 +203,16 @@ def seriation(Z, N, cur_index):
         seriation computes the order implied by a hierarchical tree (dendrogram)
         from https://gmarti.gitlab.io/ml/2017/09/07/how-to-sort-distance-matrix.html
     '''
-    if cur_index < N:
-        return [cur_index]
-    else:
-        left = int(Z[cur_index-N, 0])
-        right = int(Z[cur_index-N, 1])
-        return (seriation(Z, N, left) + seriation(Z, N, right))
+    order = []
+    stack = [cur_index]  # iterative, unbalanced trees are deeper than the recursion limit
+    while stack:
+        index = stack.pop()
+        if index < N:
+            order.append(index)
+        else:
+            stack.append(int(Z[index-N, 1]))
+            stack.append(int(Z[index-N, 0]))
+    return order
 
 
 def compute_serial_matrix(dist_mat, method='ward'):
@@ -103,27 +234,70 @@ def compute_serial_matrix(dist_mat, method='ward'):
         by the hierarchical tree (dendrogram)
         from https://gmarti.gitlab.io/ml/2017/09/07/how-to-sort-distance-matrix.html
     '''
-    N = len(dist_mat)
+    from scipy.spatial.distance import squareform
+
     flat_dist_mat = squareform(dist_mat, checks=False)
-    res_linkage = linkage(flat_dist_mat, method=method, preserve_input=True)
-    res_order = seriation(res_linkage, N, N + N-2)
-    seriated_dist = np.zeros((N, N))
-    a, b = np.triu_indices(N, k=1)
-    seriated_dist[a, b] = dist_mat[[res_order[i] for i in a], [res_order[j] for j in b]]
-    seriated_dist[b, a] = seriated_dist[a, b]
+    res_order, res_linkage = compute_serial_order(flat_dist_mat, method=method)
+    seriated_dist = dist_mat[np.ix_(res_order, res_order)]
+    np.fill_diagonal(seriated_dist, 0)
 
     return seriated_dist, res_order, res_linkage
 
 
-def get_player_pairings(draft_id, round_, player_ids, con):
+def compute_serial_order(flat_dist_mat, method='ward', optimal_ordering=False):
+    '''
+        input:
+            - flat_dist_mat is a condensed distance matrix, it is overwritten unless optimal_ordering is set
+            - method = ["ward", "single", "average", "complete"]
+            - optimal_ordering reorders the tree to minimize distances between neighbours
+        output:
+            - res_order is the order implied by the hierarchical tree
+            - res_linkage is the hierarchical tree (dendrogram)
+    '''
+    from scipy.cluster import hierarchy
+    from fastcluster import linkage
+
+    N = int(round((1 + np.sqrt(1 + 8 * len(flat_dist_mat))) / 2))
+    if N < 2:
+        return list(range(N)), None
+
+    res_linkage = linkage(flat_dist_mat, method=method, preserve_input=optimal_ordering)
+    if optimal_ordering:
+        res_linkage = hierarchy.optimal_leaf_ordering(res_linkage, flat_dist_mat)
+    res_order = seriation(res_linkage, N, N + N-2)
+    return res_order, res_linkage
+
+
+@profiled_section('pairing')
+def get_player_pairings(draft_id, round_, player_ids, con, method=PAIRING_METHOD):
     if round_ == 1:
-        pairings = get_random_player_pairing(player_ids, con)
+        pairings = get_first_round_pairing(player_ids, con, method)
     else:
-        pairings = get_round_player_pairing_groups(draft_id, player_ids, round_, con)
-        # TODO
+        pairings = get_swiss_player_pairing(draft_id, round_, player_ids, con)
     return pairings
 
 
+def get_first_round_pairing(player_ids, con, method=PAIRING_METHOD):
+    scores = get_fafmats_score_matrix(player_ids, player_ids, con)
+    weights = get_pairing_weights(scores)
+
+    seriation_pairings = get_random_player_pairing(player_ids, con)
+    matching_pair_indices, upper_bound = get_matching_pair_indices(weights)
+    matching_pairings = [tuple(player_ids[i] for i in pair_indices) for pair_indices in matching_pair_indices]
+
+    matching_score = get_pairing_score(matching_pairings, player_ids, weights)
+    if matching_score >= upper_bound - 1e-9:
+        matching_note = 'optimal'
+    else:
+        matching_note = 'heuristic, the optimum is at most {:.2f}'.format(upper_bound)
+    log.info('Total fafmats score of pairings: seriation {:.2f}, matching {:.2f} ({})'.format(
+        get_pairing_score(seriation_pairings, player_ids, weights), matching_score, matching_note))
+
+    if method == 'seriation':
+        return seriation_pairings
+    return matching_pairings
+
+
 def get_random_player_pairing(player_ids, con):
     ordered_player_ids = get_fafmats_ordered_player_ids(player_ids, con)
     ordered_player_ids_iterator = iter(ordered_player_ids)
@@ -133,9 +307,320 @@ def get_random_player_pairing(player_ids, con):
     return ordered_player_id_pairs
 
 
-def get_round_player_pairing_groups(draft_id, player_ids, round_, con):
-    player_id_wins_dict = defaultdict(list)
-    for player_id in player_ids:
-        n_wins = get_n_wins(player_id, draft_id, con)
-        player_id_wins_dict[player_id].append(n_wins)
-    print(player_id_wins_dict)
+def get_pairing_weights(scores):
+    # the score matrix is normalized per player, a pair is worth the mean of both views
+    return (scores + scores.T) / 2
+
+
+def get_pairing_score(pairings, player_ids, weights):
+    player_indices = {player_id: i for i, player_id in enumerate(player_ids)}
+    return sum(weights[player_indices[pairing[0]], player_indices[pairing[1]]]
+               for pairing in pairings if len(pairing) == 2)
+
+
+def get_matching_pair_indices(weights, bye_weights=None):
+    '''
+        input:
+            - weights is a symmetric matrix of how good each pair is
+            - bye_weights is how good a bye is for each player, zero by default
+        output:
+            - list of index pairs, plus a single index for the bye if the number of players is odd
+            - upper bound of the total weight any pairing could reach, the optimum itself for exact matchings
+
+        up to EXACT_MATCHING_SIZE players the pairing with the highest total weight is found by
+        get_exact_matching_pairs. larger pools are paired heuristically: the best assignment of every
+        player to an opponent (linear_sum_assignment) is a set of cycles worth at least twice the best
+        pairing. 2-cycles are taken as pairs, longer cycles are cut into pairs along the cycle and the
+        result is improved by swapping opponents between two pairs until no swap helps.
+    '''
+    weights = np.array(weights, dtype=float)
+    bye_index = None
+    if len(weights) % 2 != 0:  # the bye is an extra player
+        bye_index = len(weights)
+        if bye_weights is None:
+            bye_weights = np.zeros(len(weights))
+        weights = np.pad(weights, ((0, 1), (0, 1)))
+        weights[bye_index, :bye_index] = weights[:bye_index, bye_index] = bye_weights
+    if len(weights) == 0:
+        return [], 0.
+
+    if len(weights) <= EXACT_MATCHING_SIZE:
+        pairs, upper_bound = get_exact_matching_pairs(weights)
+    else:
+        pairs, upper_bound = get_heuristic_matching_pairs(weights)
+
+    pair_indices = []
+    for pair in pairs:
+        if bye_index in pair:
+            pair_indices.append((pair[0] if pair[1] == bye_index else pair[1], ))
+        else:
+            pair_indices.append(pair)
+    pair_indices.sort(key=len, reverse=True)  # bye last
+    return pair_indices, upper_bound
+
+
+def get_exact_matching_pairs(weights):
+    '''
+        input:
+            - weights is a symmetric matrix of how good each pair is, with an even number of players
+        output:
+            - list of index pairs with the highest total weight
+            - that total weight
+
+        dynamic program over all subsets of players: the best pairing of a subset pairs its lowest player
+        with one of the others and adds the best pairing of the rest. subsets of the same size are
+        handled together, in one vectorized step per opponent. time and memory grow with 2^N.
+    '''
+    n = len(weights)
+    subsets = np.arange(1 << n)
+    subset_sizes = np.zeros(len(subsets), dtype=np.int8)
+    lowest_players = np.zeros(len(subsets), dtype=np.int8)
+    for player in reversed(range(n)):
+        has_player = (subsets >> player) & 1 == 1
+        subset_sizes += has_player
+        lowest_players[has_player] = player
+
+    best_totals = np.full(len(subsets), -np.inf)
+    best_totals[0] = 0
+    best_opponents = np.zeros(len(subsets), dtype=np.int8)
+    for size in range(2, n + 1, 2):
+        layer = subsets[subset_sizes == size]
+        layer_lowest_players = lowest_players[layer].astype(int)
+        layer_totals = np.full(len(layer), -np.inf)
+        layer_opponents = np.zeros(len(layer), dtype=np.int8)
+        for opponent in range(1, n):
+            k = np.flatnonzero(((layer >> opponent) & 1 == 1) & (layer_lowest_players != opponent))
+            rests = layer[k] ^ (1 << layer_lowest_players[k]) ^ (1 << opponent)
+            totals = best_totals[rests] + weights[layer_lowest_players[k], opponent]
+            better = totals > layer_totals[k]
+            layer_totals[k[better]] = totals[better]
+            layer_opponents[k[better]] = opponent
+        best_totals[layer] = layer_totals
+        best_opponents[layer] = layer_opponents
+
+    pairs = []
+    subset = len(subsets) - 1
+    while subset:
+        player, opponent = int(lowest_players[subset]), int(best_opponents[subset])
+        pairs.append((player, opponent))
+        subset ^= (1 << player) | (1 << opponent)
+    return pairs, float(best_totals[-1])
+
+
+def get_heuristic_matching_pairs(weights):
+    # cycles of the best assignment cut into pairs and improved, see get_matching_pair_indices
+    from scipy.optimize import linear_sum_assignment
+
+    assignment_weights = weights.copy()
+    np.fill_diagonal(assignment_weights, -np.inf)
+    _, opponents = linear_sum_assignment(assignment_weights, maximize=True)
+    upper_bound = float(weights[np.arange(len(weights)), opponents].sum() / 2)
+
+    pairs, unpaired = [], []
+    for cycle in get_cycles(opponents):
+        cycle_pairs, cycle_unpaired = cut_cycle(cycle, weights)
+        pairs += cycle_pairs
+        unpaired += cycle_unpaired
+    pairs += get_greedy_pairs(unpaired, weights)
+    return improve_pairs(pairs, weights), upper_bound
+
+
+def get_cycles(permutation):
+    cycles = []
+    visited = np.zeros(len(permutation), dtype=bool)
+    for start in range(len(permutation)):
+        cycle = []
+        index = start
+        while not visited[index]:
+            visited[index] = True
+            cycle.append(index)
+            index = permutation[index]
+        if cycle:
+            cycles.append(cycle)
+    return cycles
+
+
+def cut_cycle(cycle, weights):
+    # pairs neighbours along the cycle, odd cycles leave out the player that costs the least
+    best_pairs, best_unpaired, best_score = None, None, -np.inf
+    n_starts = 2 if len(cycle) % 2 == 0 else len(cycle)
+    for start in range(n_starts):
+        path = cycle[start:] + cycle[:start]
+        path, unpaired = (path, []) if len(path) % 2 == 0 else (path[1:], path[:1])
+        pairs = list(zip(path[0::2], path[1::2]))
+        score = sum(weights[i, j] for i, j in pairs)
+        if score > best_score:
+            best_pairs, best_unpaired, best_score = pairs, unpaired, score
+    return best_pairs, best_unpaired
+
+
+def get_greedy_pairs(indices, weights):
+    pairs = []
+    indices = list(indices)
+    while indices:
+        sub_weights = weights[np.ix_(indices, indices)].copy()
+        np.fill_diagonal(sub_weights, -np.inf)
+        i, j = np.unravel_index(np.argmax(sub_weights), sub_weights.shape)
+        pairs.append((indices[i], indices[j]))
+        indices = [index for k, index in enumerate(indices) if k not in (i, j)]
+    return pairs
+
+
+def improve_pairs(pairs, weights, max_iterations=10000):
+    # repeatedly applies the best exchange of opponents between two pairs
+    pairs = np.array(pairs, dtype=int).reshape(-1, 2)
+    for _ in range(max_iterations):
+        a, b = pairs[:, 0], pairs[:, 1]
+        pair_scores = weights[a, b]
+        current_scores = pair_scores[:, np.newaxis] + pair_scores[np.newaxis, :]
+        crossed_scores = weights[np.ix_(a, a)] + weights[np.ix_(b, b)]  # (a1, a2), (b1, b2)
+        swapped_scores = weights[np.ix_(a, b)] + weights[np.ix_(b, a)]  # (a1, b2), (b1, a2)
+        gains = np.maximum(crossed_scores, swapped_scores) - current_scores
+        gains[np.tril_indices(len(pairs))] = 0
+
+        k, m = np.unravel_index(np.argmax(gains), gains.shape)
+        if gains[k, m] <= 1e-12:
+            break
+        (a1, b1), (a2, b2) = pairs[k], pairs[m]
+        if crossed_scores[k, m] >= swapped_scores[k, m]:
+            pairs[k], pairs[m] = (a1, a2), (b1, b2)
+        else:
+            pairs[k], pairs[m] = (a1, b2), (b1, a2)
+    return [(int(i), int(j)) for i, j in pairs]
+
+
+def get_swiss_player_pairing(draft_id, round_, player_ids, con):
+    scores = get_fafmats_score_matrix(player_ids, player_ids, con)
+    points, played, had_bye = get_draft_history_arrays(draft_id, round_, player_ids, con)
+
+    pair_indices = get_swiss_pair_indices(scores, points, played, had_bye)
+    warn_repeated_pairings(pair_indices, played, had_bye)
+    return [tuple(player_ids[i] for i in indices) for indices in pair_indices]
+
+
+def get_draft_history_arrays(draft_id, round_, player_ids, con):
+    # points, played pairs and byes of the players before the given round
+    draft_wins = get_draft_wins(draft_id, round_, con)
+    points = np.array([draft_wins.get(player_id, 0) for player_id in player_ids], dtype=float)
+
+    player_indices = {player_id: i for i, player_id in enumerate(player_ids)}
+    played = np.zeros((len(player_ids), len(player_ids)), dtype=bool)
+    for playerA_id, playerB_id in get_previous_draft_pairings(draft_id, round_, con):
+        if playerA_id in player_indices and playerB_id in player_indices:
+            played[player_indices[playerA_id], player_indices[playerB_id]] = True
+            played[player_indices[playerB_id], player_indices[playerA_id]] = True
+    had_bye = np.zeros(len(player_ids), dtype=bool)
+    for player_id in get_previous_draft_suspensions(draft_id, round_, con):
+        if player_id in player_indices:
+            had_bye[player_indices[player_id]] = True
+    return points, played, had_bye
+
+
+def warn_repeated_pairings(pair_indices, played, had_bye):
+    for indices in pair_indices:
+        if len(indices) == 2 and played[indices[0], indices[1]]:
+            log.warning('Could not avoid a rematch')
+        elif len(indices) == 1 and had_bye[indices[0]]:
+            log.warning('Could not avoid a second bye')
+
+
+def get_swiss_pair_indices(scores, points, played, had_bye):
+    '''
+        input:
+            - scores is the fafmats score matrix of the players
+            - points are the draft points of the players so far
+            - played marks pairs that already played in this draft
+            - had_bye marks players that already had a bye in this draft
+        output:
+            - list of index pairs ordered by points, plus a single index for the bye
+
+        pairs players within the same points group by matching, with penalties in order of importance:
+        rematches and second byes, then squared point differences (floating down as few as possible),
+        then the fafmats score as tie-break.
+    '''
+    n = len(points)
+    score_penalty = n + 1  # the smallest points difference outweighs all fafmats scores
+    repeat_penalty = score_penalty * (4 * (points.max(initial=0) + 1) ** 2) * (n + 1)  # outweighs all differences
+
+    points_differences = points[:, np.newaxis] - points[np.newaxis, :]
+    weights = get_pairing_weights(scores) - score_penalty * points_differences ** 2 - repeat_penalty * played
+    bye_weights = - score_penalty * points ** 2 - repeat_penalty * had_bye  # like playing someone without points
+
+    pair_indices, _ = get_matching_pair_indices(weights, bye_weights)
+    pair_indices.sort(key=lambda indices: (len(indices) == 1, - max(points[i] for i in indices)))
+    return pair_indices
+
+
+def get_seriation_pair_indices(scores):
+    # neighbours in the fafmats tree, like get_random_player_pairing but from the score matrix alone
+    from scipy.spatial.distance import squareform
+
+    distances = abs(1 - np.array(scores, dtype=float))
+    np.fill_diagonal(distances, 0)
+    order, _ = compute_serial_order(squareform(distances, checks=False), method='ward')
+    pair_indices = list(zip(order[0::2], order[1::2]))
+    if len(order) % 2 != 0:
+        pair_indices.append((order[-1], ))
+    return pair_indices
+
+
+def get_table_pair_indices(scores, round_, points, played, had_bye, method=PAIRING_METHOD):
+    # the pairing of one table from its arrays alone, so it can run in another process
+    if round_ != 1:
+        return get_swiss_pair_indices(scores, points, played, had_bye)
+    if method == 'seriation':
+        return get_seriation_pair_indices(scores)
+    pair_indices, _ = get_matching_pair_indices(get_pairing_weights(scores))
+    return pair_indices
+
+
+def get_event_pairing_inputs(draft_ids, con):
+    '''
+        input:
+            - draft_ids of the tables of a multi-table draft
+        output:
+            - list of (draft_id, round, player_ids, scores, points, played, had_bye) per table
+
+        elos and encounters of all players of the event are loaded once, the score matrix of each table
+        is computed from its rows and columns of the raw matrices.
+    '''
+    tables = [(draft_id, get_round_by_draft_id(draft_id, con), get_active_draft_players(draft_id, con))
+              for draft_id in draft_ids]
+    event_player_ids = list(dict.fromkeys(player_id for _, _, player_ids in tables for player_id in player_ids))
+    event_player_indices = {player_id: i for i, player_id in enumerate(event_player_ids)}
+    elo_differences, n_encounters = get_fafmats_score_inputs(event_player_ids, event_player_ids, con)
+
+    inputs = []
+    for draft_id, round_, player_ids in tables:
+        indices = np.ix_(*[[event_player_indices[player_id] for player_id in player_ids]] * 2)
+        scores = calculate_fafmats_score_matrix(elo_differences[indices], n_encounters[indices])
+        points, played, had_bye = get_draft_history_arrays(draft_id, round_, player_ids, con)
+        inputs.append((draft_id, round_, player_ids, scores, points, played, had_bye))
+    return inputs
+
+
+@profiled_section('pairing')
+def get_event_pairings(draft_ids, con, method=PAIRING_METHOD, n_processes=PAIRING_PROCESSES):
+    '''
+        input:
+            - draft_ids of the tables of a multi-table draft
+            - n_processes to spread the tables over, 1 pairs them here
+        output:
+            - list of (draft_id, round, pairings) per table, pairings as tuples of player ids
+    '''
+    inputs = get_event_pairing_inputs(draft_ids, con)
+    arguments = [(scores, round_, points, played, had_bye, method)
+                 for _, round_, _, scores, points, played, had_bye in inputs]
+
+    if n_processes > 1 and len(arguments) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_processes, len(arguments))) as executor:
+            results = list(executor.map(get_table_pair_indices, *zip(*arguments)))
+    else:
+        results = [get_table_pair_indices(*table_arguments) for table_arguments in arguments]
+
+    event_pairings = []
+    for (draft_id, round_, player_ids, _, _, played, had_bye), pair_indices in zip(inputs, results):
+        if round_ != 1:
+            warn_repeated_pairings(pair_indices, played, had_bye)
+        event_pairings.append((draft_id, round_, [tuple(player_ids[i] for i in indices) for indices in pair_indices]))
+    return event_pairings
@@ -0,0 +1,144 @@
+import json
+import logging
+from datetime import datetime
+from functools import wraps
+from time import perf_counter
+
+import sqlite3 as sl
+
+from constants import PROFILE_PATH
+
+
+log = logging.getLogger('profiling')
+
+# record of the command being profiled, None while profiling is off
+_profile = None
+
+
+class ProfiledCursor(sl.Cursor):
+    # adds the time spent executing statements and fetching rows to the current profile
+
+    def execute(self, sql, parameters=()):
+        start = perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            add_sql_time(perf_counter() - start)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            add_sql_time(perf_counter() - start)
+
+    def executescript(self, sql_script):
+        start = perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            add_sql_time(perf_counter() - start)
+
+    def fetchone(self):
+        start = perf_counter()
+        try:
+            return super().fetchone()
+        finally:
+            add_sql_time(perf_counter() - start)
+
+    def fetchmany(self, size=None):
+        start = perf_counter()
+        try:
+            return super().fetchmany(self.arraysize if size is None else size)
+        finally:
+            add_sql_time(perf_counter() - start)
+
+    def fetchall(self):
+        start = perf_counter()
+        try:
+            return super().fetchall()
+        finally:
+            add_sql_time(perf_counter() - start)
+
+    def __next__(self):
+        start = perf_counter()
+        try:
+            return super().__next__()
+        finally:
+            add_sql_time(perf_counter() - start)
+
+
+class ProfiledConnection(sl.Connection):
+    # the shortcut methods of sqlite3.Connection create plain cursors, so they are routed through cursor()
+
+    def cursor(self, factory=ProfiledCursor):
+        return super().cursor(factory)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+def add_sql_time(duration):
+    if _profile is not None:
+        _profile['sqlTime'] += duration
+
+
+def count_statement(statement):
+    # trace callback, called by sqlite for every statement it runs, including trigger programs
+    if _profile is not None:
+        _profile['statements'] += 1
+
+
+def enable_profiling(con):
+    con.set_trace_callback(count_statement)
+
+
+def start_command_profile(input_):
+    global _profile
+    _profile = {
+        'date': datetime.now().isoformat(),
+        'command': input_,
+        'wallTime': -perf_counter(),
+        'statements': 0,
+        'sqlTime': 0.,
+        'sections': {},
+    }
+
+
+def finish_command_profile(status):
+    global _profile
+    if _profile is None:
+        return
+    profile, _profile = _profile, None
+    profile['wallTime'] += perf_counter()
+    profile['status'] = status
+
+    sections = ''.join(', {} {:.3f}s'.format(name, duration) for name, duration in profile['sections'].items())
+    log.info('Profile: {:.3f}s total, {} SQL statements in {:.3f}s{}'.format(
+        profile['wallTime'], profile['statements'], profile['sqlTime'], sections))
+    with open(PROFILE_PATH, 'a') as profile_file:
+        profile_file.write(json.dumps(profile) + '\n')
+
+
+def profiled_section(name):
+    # decorator adding the time spent in the function to a named section of the current profile
+    def decorator(function):
+        @wraps(function)
+        def wrapper(*args, **kwargs):
+            if _profile is None:
+                return function(*args, **kwargs)
+            start = perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                if _profile is not None:
+                    sections = _profile['sections']
+                    sections[name] = sections.get(name, 0.) + perf_counter() - start
+        return wrapper
+    return decorator
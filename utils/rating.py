@@ -0,0 +1,49 @@
+import numpy as np
+
+from constants import RATING_ENGINE
+from utils.elo import replay_elo_games
+from utils.glicko2 import rate_glicko2_period
+
+
+# ratings are dictionaries of arrays over all players: 'elo', 'deviation' and 'volatility'
+# rate_games returns the new ratings and (playerA before, playerA after, playerB before, playerB after) per game
+
+class EloEngine:
+    # every game is rated when it is added, a batch of games is rated one after another
+    name = 'elo'
+    rates_in_periods = False
+
+    def rate_games(self, ratings, playerA_indices, playerB_indices, playerA_scores):
+        new_ratings = dict(ratings, elo=np.array(ratings['elo'], dtype=float))
+        playerA_elos, playerB_elos, elo_differences = replay_elo_games(
+            new_ratings['elo'], playerA_indices, playerB_indices, playerA_scores)
+        return new_ratings, (playerA_elos, playerA_elos + elo_differences, playerB_elos, playerB_elos - elo_differences)
+
+
+class Glicko2Engine:
+    # games are collected and rated together at the end of each rating period
+    name = 'glicko2'
+    rates_in_periods = True
+
+    def rate_games(self, ratings, playerA_indices, playerB_indices, playerA_scores):
+        elos, deviations, volatilities = rate_glicko2_period(
+            ratings['elo'], ratings['deviation'], ratings['volatility'],
+            playerA_indices, playerB_indices, playerA_scores)
+        new_ratings = {'elo': elos, 'deviation': deviations, 'volatility': volatilities}
+        playerA_indices = np.asarray(playerA_indices, dtype=int)
+        playerB_indices = np.asarray(playerB_indices, dtype=int)
+        old_elos = np.asarray(ratings['elo'], dtype=float)
+        return new_ratings, (old_elos[playerA_indices], elos[playerA_indices],
+                             old_elos[playerB_indices], elos[playerB_indices])
+
+
+RATING_ENGINES = {
+    'elo': EloEngine(),
+    'glicko2': Glicko2Engine(),
+}
+
+
+def get_rating_engine(name=RATING_ENGINE):
+    if name not in RATING_ENGINES:
+        raise ValueError('Rating engine must be one of {}'.format(', '.join(RATING_ENGINES)))
+    return RATING_ENGINES[name]
@@ -0,0 +1,40 @@
+# connections can't be weakly referenced, so they are kept here until forget_registry is called
+_registries = {}
+
+
+class Registry:
+    # id <-> name lookups for players and drafts, loaded once per connection
+
+    def __init__(self, con, data_version):
+        self.data_version = data_version
+        self.player_names = dict(con.execute('SELECT id, name FROM player'))
+        self.player_ids = {name: id_ for id_, name in self.player_names.items()}
+        self.draft_names = dict(con.execute('SELECT id, name FROM draft'))
+        self.draft_ids = {name: id_ for id_, name in self.draft_names.items()}
+
+    def add_player(self, player_id, name):
+        self.player_names[player_id] = name
+        self.player_ids[name] = player_id
+
+    def add_draft(self, draft_id, name):
+        self.draft_names[draft_id] = name
+        self.draft_ids[name] = draft_id
+
+
+def get_data_version(con):
+    # changes whenever another connection commits to the database
+    result = con.execute('PRAGMA data_version')
+    return result.fetchall()[0][0]
+
+
+def get_registry(con):
+    data_version = get_data_version(con)
+    _, registry = _registries.get(id(con), (None, None))
+    if registry is None or registry.data_version != data_version:
+        registry = Registry(con, data_version)
+        _registries[id(con)] = (con, registry)
+    return registry
+
+
+def forget_registry(con):
+    _registries.pop(id(con), None)
@@ -0,0 +1,318 @@
+import logging
+from datetime import datetime
+
+import numpy as np
+
+from constants import STARGING_ELO, RATING_CHECKPOINT_INTERVAL, GLICKO2_START_DEVIATION, GLICKO2_START_VOLATILITY
+from utils.db_utils import get_all_player_ids
+from utils.elo import get_result_scores, replay_elo_games
+from utils.rating import get_rating_engine
+
+
+log = logging.getLogger('replay')
+
+
+def get_games_after(game_id, con):
+    # games in the order they are rated in, all of them if game_id is None
+    if game_id is None:
+        sql = 'SELECT m.id, m.playerA, m.playerB, m.result FROM game m ORDER BY m.date, m.id'
+        result = con.execute(sql)
+    else:
+        sql = """
+            SELECT m.id, m.playerA, m.playerB, m.result FROM game m, game c
+                WHERE c.id = ? AND (m.date, m.id) > (c.date, c.id)
+                ORDER BY m.date, m.id
+            """
+        result = con.execute(sql, [game_id])
+    return result.fetchall()
+
+
+def replay_games(games, player_elos, checkpoint_interval=RATING_CHECKPOINT_INTERVAL):
+    player_ids = list(player_elos)
+    player_indices = {player_id: index for index, player_id in enumerate(player_ids)}
+    for _, playerA_id, playerB_id, _ in games:
+        for player_id in (playerA_id, playerB_id):
+            if player_id not in player_indices:
+                player_indices[player_id] = len(player_ids)
+                player_ids.append(player_id)
+    elos = np.array([player_elos.get(player_id, STARGING_ELO) for player_id in player_ids], dtype=float)
+
+    history_rows, checkpoint_rows = [], []
+    n_seen_players = len(player_elos)
+    for start in range(0, len(games), checkpoint_interval):  # checkpoints are taken between chunks
+        chunk = games[start:start + checkpoint_interval]
+        game_ids, playerA_ids, playerB_ids, results = zip(*chunk)
+        playerA_indices = [player_indices[player_id] for player_id in playerA_ids]
+        playerB_indices = [player_indices[player_id] for player_id in playerB_ids]
+        playerA_elos, playerB_elos, elo_differences = replay_elo_games(
+            elos, playerA_indices, playerB_indices, get_result_scores(results))
+
+        for game_id, playerA_id, playerB_id, playerA_elo, playerB_elo, elo_difference in zip(
+                game_ids, playerA_ids, playerB_ids,
+                playerA_elos.tolist(), playerB_elos.tolist(), elo_differences.tolist()):
+            history_rows.append((playerA_id, game_id, playerA_elo, playerA_elo + elo_difference))
+            history_rows.append((playerB_id, game_id, playerB_elo, playerB_elo - elo_difference))
+        n_seen_players = max(n_seen_players, max(playerA_indices + playerB_indices) + 1)
+        if len(chunk) == checkpoint_interval:
+            checkpoint_rows.extend((game_ids[-1], player_id, elo)
+                                   for player_id, elo in zip(player_ids[:n_seen_players], elos.tolist()))
+
+    player_elos.update(zip(player_ids, elos.tolist()))
+    return history_rows, checkpoint_rows
+
+
+def get_checkpoint_before(game_id, con):
+    sql = """
+        SELECT c.id FROM ratingCheckpoint r
+            LEFT JOIN game c
+                ON r.game = c.id
+            LEFT JOIN game m
+                ON m.id = ?
+            WHERE (c.date, c.id) < (m.date, m.id)
+            ORDER BY c.date DESC, c.id DESC
+            LIMIT 1
+        """
+    result = con.execute(sql, [game_id])
+    checkpoints = result.fetchall()
+    if not checkpoints:
+        return None
+    return checkpoints[0][0]
+
+
+def get_last_checkpoint(con):
+    sql = """
+        SELECT c.id FROM ratingCheckpoint r
+            LEFT JOIN game c
+                ON r.game = c.id
+            ORDER BY c.date DESC, c.id DESC
+            LIMIT 1
+        """
+    result = con.execute(sql)
+    checkpoints = result.fetchall()
+    if not checkpoints:
+        return None
+    return checkpoints[0][0]
+
+
+def get_checkpoint_elos(game_id, con):
+    sql = 'SELECT player, elo FROM ratingCheckpoint WHERE game = ?'
+    result = con.execute(sql, [game_id])
+    return dict(result.fetchall())
+
+
+def get_rated_engine_name(con):
+    # the engine that made the stored ratings
+    result = con.execute('SELECT engine FROM ratingState')
+    return result.fetchall()[0][0]
+
+
+def check_rating_engine(engine, con):
+    # ratings of one engine can't be continued by another, switching engines needs a full rebuild
+    rated_engine_name = get_rated_engine_name(con)
+    if rated_engine_name != engine.name:
+        raise ValueError('The ratings were made by the {} engine, rebuild them with "R rebuild" to use {}'.format(
+            rated_engine_name, engine.name))
+
+
+def set_rated_engine(engine, con):
+    con.execute('UPDATE ratingState SET engine = ?', [engine.name])
+
+
+def rebuild_ratings(con, game_id=None):
+    # replays from the last checkpoint before game_id, or everything if game_id is None.
+    # only a full replay may switch to another engine
+    engine = get_rating_engine()
+    if game_id is not None:
+        check_rating_engine(engine, con)
+    if engine.rates_in_periods:
+        return rebuild_rating_periods(con, engine)
+    with con:
+        set_rated_engine(engine, con)
+        return replay_ratings(con, game_id)
+
+
+def replay_ratings(con, game_id=None):
+    # rebuild_ratings of the elo engine, inside the transaction of the caller
+    checkpoint_game_id = None
+    player_elos = {}
+    if game_id is not None:
+        checkpoint_game_id = get_checkpoint_before(game_id, con)
+    if checkpoint_game_id is not None:
+        player_elos = get_checkpoint_elos(checkpoint_game_id, con)
+
+    games = get_games_after(checkpoint_game_id, con)
+    history_rows, checkpoint_rows = replay_games(games, player_elos)
+
+    if checkpoint_game_id is None:
+        con.execute('DELETE FROM history')
+        con.execute('DELETE FROM ratingCheckpoint')
+    else:
+        game_ids = [(game[0], ) for game in games]
+        con.executemany('DELETE FROM history WHERE game = ?', game_ids)
+        con.executemany('DELETE FROM ratingCheckpoint WHERE game = ?', game_ids)
+
+    sql = 'INSERT INTO history (player, game, eloBefore, eloAfter) values(?, ?, ?, ?)'
+    con.executemany(sql, history_rows)
+    sql = 'INSERT INTO ratingCheckpoint (game, player, elo) values(?, ?, ?)'
+    con.executemany(sql, checkpoint_rows)
+
+    sql = 'UPDATE player SET elo = ? WHERE id = ?'
+    data = [(player_elos.get(player_id, STARGING_ELO), player_id) for player_id in get_all_player_ids(con)]
+    con.executemany(sql, data)
+    return len(games)
+
+
+def add_checkpoint_if_due(con):
+    # stores the current ratings once enough games were added after the last checkpoint
+    sql = """
+        SELECT COUNT(*) FROM game m
+            WHERE (m.date, m.id) > (SELECT c.date, c.id FROM game c WHERE c.id = ?)
+        """
+    checkpoint_game_id = get_last_checkpoint(con)
+    if checkpoint_game_id is None:
+        sql = 'SELECT COUNT(*) FROM game'
+        result = con.execute(sql)
+    else:
+        result = con.execute(sql, [checkpoint_game_id])
+    n_games = result.fetchall()[0][0]
+    if n_games < RATING_CHECKPOINT_INTERVAL:
+        return
+
+    # players who have played, like the checkpoints of replay_games
+    sql = """
+        INSERT INTO ratingCheckpoint (game, player, elo)
+            SELECT (SELECT m.id FROM game m ORDER BY m.date DESC, m.id DESC LIMIT 1), p.id, p.elo FROM player p
+                WHERE EXISTS (SELECT 1 FROM history h WHERE h.player = p.id)
+        """
+    con.execute(sql)
+
+
+def get_rating_audit(con, tolerance=0.5):
+    engine = get_rating_engine()
+    if engine.rates_in_periods:
+        player_ids, ratings, _, _ = replay_rating_periods(con, engine)
+        player_elos = dict(zip(player_ids, ratings['elo'].tolist()))
+    else:
+        player_elos = {}
+        replay_games(get_games_after(None, con), player_elos)
+
+    audit_rows = []
+    for player_id, name, elo in con.execute('SELECT id, name, elo FROM player ORDER BY name'):
+        replayed_elo = player_elos.get(player_id, STARGING_ELO)
+        if abs(elo - replayed_elo) > tolerance:
+            audit_rows.append((name, elo, replayed_elo, elo - replayed_elo))
+    return audit_rows
+
+
+def get_all_ratings(con):
+    result = con.execute('SELECT id, elo, deviation, volatility FROM player ORDER BY id')
+    players = result.fetchall()
+    ratings = {
+        'elo': np.array([player[1] for player in players], dtype=float),
+        'deviation': np.array([player[2] for player in players], dtype=float),
+        'volatility': np.array([player[3] for player in players], dtype=float),
+    }
+    return [player[0] for player in players], ratings
+
+
+def get_start_ratings(n_players):
+    return {
+        'elo': np.full(n_players, STARGING_ELO, dtype=float),
+        'deviation': np.full(n_players, GLICKO2_START_DEVIATION, dtype=float),
+        'volatility': np.full(n_players, GLICKO2_START_VOLATILITY, dtype=float),
+    }
+
+
+def get_last_rating_period_game(con):
+    # last game of the last rating period, None if there is none yet
+    result = con.execute('SELECT game FROM ratingPeriod ORDER BY id DESC LIMIT 1')
+    periods = result.fetchall()
+    if not periods:
+        return None
+    return periods[0][0]
+
+
+def rate_period_games(games, player_indices, ratings, engine):
+    # new ratings of all players and the history rows of the games
+    if not games:
+        return engine.rate_games(ratings, [], [], [])[0], []
+    game_ids, playerA_ids, playerB_ids, results = zip(*games)
+    new_ratings, (playerA_elos_before, playerA_elos, playerB_elos_before, playerB_elos) = engine.rate_games(
+        ratings,
+        [player_indices[player_id] for player_id in playerA_ids],
+        [player_indices[player_id] for player_id in playerB_ids],
+        get_result_scores(results))
+
+    deviations, volatilities = new_ratings['deviation'].tolist(), new_ratings['volatility'].tolist()
+    history_rows = []
+    for game_id, playerA_id, playerB_id, playerA_elo_before, playerA_elo, playerB_elo_before, playerB_elo in zip(
+            game_ids, playerA_ids, playerB_ids, playerA_elos_before.tolist(), playerA_elos.tolist(),
+            playerB_elos_before.tolist(), playerB_elos.tolist()):
+        playerA_index, playerB_index = player_indices[playerA_id], player_indices[playerB_id]
+        history_rows.append((playerA_id, game_id, playerA_elo_before, playerA_elo,
+                             deviations[playerA_index], volatilities[playerA_index]))
+        history_rows.append((playerB_id, game_id, playerB_elo_before, playerB_elo,
+                             deviations[playerB_index], volatilities[playerB_index]))
+    return new_ratings, history_rows
+
+
+def write_period_ratings(player_ids, ratings, history_rows, con):
+    sql = """
+        INSERT INTO history (player, game, eloBefore, eloAfter, deviationAfter, volatilityAfter)
+            values(?, ?, ?, ?, ?, ?)
+        """
+    con.executemany(sql, history_rows)
+    sql = 'UPDATE player SET elo = ?, deviation = ?, volatility = ? WHERE id = ?'
+    data = zip(ratings['elo'].tolist(), ratings['deviation'].tolist(), ratings['volatility'].tolist(), player_ids)
+    con.executemany(sql, data)
+
+
+def close_rating_period(con, engine=None):
+    # rates all games since the last rating period at once and starts the next one
+    engine = engine or get_rating_engine()
+    check_rating_engine(engine, con)
+    last_game_id = get_last_rating_period_game(con)
+    games = get_games_after(last_game_id, con)
+    player_ids, ratings = get_all_ratings(con)
+    player_indices = {player_id: index for index, player_id in enumerate(player_ids)}
+    new_ratings, history_rows = rate_period_games(games, player_indices, ratings, engine)
+
+    with con:
+        write_period_ratings(player_ids, new_ratings, history_rows, con)
+        sql = 'INSERT INTO ratingPeriod (game, date) values(?, ?)'
+        con.execute(sql, [games[-1][0] if games else last_game_id, datetime.now()])
+    return len(games)
+
+
+def replay_rating_periods(con, engine):
+    '''
+        output:
+            - player_ids and their ratings after replaying every rating period from the start ratings
+            - history rows of the rated games
+            - number of rated games, games after the last rating period are left unrated
+    '''
+    games = get_games_after(None, con)
+    game_positions = {game[0]: position + 1 for position, game in enumerate(games)}
+    player_ids = get_all_player_ids(con)
+    player_indices = {player_id: index for index, player_id in enumerate(player_ids)}
+    ratings = get_start_ratings(len(player_ids))
+
+    history_rows = []
+    start = 0
+    for (period_game_id, ) in con.execute('SELECT game FROM ratingPeriod ORDER BY id').fetchall():
+        end = game_positions.get(period_game_id, start)
+        ratings, period_history_rows = rate_period_games(games[start:end], player_indices, ratings, engine)
+        history_rows += period_history_rows
+        start = end
+    return player_ids, ratings, history_rows, start
+
+
+def rebuild_rating_periods(con, engine):
+    # elo checkpoints don't apply to period ratings, ranks are then replayed from the history
+    player_ids, ratings, history_rows, n_games = replay_rating_periods(con, engine)
+    with con:
+        con.execute('DELETE FROM history')
+        con.execute('DELETE FROM ratingCheckpoint')
+        write_period_ratings(player_ids, ratings, history_rows, con)
+        set_rated_engine(engine, con)
+    return n_games
@@ -0,0 +1,200 @@
+import os
+import json
+import fcntl
+import logging
+import tempfile
+from contextlib import contextmanager
+
+import numpy as np
+import sqlite3 as sl
+
+
+log = logging.getLogger('score_cache')
+
+# open caches by database path, valid as long as their token matches the one in the database
+_caches = {}
+
+
+class ScoreCache:
+    # player elos and the dense encounter matrix, memory mapped from .npy files next to the database
+
+    def __init__(self, paths, token, mode='r+'):
+        self.paths = paths
+        self.token = token
+        self.player_ids = np.load(paths['players'])
+        self.elos = np.load(paths['elos'], mmap_mode=mode)
+        self.encounters = np.load(paths['encounters'], mmap_mode=mode)
+        self.player_indices = {player_id: i for i, player_id in enumerate(self.player_ids.tolist())}
+
+    def get_indices(self, player_ids):
+        return np.array([self.player_indices[player_id] for player_id in player_ids], dtype=int)
+
+    def get_elos(self, player_ids):
+        return np.asarray(self.elos[self.get_indices(player_ids)], dtype=float)
+
+    def get_encounter_matrix(self, player_ids, opponent_ids):
+        return np.asarray(self.encounters[np.ix_(self.get_indices(player_ids), self.get_indices(opponent_ids))])
+
+
+def get_cache_token(con):
+    # changed by triggers on every write to the score inputs, None for databases without cache state
+    try:
+        result = con.execute('SELECT token FROM cacheState')
+    except sl.OperationalError:
+        return None
+    return result.fetchall()[0][0]
+
+
+def get_cache_paths(con):
+    database_path = [path for _, name, path in con.execute('PRAGMA database_list') if name == 'main'][0]
+    if not database_path:  # in-memory database
+        return None
+    prefix = os.path.splitext(database_path)[0]
+    return {
+        'players': prefix + '.players.npy',
+        'elos': prefix + '.elos.npy',
+        'encounters': prefix + '.encounters.npy',
+        'token': prefix + '.scores.json',
+        'lock': prefix + '.scores.lock',
+    }
+
+
+def read_cache_token(paths):
+    try:
+        with open(paths['token']) as token_file:
+            return json.load(token_file)['token']
+    except (OSError, ValueError, KeyError):
+        return None
+
+
+@contextmanager
+def locked_score_cache(paths):
+    # one writer at a time, across processes and threads, flock locks of separately opened files exclude each other
+    with open(paths['lock'], 'a') as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def replace_file(path, write, mode='wb'):
+    # writes a temporary file of its own next to path and moves it into place
+    directory, file_name = os.path.split(path)
+    with tempfile.NamedTemporaryFile(mode, dir=directory or '.', prefix=file_name + '.', suffix='.tmp',
+                                     delete=False) as temporary_file:
+        try:
+            write(temporary_file)
+        except BaseException:
+            temporary_file.close()
+            os.remove(temporary_file.name)
+            raise
+    os.replace(temporary_file.name, path)
+
+
+def write_cache_token(token, paths):
+    # written last and atomically, a cache interrupted while writing never matches the database
+    replace_file(paths['token'], lambda token_file: json.dump({'token': token}, token_file), mode='w')
+
+
+def save_array(array, path):
+    replace_file(path, lambda array_file: np.save(array_file, array))
+
+
+def get_score_cache(con):
+    token = get_cache_token(con)
+    paths = get_cache_paths(con)
+    if token is None or paths is None:
+        return None
+
+    cache = _caches.get(paths['token'])
+    if cache is not None and cache.token == token:
+        return cache
+
+    if read_cache_token(paths) == token:
+        cache = ScoreCache(paths, token)
+    else:
+        cache = rebuild_score_cache(con)
+    _caches[paths['token']] = cache
+    return cache
+
+
+def rebuild_score_cache(con):
+    paths = get_cache_paths(con)
+    token = get_cache_token(con)
+    with locked_score_cache(paths):
+        if read_cache_token(paths) == token:  # rebuilt by another writer while waiting for the lock
+            return ScoreCache(paths, token)
+        return write_score_cache(token, paths, con)
+
+
+def write_score_cache(token, paths, con):
+    log.debug('Rebuilding score cache at {}'.format(paths['encounters']))
+    write_cache_token(None, paths)
+
+    players = con.execute('SELECT id, elo FROM player ORDER BY id').fetchall()
+    player_ids = [player_id for player_id, _ in players]
+    save_array(np.array(player_ids, dtype=np.int64), paths['players'])
+    save_array(np.array([elo for _, elo in players], dtype=float), paths['elos'])
+
+    player_indices = {player_id: i for i, player_id in enumerate(player_ids)}
+    encounters = np.zeros((len(player_ids), len(player_ids)), dtype=np.int32)
+    for playerA_id, playerB_id, count in con.execute('SELECT playerA, playerB, encounters FROM pairStats'):
+        indexA, indexB = player_indices[playerA_id], player_indices[playerB_id]
+        encounters[indexA, indexB] += count
+        encounters[indexB, indexA] += count
+    save_array(encounters, paths['encounters'])
+
+    if get_cache_token(con) == token:  # nothing was written in between
+        write_cache_token(token, paths)
+    return ScoreCache(paths, token)
+
+
+def update_score_cache_players(player_ids, token_before, con):
+    # patch rows of players whose elo or encounters changed, the cache must still be at token_before
+    paths = get_cache_paths(con)
+    if paths is None or token_before is None:
+        return
+    with locked_score_cache(paths):
+        if read_cache_token(paths) == token_before:
+            patch_score_cache_players(player_ids, token_before, paths, con)
+
+
+def patch_score_cache_players(player_ids, token_before, paths, con):
+    cache = _caches.get(paths['token'])
+    if cache is None or cache.token != token_before:
+        cache = ScoreCache(paths, token_before)
+    write_cache_token(None, paths)
+
+    new_player_ids = [player_id for player_id in set(player_ids) if player_id not in cache.player_indices]
+    if new_player_ids:
+        cache = get_grown_score_cache(cache, new_player_ids)
+
+    for player_id in set(player_ids):
+        index = cache.player_indices[player_id]
+        cache.elos[index] = con.execute('SELECT elo FROM player WHERE id = ?', [player_id]).fetchall()[0][0]
+
+        sql = 'SELECT playerA, playerB, encounters FROM pairStats WHERE playerA = ? OR playerB = ?'
+        for playerA_id, playerB_id, count in con.execute(sql, [player_id, player_id]):
+            indexA, indexB = cache.player_indices[playerA_id], cache.player_indices[playerB_id]
+            cache.encounters[indexA, indexB] = cache.encounters[indexB, indexA] = count * (1 + (indexA == indexB))
+    cache.elos.flush()
+    cache.encounters.flush()
+
+    cache.token = get_cache_token(con)
+    write_cache_token(cache.token, paths)
+    _caches[paths['token']] = cache
+
+
+def get_grown_score_cache(cache, new_player_ids):
+    # new players get an empty row and column, their elo is patched by the caller
+    paths = cache.paths
+    n_old = len(cache.player_ids)
+    n_new = n_old + len(new_player_ids)
+
+    save_array(np.concatenate([cache.player_ids, np.array(new_player_ids, dtype=np.int64)]), paths['players'])
+    save_array(np.concatenate([cache.elos, np.zeros(len(new_player_ids))]), paths['elos'])
+    encounters = np.zeros((n_new, n_new), dtype=np.int32)
+    encounters[:n_old, :n_old] = cache.encounters
+    save_array(encounters, paths['encounters'])
+    return ScoreCache(paths, cache.token)
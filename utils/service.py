@@ -0,0 +1,92 @@
+import os
+import json
+import logging
+import socketserver
+from time import perf_counter
+
+import numpy as np
+
+from utils.connection import get_connection
+from utils.db_utils import get_fafmats_score_matrix
+from utils.pairing import get_draft_autopairing, get_player_pairings
+
+
+log = logging.getLogger('service')
+
+
+def handle_autopairing(params, con):
+    return get_draft_autopairing(params['draft_player_numbers'], params['player_ids'], con)
+
+
+def handle_pairings(params, con):
+    pairings = get_player_pairings(params.get('draft_id'), params['round'], params['player_ids'], con)
+    return [list(pairing) for pairing in pairings]
+
+
+def handle_scores(params, con):
+    return get_fafmats_score_matrix(params['player_ids'], params['opponent_ids'], con)
+
+
+def handle_ping(params, con):
+    return 'pong'
+
+
+METHODS = {
+    'autopairing': handle_autopairing,
+    'pairings': handle_pairings,
+    'scores': handle_scores,
+    'ping': handle_ping,
+}
+
+
+def get_json_value(value):
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    if isinstance(value, np.generic):
+        return value.item()
+    raise TypeError('{} is not JSON serializable'.format(type(value).__name__))
+
+
+def get_response(line, db_path):
+    # one JSON request per line: {"id": ..., "method": ..., "params": {...}}
+    request_id = None
+    try:
+        request = json.loads(line)
+        request_id = request.get('id')
+        if request.get('method') not in METHODS:
+            raise ValueError('Unknown method "{}"'.format(request.get('method')))
+        method = METHODS[request['method']]
+        start = perf_counter()
+        result = method(request.get('params', {}), get_connection(db_path))
+        log.debug('{} took {:.4f}s'.format(request['method'], perf_counter() - start))
+        response = {'id': request_id, 'result': result}
+    except Exception as error:
+        log.exception('Request failed: {}'.format(line.strip()))
+        response = {'id': request_id, 'error': '{}: {}'.format(type(error).__name__, error)}
+    return json.dumps(response, default=get_json_value) + '\n'
+
+
+def serve_stream(input_file, output_file, db_path):
+    for line in input_file:
+        if not line.strip():
+            continue
+        output_file.write(get_response(line, db_path))
+        output_file.flush()
+
+
+def serve_socket(socket_path, db_path):
+    # clients are served one after another, so all requests run on this thread and its connection
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            for line in self.rfile:
+                if line.strip():
+                    self.wfile.write(get_response(line.decode(), db_path).encode())
+
+    if os.path.exists(socket_path):
+        os.remove(socket_path)
+    with socketserver.UnixStreamServer(socket_path, RequestHandler) as server:
+        log.info('Serving {} on {}'.format(db_path, socket_path))
+        try:
+            server.serve_forever()
+        finally:
+            os.remove(socket_path)
@@ -0,0 +1,182 @@
+import logging
+from math import ceil, log2
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from constants import SIMULATION_CHUNK_SIZE, SIMULATION_PROCESSES, SIMULATION_POLICY
+from utils.db_utils import get_active_draft_players, get_round_by_draft_id, get_draft_pairings_by_draft_id, \
+    get_draft_round_games, get_player_elos, get_fafmats_score_matrix
+from utils.elo import get_expected_elo_scores, get_elo_differences_from_scores
+from utils.pairing import get_swiss_pair_indices, get_draft_history_arrays
+
+
+log = logging.getLogger('simulation')
+
+
+def get_default_round_count(n_players):
+    # a swiss draft needs about log2(players) rounds to find a single winner
+    return max(ceil(log2(max(n_players, 2))), 1)
+
+
+def get_draft_state(draft_id, con):
+    '''
+        input:
+            - draft_id of the simulated draft
+        output:
+            - dictionary of the draft as numpy arrays, with nothing left that needs the database
+
+        points, played pairs and byes include the current round. pairings of the current round without
+        a game are returned as open_pairs, if the round has no pairings yet it is simulated completely.
+    '''
+    player_ids = get_active_draft_players(draft_id, con)
+    player_indices = {player_id: i for i, player_id in enumerate(player_ids)}
+    round_ = get_round_by_draft_id(draft_id, con)
+
+    points, played, had_bye = get_draft_history_arrays(draft_id, round_ + 1, player_ids, con)
+
+    pairings = get_draft_pairings_by_draft_id(draft_id, round_, con)
+    played_games = set(get_draft_round_games(draft_id, round_, con))
+    open_pairs = [(player_indices[playerA_id], player_indices[playerB_id]) for playerA_id, playerB_id in pairings
+                  if (playerA_id, playerB_id) not in played_games and (playerB_id, playerA_id) not in played_games
+                  and playerA_id in player_indices and playerB_id in player_indices]
+
+    return {
+        'player_ids': player_ids,
+        'round': round_ if pairings else round_ - 1,  # last round that is paired
+        'elos': get_player_elos(player_ids, con),
+        'scores': get_fafmats_score_matrix(player_ids, player_ids, con) if player_ids else np.zeros((0, 0)),
+        'points': points,
+        'played': played,
+        'had_bye': had_bye,
+        'open_pairs': np.array(open_pairs, dtype=int).reshape(-1, 2),
+    }
+
+
+def get_monrad_pairs(points, had_bye, rng):
+    # neighbours in the standings play each other, ties in random order, the bye goes to the lowest without one
+    n_simulations, n_players = points.shape
+    order = np.argsort(-points - 0.1 * rng.random(points.shape), axis=1)  # points are multiples of 0.5
+
+    byes = None
+    if n_players % 2 != 0:
+        sorted_had_bye = np.take_along_axis(had_bye, order, axis=1)
+        bye_positions = n_players - 1 - np.argmax(~sorted_had_bye[:, ::-1], axis=1)  # last one if all had a bye
+        byes = order[np.arange(n_simulations), bye_positions]
+        keep = np.ones(order.shape, dtype=bool)
+        keep[np.arange(n_simulations), bye_positions] = False
+        order = order[keep].reshape(n_simulations, n_players - 1)
+    return order[:, 0::2], order[:, 1::2], byes
+
+
+def get_swiss_pairs(points, had_bye, played, scores):
+    # the pairing used for real drafts, one matching per simulation
+    n_simulations, n_players = points.shape
+    playerA_indices = np.empty((n_simulations, n_players // 2), dtype=int)
+    playerB_indices = np.empty((n_simulations, n_players // 2), dtype=int)
+    byes = np.empty(n_simulations, dtype=int) if n_players % 2 != 0 else None
+    for simulation in range(n_simulations):
+        pair_indices = get_swiss_pair_indices(scores, points[simulation], played[simulation], had_bye[simulation])
+        pairs = [indices for indices in pair_indices if len(indices) == 2]
+        playerA_indices[simulation], playerB_indices[simulation] = zip(*pairs) if pairs else ((), ())
+        if byes is not None:
+            byes[simulation] = pair_indices[-1][0]
+    return playerA_indices, playerB_indices, byes
+
+
+def play_simulated_games(playerA_indices, playerB_indices, elos, points, rng):
+    # one game per pair and simulation, won with the expected elo score as probability
+    playerA_elos = np.take_along_axis(elos, playerA_indices, axis=1)
+    playerB_elos = np.take_along_axis(elos, playerB_indices, axis=1)
+    playerA_expected_scores = get_expected_elo_scores(playerA_elos, playerB_elos)
+    playerA_scores = (rng.random(playerA_expected_scores.shape) < playerA_expected_scores).astype(float)
+    elo_differences = get_elo_differences_from_scores(playerA_elos, playerB_elos, playerA_scores)
+
+    np.put_along_axis(elos, playerA_indices, playerA_elos + elo_differences, axis=1)
+    np.put_along_axis(elos, playerB_indices, playerB_elos - elo_differences, axis=1)
+    np.put_along_axis(points, playerA_indices, np.take_along_axis(points, playerA_indices, axis=1) + playerA_scores,
+                      axis=1)
+    np.put_along_axis(points, playerB_indices, np.take_along_axis(points, playerB_indices, axis=1) + 1 - playerA_scores,
+                      axis=1)
+
+
+def simulate_draft_chunk(state, n_rounds, n_simulations, seed, policy=SIMULATION_POLICY):
+    '''
+        input:
+            - state of the draft from get_draft_state
+            - n_rounds the draft has in total
+            - n_simulations to run at once
+            - seed of the random generator
+            - policy pairing the simulated rounds, 'monrad' or 'swiss'
+        output:
+            - counts of every player (rows) finishing at every standing (columns)
+            - sum of the elo changes of every player over all simulations
+
+        all simulations advance together, a round is a few array operations over simulations x players.
+        players with the same points share the better standing.
+    '''
+    rng = np.random.default_rng(seed)
+    n_players = len(state['player_ids'])
+    elos = np.tile(state['elos'], (n_simulations, 1))
+    points = np.tile(state['points'], (n_simulations, 1))
+    had_bye = np.tile(state['had_bye'], (n_simulations, 1))
+    played = np.tile(state['played'], (n_simulations, 1, 1)) if policy == 'swiss' else None
+
+    open_pairs = state['open_pairs']
+    if len(open_pairs):
+        play_simulated_games(
+            np.tile(open_pairs[:, 0], (n_simulations, 1)), np.tile(open_pairs[:, 1], (n_simulations, 1)),
+            elos, points, rng)
+
+    simulations = np.arange(n_simulations)
+    for _ in range(state['round'] + 1, n_rounds + 1):
+        if n_players < 2:
+            break
+        if policy == 'swiss':
+            playerA_indices, playerB_indices, byes = get_swiss_pairs(points, had_bye, played, state['scores'])
+            pair_simulations = simulations[:, np.newaxis]
+            played[pair_simulations, playerA_indices, playerB_indices] = True
+            played[pair_simulations, playerB_indices, playerA_indices] = True
+        else:
+            playerA_indices, playerB_indices, byes = get_monrad_pairs(points, had_bye, rng)
+        if byes is not None:
+            points[simulations, byes] += 1
+            had_bye[simulations, byes] = True
+        play_simulated_games(playerA_indices, playerB_indices, elos, points, rng)
+
+    standings = (points[:, np.newaxis, :] > points[:, :, np.newaxis]).sum(axis=2)  # players ahead
+    standing_counts = np.zeros((n_players, n_players), dtype=np.int64)
+    np.add.at(standing_counts, (np.tile(np.arange(n_players), n_simulations), standings.ravel()), 1)
+    return standing_counts, (elos - state['elos']).sum(axis=0)
+
+
+def simulate_draft(state, n_rounds, n_simulations, seed=None, policy=SIMULATION_POLICY,
+                   n_processes=SIMULATION_PROCESSES):
+    '''
+        input:
+            - state of the draft from get_draft_state
+            - n_rounds the draft has in total
+            - n_simulations in total, computed in chunks of SIMULATION_CHUNK_SIZE
+            - n_processes to spread the chunks over, 1 computes them here
+        output:
+            - probability of every player (rows) finishing at every standing (columns)
+            - expected elo change of every player
+    '''
+    chunk_size = max(min(SIMULATION_CHUNK_SIZE, ceil(n_simulations / max(n_processes, 1))), 1)  # a chunk per process
+    chunk_sizes = [chunk_size] * (n_simulations // chunk_size)
+    if n_simulations % chunk_size:
+        chunk_sizes.append(n_simulations % chunk_size)
+    seeds = np.random.SeedSequence(seed).spawn(len(chunk_sizes))
+    arguments = [(state, n_rounds, chunk_size, chunk_seed, policy)
+                 for chunk_size, chunk_seed in zip(chunk_sizes, seeds)]
+
+    if n_processes > 1 and len(chunk_sizes) > 1:
+        with ProcessPoolExecutor(max_workers=min(n_processes, len(chunk_sizes))) as executor:
+            results = list(executor.map(simulate_draft_chunk, *zip(*arguments)))
+    else:
+        results = [simulate_draft_chunk(*chunk_arguments) for chunk_arguments in arguments]
+
+    n_players = len(state['player_ids'])
+    standing_counts = sum((counts for counts, _ in results), np.zeros((n_players, n_players), dtype=np.int64))
+    elo_changes = sum((changes for _, changes in results), np.zeros(n_players))
+    return standing_counts / max(n_simulations, 1), elo_changes / max(n_simulations, 1)
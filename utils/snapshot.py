@@ -0,0 +1,114 @@
+import os
+import re
+import logging
+from datetime import datetime
+from time import perf_counter
+
+import sqlite3 as sl
+
+from constants import SNAPSHOT_PATH, SNAPSHOT_RETENTION, SNAPSHOT_STEP_PAGES
+from utils.registry import forget_registry
+from utils.ladder import forget_ladder
+from utils.score_cache import get_cache_token
+from utils.migrations import migrate_db
+
+
+log = logging.getLogger('snapshot')
+
+SNAPSHOT_DATE_FORMAT = '%Y%m%d-%H%M%S-%f'  # microseconds keep snapshots of the same second apart
+
+
+def get_database_path(con):
+    return [path for _, name, path in con.execute('PRAGMA database_list') if name == 'main'][0]
+
+
+def get_snapshot_prefix(con):
+    # snapshots are named <database>-<date>[-<label>].db
+    return os.path.splitext(os.path.basename(get_database_path(con)))[0] + '-'
+
+
+def get_snapshots(con, directory=SNAPSHOT_PATH):
+    '''
+        output:
+            - list of (path, date, label) of the snapshots of the database, newest first
+    '''
+    prefix = get_snapshot_prefix(con)
+    pattern = re.compile(r'^{}(\d{{8}}-\d{{6}}-\d{{6}})(?:-(.+))?\.db$'.format(re.escape(prefix)))
+    snapshots = []
+    for file_name in os.listdir(directory) if os.path.isdir(directory) else []:
+        match = pattern.match(file_name)
+        if match:
+            date = datetime.strptime(match.group(1), SNAPSHOT_DATE_FORMAT)
+            snapshots.append((os.path.join(directory, file_name), date, match.group(2)))
+    snapshots.sort(key=lambda snapshot: snapshot[0], reverse=True)
+    return snapshots
+
+
+def log_backup_progress(status, remaining, total):
+    log.debug('Copied {} of {} pages'.format(total - remaining, total))
+
+
+def take_snapshot(con, label=None, directory=SNAPSHOT_PATH, retention=SNAPSHOT_RETENTION):
+    '''
+        input:
+            - label to add to the file name, labelled snapshots are never rotated out
+            - retention is the number of unlabelled snapshots kept
+        output:
+            - path of the new snapshot
+
+        the backup copies SNAPSHOT_STEP_PAGES pages per step, other connections can write in between.
+        the snapshot is written to a temporary file first, so a crash never leaves a torn snapshot.
+    '''
+    os.makedirs(directory, exist_ok=True)
+    file_name = get_snapshot_prefix(con) + datetime.now().strftime(SNAPSHOT_DATE_FORMAT)
+    if label:
+        file_name += '-' + re.sub(r'[^\w.-]+', '_', label)
+    path = os.path.join(directory, file_name + '.db')
+
+    start_time = perf_counter()
+    snapshot_con = sl.connect(path + '.tmp')
+    try:
+        con.backup(snapshot_con, pages=SNAPSHOT_STEP_PAGES, progress=log_backup_progress)
+        snapshot_con.execute('PRAGMA journal_mode = DELETE')  # a single self-contained file, even for WAL databases
+    finally:
+        snapshot_con.close()
+    os.replace(path + '.tmp', path)
+    log.info('Saved snapshot "{}" ({:.1f} MB) in {:.2f}s'.format(
+        path, os.path.getsize(path) / 1e6, perf_counter() - start_time))
+
+    rotate_snapshots(con, directory, retention)
+    return path
+
+
+def rotate_snapshots(con, directory=SNAPSHOT_PATH, retention=SNAPSHOT_RETENTION):
+    unlabelled_paths = [path for path, _, label in get_snapshots(con, directory) if label is None]
+    for path in unlabelled_paths[retention:]:
+        log.info('Removing old snapshot "{}"'.format(path))
+        os.remove(path)
+
+
+def restore_snapshot(path, con):
+    '''
+        input:
+            - path of the snapshot to restore into the database of con
+
+        the whole snapshot is copied in a single backup step, which holds the write lock throughout, so other
+        connections see either the old or the restored database. afterwards the snapshot is migrated to the
+        current schema and every cache of the database is invalidated.
+    '''
+    start_time = perf_counter()
+    con.commit()
+    snapshot_con = sl.connect('file:{}?mode=ro'.format(path), uri=True)
+    try:
+        snapshot_con.backup(con)
+    finally:
+        snapshot_con.close()
+    log.info('Restored snapshot "{}" in {:.2f}s'.format(path, perf_counter() - start_time))
+
+    # writes through con itself don't change its data_version and the snapshot may carry an old cache token
+    forget_registry(con)
+    forget_ladder(con)
+    migrate_db(con)
+    if get_cache_token(con) is not None:
+        with con:
+            con.execute('UPDATE cacheState SET token = hex(randomblob(8))')
@@ -9,3 +9,26 @@ def get_ascii_bar(count, increment):
     bar = bar or '▏'
 
     return bar
+
+
+def get_table_chunks(row_chunks, headers, alignments, widths):
+    # formats chunks of rows with fixed column widths, so they line up when printed one after another
+    widths = [max(width, len(header)) for width, header in zip(widths, headers)]
+
+    def format_row(row):
+        cells = []
+        for value, alignment, width in zip(row, alignments, widths):
+            if alignment == 'r':
+                cells.append(str(value).rjust(width))
+            else:
+                cells.append(str(value).ljust(width))
+        return '  '.join(cells).rstrip()
+
+    header_lines = [format_row(headers), format_row(['-' * width for width in widths])]
+    for rows in row_chunks:
+        lines = header_lines + [format_row(row) for row in rows]
+        header_lines = []
+        yield '\n'.join(lines)
+
+    if header_lines:
+        yield '\n'.join(header_lines)